@@ -0,0 +1,50 @@
+"""Benchmark do tempo de import da análise: só cálculo vs. cálculo + gráficos.
+
+Cada medição roda num interpretador novo (sem cache de módulos) e importa
+scripts.analysis sozinho (o que um job headless carrega) e junto com
+scripts.analysis_plots (equivalente ao import anterior, que sempre carregava
+matplotlib e seaborn). Reporta a mediana de --repeticoes execuções.
+
+Uso:
+    python -m benchmarks.bench_analysis_import --repeticoes 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+MEDIR_IMPORT = """
+import sys, time
+inicio = time.perf_counter()
+{imports}
+print(time.perf_counter() - inicio, 'matplotlib' in sys.modules)
+"""
+
+CASOS = {
+    'analysis (só cálculo)': 'import scripts.analysis',
+    'analysis + analysis_plots': 'import scripts.analysis, scripts.analysis_plots',
+}
+
+
+def medir(imports, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', MEDIR_IMPORT.format(imports=imports)],
+                               capture_output=True, text=True, check=True).stdout.split()
+        tempos.append(float(saida[0]))
+    return statistics.median(tempos), saida[1] == 'True'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    resultados = {nome: medir(imports, args.repeticoes) for nome, imports in CASOS.items()}
+    base = resultados['analysis + analysis_plots'][0]
+    for nome, (tempo, matplotlib) in resultados.items():
+        print(f"{nome:<28} {tempo * 1000:9.1f} ms ({tempo / base:.0%}) | matplotlib carregado: {matplotlib}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark da análise de arquivos a processar: laço sobre listas vs. conjuntos.
+
+Gera um inventário sintético de nomes EXTRATO (por padrão 100k) distribuídos entre
+SFTP, Google Drive e controle_arquivos com status variados, e compara
+plan_files_to_process com a implementação anterior (membership em listas, O(n·m)).
+A implementação anterior só roda até --legado-max arquivos.
+
+Uso:
+    python -m benchmarks.bench_analyze_files --arquivos 100000
+"""
+import argparse
+import random
+import time
+
+from scripts.leitor_extratos import plan_files_to_process
+
+
+def analyze_files_legado(sftp_files, google_drive_files, db_status):
+    """Implementação anterior de analyze_files_to_process, sem logs"""
+    files_to_process = []
+    files_to_report = []
+    all_files = set(sftp_files + google_drive_files)
+    for file in all_files:
+        if "EXTRATO" not in file:
+            continue
+        if file in sftp_files and file not in google_drive_files and file not in db_status:
+            files_to_process.append(file)
+            continue
+        if file in google_drive_files and file not in db_status:
+            files_to_process.append(file)
+            continue
+        if file in db_status and db_status[file]['status'] == 'ERRO':
+            files_to_process.append(file)
+            continue
+        if file in db_status and db_status[file]['status'] == 'SUCESSO' and file not in google_drive_files:
+            files_to_report.append({'file': file})
+            continue
+        if file in sftp_files and file in db_status and db_status[file]['status'] != 'SUCESSO':
+            files_to_process.append(file)
+            continue
+    return files_to_process, files_to_report
+
+
+def gerar_inventario(total, seed=42):
+    rng = random.Random(seed)
+    sftp_files, google_drive_files, db_status = [], [], {}
+    for i in range(total):
+        file = f"EXTRATO_UNICA_51309_{20200101 + i // 5:08d}_{i % 5:05d}"
+        if rng.random() < 0.02:
+            file = file.replace("EXTRATO", "OUTRO")
+        if rng.random() < 0.6:
+            sftp_files.append(file)
+        if rng.random() < 0.8:
+            google_drive_files.append(file)
+        if rng.random() < 0.9:
+            db_status[file] = {'status': rng.choices(['SUCESSO', 'ERRO', 'PROCESSANDO'], [90, 8, 2])[0],
+                               'erro': None}
+    return sftp_files, google_drive_files, db_status
+
+
+def medir(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--arquivos', type=int, default=100_000)
+    parser.add_argument('--legado-max', type=int, default=20_000)
+    args = parser.parse_args()
+
+    tamanhos = sorted({n for n in (1_000, 10_000, args.legado_max, args.arquivos) if n <= args.arquivos})
+    for total in tamanhos:
+        inventario = gerar_inventario(total)
+        tempo, plano = medir(plan_files_to_process, *inventario)
+        linha = f"{total:>8} arquivos | conjuntos: {tempo * 1000:9.1f} ms"
+
+        if total <= args.legado_max:
+            tempo_legado, (processar, reportar) = medir(analyze_files_legado, *inventario)
+            assert sorted(processar) == plano.files_to_process
+            assert sorted(r['file'] for r in reportar) == plano.cenarios[4]
+            linha += f" | listas: {tempo_legado * 1000:11.1f} ms ({tempo_legado / tempo:,.0f}x)"
+        print(linha)
+
+    print(f"Cenários ({tamanhos[-1]} arquivos): {plano.contagens()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Benchmark dos carregadores da tabela de fatos: executemany, execute_values e COPY.
+
+Monta um DataFrame de fatos (100k linhas por padrão) a partir do extrato de exemplo
+e mede o tempo de carga em cada método. Sem --dsn, inicia um PostgreSQL local
+temporário com initdb/pg_ctl (diretório dos binários em PG_BIN ou no PATH).
+
+Uso:
+    python -m benchmarks.bench_db_loaders --linhas 100000
+    python -m benchmarks.bench_db_loaders --dsn "host=localhost dbname=postgres user=postgres"
+"""
+import argparse
+import contextlib
+import getpass
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+
+from scripts.connection_db import copy_df_to_db
+from scripts.leitor_extratos import insert_df_to_db, prepare_fact_table
+from scripts.reading_files import ExtratoTransacao
+from scripts.transform_files import TransformerTrasacoes
+
+ARQUIVO_EXEMPLO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data', 'EXTRATO_UNICA_51309_20240917_00003'
+)
+TABELA = 'bench_transacoes'
+
+
+def _binario(nome):
+    pg_bin = os.getenv('PG_BIN')
+    caminho = os.path.join(pg_bin, nome) if pg_bin else shutil.which(nome)
+    if not caminho or not os.path.exists(caminho):
+        raise SystemExit(f"{nome} não encontrado: informe --dsn ou defina PG_BIN")
+    return caminho
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def postgres_local():
+    """Inicia um PostgreSQL temporário e retorna os parâmetros de conexão"""
+    with tempfile.TemporaryDirectory() as diretorio:
+        dados = os.path.join(diretorio, 'data')
+        porta = _porta_livre()
+        subprocess.run([_binario('initdb'), '-D', dados, '-A', 'trust', '-U', getpass.getuser()],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([_binario('pg_ctl'), '-D', dados, '-w', '-l', os.path.join(diretorio, 'pg.log'),
+                        '-o', f"-p {porta} -k {diretorio} -c fsync=off", 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+        try:
+            yield {'host': diretorio, 'port': porta, 'user': getpass.getuser(),
+                   'password': None, 'database': 'postgres'}
+        finally:
+            subprocess.run([_binario('pg_ctl'), '-D', dados, '-m', 'fast', 'stop'],
+                           check=True, stdout=subprocess.DEVNULL)
+
+
+def montar_fatos(total_linhas):
+    _, df_transacoes, _ = ExtratoTransacao(file_path=ARQUIVO_EXEMPLO).process_file()
+    df_transacoes['file_name'] = os.path.basename(ARQUIVO_EXEMPLO)
+    df_validado = TransformerTrasacoes(dataframe=df_transacoes).validate_all()
+    df_fact = prepare_fact_table(df_validado)
+    repeticoes = -(-total_linhas // len(df_fact))
+    df_fact = pd.concat([df_fact] * repeticoes, ignore_index=True).iloc[:total_linhas]
+    df_fact['file_id'] = str(uuid.uuid4())
+    return df_fact
+
+
+def _tipo_sql(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return 'timestamp'
+    if pd.api.types.is_float_dtype(serie):
+        return 'decimal(15,2)'
+    if pd.api.types.is_integer_dtype(serie):
+        return 'bigint'
+    return 'varchar'
+
+
+def criar_tabela(conn, df):
+    colunas = ', '.join(f"{coluna} {_tipo_sql(df[coluna])}" for coluna in df.columns)
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS public.{TABELA}")
+        cur.execute(f"CREATE TABLE public.{TABELA} ({colunas})")
+    conn.commit()
+
+
+def carregar_execute_values(conn, df):
+    colunas = ', '.join(df.columns)
+    with conn.cursor() as cur:
+        execute_values(cur, f"INSERT INTO public.{TABELA} ({colunas}) VALUES %s",
+                       [tuple(x) for x in df.to_numpy()], page_size=1000)
+
+
+METODOS = {
+    'executemany': lambda params, conn, df: insert_df_to_db(
+        **params, schema='public', table=TABELA, df=df, conn=conn),
+    'execute_values': lambda params, conn, df: carregar_execute_values(conn, df),
+    'copy': lambda params, conn, df: copy_df_to_db(
+        **params, schema='public', table=TABELA, df=df, conn=conn),
+}
+
+
+def executar(params, df, metodos):
+    conn = psycopg2.connect(**{k: v for k, v in params.items() if v is not None})
+    try:
+        criar_tabela(conn, df)
+        for metodo in metodos:
+            with conn.cursor() as cur:
+                cur.execute(f"TRUNCATE public.{TABELA}")
+            conn.commit()
+
+            inicio = time.perf_counter()
+            METODOS[metodo](params, conn, df)
+            conn.commit()
+            tempo = time.perf_counter() - inicio
+
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT count(*) FROM public.{TABELA}")
+                carregadas = cur.fetchone()[0]
+            print(f"{metodo:>15}: {tempo:8.2f} s  ({len(df) / tempo:,.0f} linhas/s, {carregadas} carregadas)")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--metodos', nargs='+', default=list(METODOS), choices=list(METODOS))
+    parser.add_argument('--dsn', help="Parâmetros libpq de um banco existente (ex.: 'host=... dbname=...')")
+    args = parser.parse_args()
+
+    df = montar_fatos(args.linhas)
+    print(f"DataFrame de fatos: {len(df)} linhas, {len(df.columns)} colunas")
+
+    if args.dsn:
+        params = dict.fromkeys(['host', 'port', 'user', 'password', 'database'])
+        params.update(parte.split('=', 1) for parte in args.dsn.split())
+        params['database'] = params.pop('dbname', params['database'])
+        executar(params, df, args.metodos)
+    else:
+        with postgres_local() as params:
+            executar(params, df, args.metodos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark da simulação de MDR: apply por linha com Decimal vs. motor vetorizado.
+
+Gera uma base sintética no formato de carregar_base_mdr (mês x produto x parcelamento)
+e um lote de tabelas de taxas candidatas. Compara a implementação anterior (apply por
+linha com Decimal, um cenário por vez) com simular_cenarios_mdr (lote único, aritmética
+inteira em centavos) e confere que os totais são idênticos.
+
+Uso:
+    python -m benchmarks.bench_mdr_simulation --meses 36 --cenarios 500
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+import pandas as pd
+
+from scripts.analysis import simular_cenarios_mdr
+
+PRODUTOS = ['001', '002', '003', '004', '010', '011']
+TIPOS = ['a_vista', 'parcelado']
+
+
+def gerar_base(meses, seed=42):
+    rng = random.Random(seed)
+    linhas = []
+    for m in range(meses):
+        mes = pd.Timestamp(2022, 1, 1) + pd.DateOffset(months=m)
+        for produto in PRODUTOS:
+            for tipo in TIPOS:
+                volume = rng.randint(10 ** 6, 10 ** 10)
+                linhas.append((mes, produto, tipo, rng.randint(1, 5000), volume, volume * rng.randint(80, 450) // 10000))
+    return pd.DataFrame(linhas, columns=['mes', 'codigo_produto', 'tipo_parcelamento', 'total_transacoes',
+                                         'volume_centavos', 'mdr_atual_centavos'])
+
+
+def gerar_cenarios(total, seed=7):
+    rng = random.Random(seed)
+    return [
+        {produto: {tipo: {'mdr_percentual': round(rng.uniform(0.5, 4.5), 2)} for tipo in TIPOS}
+         for produto in PRODUTOS if rng.random() < 0.9}
+        for _ in range(total)
+    ]
+
+
+def simular_legado(df_base, taxas_json):
+    """Cálculo anterior de simulate_mdr_by_product (apply por linha), sem banco nem gráfico"""
+    df = df_base.copy()
+    df['volume_total'] = df['volume_centavos'].apply(lambda x: Decimal(x) / 100)
+    df['mdr_atual'] = df['mdr_atual_centavos'].apply(lambda x: Decimal(x) / 100)
+
+    def calcular_mdr_proposto(row):
+        if (row['codigo_produto'] in taxas_json and
+                row['tipo_parcelamento'] in taxas_json[row['codigo_produto']]):
+            taxa = Decimal(str(taxas_json[row['codigo_produto']][row['tipo_parcelamento']]['mdr_percentual']))
+            return (row['volume_total'] * taxa) / Decimal('100')
+        return row['mdr_atual']
+
+    df['mdr_proposto'] = df.apply(calcular_mdr_proposto, axis=1)
+    return df['mdr_proposto'].sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--meses', type=int, default=36)
+    parser.add_argument('--cenarios', type=int, default=500)
+    args = parser.parse_args()
+
+    df_base = gerar_base(args.meses)
+    cenarios = gerar_cenarios(args.cenarios)
+
+    inicio = time.perf_counter()
+    legado = [simular_legado(df_base, taxas_json) for taxas_json in cenarios]
+    tempo_legado = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultado = simular_cenarios_mdr(df_base, cenarios)
+    tempo_lote = time.perf_counter() - inicio
+
+    assert list(resultado.totais['mdr_proposto']) == legado
+    print(f"{len(df_base)} linhas na base | {args.cenarios} cenários")
+    print(f"apply por linha: {tempo_legado * 1000:10.1f} ms")
+    print(f"lote vetorizado: {tempo_lote * 1000:10.1f} ms ({tempo_legado / tempo_lote:,.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark das engines de leitura do ExtratoTransacao.
+
+Gera um arquivo sintético (por padrão 1M de linhas CV) replicando os registros
+do extrato de exemplo em data/ e mede o tempo de process_file em cada engine.
+Também confere que as engines concordam num arquivo só com header e trailer.
+
+Uso:
+    python -m benchmarks.bench_parse_engines --linhas 1000000 --engines dict columnar numpy
+"""
+import argparse
+import itertools
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from scripts.reading_files import ExtratoTransacao
+
+ARQUIVO_EXEMPLO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data', 'EXTRATO_UNICA_51309_20240917_00003'
+)
+
+
+def gerar_arquivo_sintetico(caminho, total_linhas):
+    with open(ARQUIVO_EXEMPLO, 'r', encoding='latin-1') as f:
+        linhas = f.read().splitlines()
+    header, trailer = linhas[0], linhas[-1]
+    registros_cv = [linha for linha in linhas if linha.startswith("CV")]
+
+    with open(caminho, 'w', encoding='latin-1', newline='\n') as f:
+        f.write(header + '\n')
+        for linha in itertools.islice(itertools.cycle(registros_cv), total_linhas):
+            f.write(linha + '\n')
+        f.write(trailer + '\n')
+
+
+def conferir_arquivo_vazio(diretorio, engines):
+    """Header e trailer sem registros CV: todas as engines devolvem o mesmo DataFrame vazio"""
+    caminho = os.path.join(diretorio, 'EXTRATO_VAZIO')
+    gerar_arquivo_sintetico(caminho, 0)
+    resultados = [ExtratoTransacao(file_path=caminho, engine=engine).process_file()[1] for engine in engines]
+    for df in resultados[1:]:
+        pd.testing.assert_frame_equal(df, resultados[0])
+    print(f"Arquivo sem registros CV: {resultados[0].shape} em todas as engines")
+
+
+def medir(caminho, engine):
+    inicio = time.perf_counter()
+    _, df_transacoes, _ = ExtratoTransacao(file_path=caminho, engine=engine).process_file()
+    return time.perf_counter() - inicio, df_transacoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--engines', nargs='+', default=list(ExtratoTransacao.ENGINES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, 'EXTRATO_SINTETICO')
+        gerar_arquivo_sintetico(caminho, args.linhas)
+        print(f"Arquivo sintético: {args.linhas} linhas CV, "
+              f"{os.path.getsize(caminho) / 1024 ** 2:.1f} MB")
+
+        referencia = None
+        for engine in args.engines:
+            tempo, df = medir(caminho, engine)
+            print(f"{engine:>10}: {tempo:8.2f} s  ({args.linhas / tempo:,.0f} linhas/s)")
+            if referencia is None:
+                referencia = df
+            else:
+                pd.testing.assert_frame_equal(df, referencia)
+            del df
+
+        conferir_arquivo_vazio(diretorio, args.engines)
+
+
+if __name__ == "__main__":
+    main()
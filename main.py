@@ -1,18 +1,20 @@
-from ftplib import FTP_TLS
+import argparse
 import logging
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 load_dotenv()
 
-from scripts.connection_db import (
-    get_google_drive_files,
-    get_file_processing_status
-)
+from scripts.connection_db import close_pools, get_content_hashes, rebuild_mdr_aggregate
 from scripts.leitor_extratos import (
     analyze_files_to_process,
-    process_file
+    process_file,
+    process_files_parallel
 )
+from scripts.pipeline import PipelineIngestao
+from scripts.ftps_fetcher import FtpsFetcher
+from scripts.discovery_index import DiscoveryIndex
+from scripts.metrics import Metricas, registro_metricas
 import shutil
 
 host = os.getenv('HOST')
@@ -21,8 +23,11 @@ password = os.getenv('PASSWORD')
 local_directory = os.path.dirname(os.path.abspath(__file__))
 google_drive_directory = os.getenv('GOOGLE_DRIVE_DIRECTORY')
 log_directory = os.path.join(local_directory, "outputs", "log")
+discovery_index_path = os.path.join(local_directory, "outputs", "discovery_index.json")
 os.makedirs(log_directory, exist_ok=True)
 log_filename = os.path.join(log_directory, f"log_{datetime.now().strftime('%d%m%y_%H_%M_%S')}.txt")
+metrics_filename = os.path.join(local_directory, "outputs", "metrics",
+                                f"metricas_{datetime.now().strftime('%d%m%y_%H_%M_%S')}.jsonl")
 logging.basicConfig(filename=log_filename, level=logging.INFO, 
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -34,63 +39,181 @@ connection_database = {
     'port': os.getenv('DB_PORT')
 }
 
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pipeline ETL dos extratos Unica")
+    parser.add_argument(
+        '--quarantine', action='store_true',
+        help="Carrega as linhas válidas e envia as inválidas para transacoes_quarantine em vez de rejeitar o arquivo"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Número de processos para ler e validar arquivos em paralelo (1 = sequencial)"
+    )
+    parser.add_argument(
+        '--pipeline', action='store_true',
+        help="Processa em etapas com filas limitadas (cópia, leitura, validação, carga) sobrepondo CPU e banco"
+    )
+    parser.add_argument(
+        '--full-rescan', action='store_true',
+        help="Ignora o índice local de arquivos e relista Google Drive e controle_arquivos por completo"
+    )
+    parser.add_argument(
+        '--in-place', action='store_true',
+        help="Lê os arquivos direto no Google Drive (memory-map), sem copiar para o diretório local nem mover de volta"
+    )
+    parser.add_argument(
+        '--rebuild-mdr', action='store_true',
+        help="Recria mdr_agregado a partir de todas as transações e encerra (uma vez após migrar um banco existente)"
+    )
+    return parser.parse_args()
+
+def main(quarantine=False, workers=1, pipeline=False, full_rescan=False, in_place=False):
     sftp_files = []
+    fetcher = None
+    discovery_index = DiscoveryIndex(discovery_index_path)
+    # Uma linha JSON por arquivo e, no fim, uma da execução (tempos, linhas e bytes por etapa)
+    registro_metricas.abrir(metrics_filename)
     try:
         try:
-            ftps = FTP_TLS(host)
-            ftps.login(user=user, passwd=password)
-            ftps.prot_p()
-            
-            logging.info("Conexão FTPS estabelecida com sucesso.")
-
-            ftps.cwd("Saida")
-            sftp_files = ftps.nlst()
+            # A sessão fica aberta para baixar os arquivos que só existem no FTPS
+            with registro_metricas.medir('descoberta_ftps'):
+                fetcher = FtpsFetcher(host, user, password, directory="Saida", staging_dir=local_directory).connect()
+                sftp_files = discovery_index.sftp_files(fetcher.list_files())
             logging.info(f"Arquivos encontrados no SFTP: {len(sftp_files)}")
-            
-            ftps.quit()
         except Exception as e:
             logging.warning(f"Não foi possível conectar ao SFTP: {e}")
             logging.info("Continuando apenas com sincronização do Google Drive")
+            if fetcher:
+                fetcher.close()
+            fetcher = None
 
-        google_drive_files = get_google_drive_files(google_drive_directory)
+        with registro_metricas.medir('descoberta_drive'):
+            google_drive_files = discovery_index.google_drive_files(google_drive_directory, force=full_rescan)
         logging.info(f"Arquivos encontrados no Google Drive: {len(google_drive_files)}")
 
-        db_status = get_file_processing_status(**connection_database)
+        with registro_metricas.medir('descoberta_banco'):
+            db_status = discovery_index.file_processing_status(connection_database, force=full_rescan)
         logging.info(f"Arquivos registrados no banco: {len(db_status)}")
+        discovery_index.save()
 
-        files_to_process, files_to_report = analyze_files_to_process(
-            sftp_files, 
-            google_drive_files, 
-            db_status
-        )
+        with registro_metricas.medir('analise'):
+            files_to_process, files_to_report = analyze_files_to_process(
+                sftp_files, 
+                google_drive_files, 
+                db_status
+            )
 
         if files_to_report:
             logging.warning("Arquivos desincronizados encontrados:")
             for report in files_to_report:
                 logging.warning(f"- {report['file']}: {report['message']}")
 
+        arquivos_paralelos = []
+        arquivos_pipeline = []
+        arquivos_ftps = []
+        metricas_paralelos = {}
+        # In-place: o arquivo é lido no próprio Drive via memory-map (engine numpy, somente leitura)
+        engine = 'numpy' if in_place else 'columnar'
         for file_name in files_to_process:
             logging.info(f"Processando arquivo: {file_name}")
 
             local_file_path = os.path.join(local_directory, file_name)
             google_drive_path = os.path.join(google_drive_directory, file_name)
+            if in_place and file_name in google_drive_files:
+                local_file_path = google_drive_path
+
+            if pipeline and file_name in google_drive_files:
+                # A cópia é feita pela primeira etapa do pipeline
+                arquivos_pipeline.append((file_name, local_file_path, google_drive_path))
+                continue
 
+            metricas = Metricas(file_name)
             if file_name in google_drive_files:
-                shutil.copy2(google_drive_path, local_file_path)
-                logging.info(f"Arquivo copiado do Google Drive para processamento: {file_name}")
+                if not in_place:
+                    with metricas.medir('copia') as etapa:
+                        shutil.copy2(google_drive_path, local_file_path)
+                        etapa['bytes'] += os.path.getsize(local_file_path)
+                    logging.info(f"Arquivo copiado do Google Drive para processamento: {file_name}")
+            elif fetcher and file_name in sftp_files:
+                arquivos_ftps.append(file_name)
+                continue
             else:
                 logging.warning(f"Arquivo não encontrado no Google Drive: {file_name}")
                 continue
 
-            success = process_file(file_name, local_file_path, google_drive_path, connection_database)
+            if workers > 1:
+                arquivos_paralelos.append((file_name, local_file_path, google_drive_path))
+                metricas_paralelos[file_name] = metricas
+                continue
+
+            success = process_file(file_name, local_file_path, google_drive_path, connection_database,
+                                   quarantine=quarantine, engine=engine, metricas=metricas)
 
             if not success:
-                os.remove(local_file_path)
+                if local_file_path != google_drive_path:
+                    os.remove(local_file_path)
                 logging.error(f"Erro ao processar arquivo {file_name}")
 
+        if arquivos_ftps:
+            # O download do próximo arquivo acontece enquanto o atual é processado
+            logging.info(f"Baixando {len(arquivos_ftps)} arquivos do FTPS")
+            downloads = fetcher.iter_downloads(arquivos_ftps)
+            while True:
+                # Tempo em que o processamento ficou esperando o FTPS
+                with registro_metricas.medir('espera_ftps') as etapa:
+                    file_name, local_file_path, erro = next(downloads, (None, None, None))
+                    if local_file_path:
+                        etapa['bytes'] += os.path.getsize(local_file_path)
+                if file_name is None:
+                    break
+                if erro:
+                    continue
+
+                google_drive_path = os.path.join(google_drive_directory, file_name)
+                success = process_file(file_name, local_file_path, google_drive_path, connection_database,
+                                       quarantine=quarantine)
+
+                if not success:
+                    os.remove(local_file_path)
+                    logging.error(f"Erro ao processar arquivo {file_name}")
+
+        if arquivos_pipeline or arquivos_paralelos:
+            # Hashes dos arquivos já carregados, lidos uma vez para o lote (duplicados pulam o parse)
+            hashes_carregados = get_content_hashes(**connection_database)
+
+        if arquivos_pipeline:
+            logging.info(f"Processando {len(arquivos_pipeline)} arquivos em pipeline")
+            PipelineIngestao(connection_database, quarantine=quarantine, engine=engine,
+                             buscar_duplicado=hashes_carregados.get).run(arquivos_pipeline)
+
+        if arquivos_paralelos:
+            logging.info(f"Processando {len(arquivos_paralelos)} arquivos com {workers} processos")
+            resultados = process_files_parallel(arquivos_paralelos, connection_database, workers,
+                                                quarantine=quarantine, engine=engine,
+                                                buscar_duplicado=hashes_carregados.get,
+                                                metricas=metricas_paralelos)
+            for file_name, local_file_path, google_drive_path in arquivos_paralelos:
+                if not resultados.get(file_name):
+                    if local_file_path != google_drive_path and os.path.exists(local_file_path):
+                        os.remove(local_file_path)
+                    logging.error(f"Erro ao processar arquivo {file_name}")
+
     except Exception as e:
         logging.error(f"Erro ao executar o processo: {e}")
+    finally:
+        if fetcher:
+            fetcher.close()
+        # Fecha as conexões do pool e registra as métricas no log
+        close_pools()
+        registro_metricas.finalizar()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.rebuild_mdr:
+        try:
+            rebuild_mdr_aggregate(**connection_database)
+        finally:
+            close_pools()
+        raise SystemExit(0)
+    main(quarantine=args.quarantine, workers=args.workers, pipeline=args.pipeline,
+         full_rescan=args.full_rescan, in_place=args.in_place)
\ No newline at end of file
@@ -1,222 +1,389 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, NamedTuple, Tuple
 import logging
-import psycopg2
-import matplotlib.pyplot as plt
-import seaborn as sns
-from decimal import Decimal
-import matplotlib.dates as mdates
-
-plt.style.use('seaborn-v0_8')
-sns.set_palette(['#8B0000', '#A52A2A', '#B22222', '#DC143C'])
-plt.rcParams['figure.figsize'] = (15, 7)
-plt.rcParams['font.size'] = 12
-plt.rcParams['axes.labelsize'] = 14
-plt.rcParams['axes.titlesize'] = 16
-plt.rcParams['xtick.labelsize'] = 12
-plt.rcParams['ytick.labelsize'] = 12
+import threading
+import uuid
+from scripts.connection_db import get_connection
+from decimal import Decimal, ROUND_HALF_EVEN
 
 def plot_mdr_by_produto(df: pd.DataFrame) -> None:
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 12))
-    
-    sns.barplot(data=df, x='descricao', y='mdr_percentual', ax=ax1, color='#8B0000')
-    ax1.set_title('MDR Percentual por Tipo de Produto')
-    ax1.set_xlabel('Produto')
-    ax1.set_ylabel('MDR (%)')
-    ax1.tick_params(axis='x', rotation=45)
-    
-    for p in ax1.patches:
-        ax1.annotate(f'{p.get_height():.2f}%', 
-                    (p.get_x() + p.get_width()/2., p.get_height()),
-                    ha='center', va='bottom', fontsize=10)
-    
-    sns.barplot(data=df, x='descricao', y='mdr_nominal', ax=ax2, color='#A52A2A')
-    ax2.set_title('Volume de MDR por Tipo de Produto')
-    ax2.set_xlabel('Produto')
-    ax2.set_ylabel('Valor MDR (R$)')
-    ax2.tick_params(axis='x', rotation=45)
-    
-    for p in ax2.patches:
-        ax2.annotate(f'R$ {p.get_height():,.2f}', 
-                    (p.get_x() + p.get_width()/2., p.get_height()),
-                    ha='center', va='bottom', fontsize=10)
-    
-    plt.tight_layout()
-    plt.show()
+    # matplotlib/seaborn só são carregados quando um gráfico é pedido
+    from scripts.analysis_plots import plot_mdr_by_produto as _plot
+    _plot(df)
 
 def calculate_mdr_by_produto(connection_params: Dict, mes: str = None) -> pd.DataFrame:
+    # mdr_agregado já tem uma venda por nsu_host_transacao (mantido na carga de cada arquivo)
     query = """
-    WITH transacoes_filtradas AS (
-        SELECT DISTINCT
-            t.nsu_host_transacao,
-            t.valor_bruto_venda,
-            t.valor_liquido_venda,
-            pr.codigo_produto,
-            pr.descricao
-        FROM unica_transactions.transacoes t
-        JOIN unica_transactions.produto pr ON t.codigo_produto = pr.codigo_produto
+    SELECT 
+        a.codigo_produto,
+        pr.descricao,
+        SUM(a.total_transacoes) as total_transacoes,
+        SUM(a.valor_bruto) as valor_total,
+        SUM(a.valor_liquido) as valor_liquido,
+        (SUM(a.valor_bruto) - SUM(a.valor_liquido)) / SUM(a.valor_bruto) * 100 as mdr_percentual,
+        SUM(a.mdr_nominal) as mdr_nominal
+    FROM unica_transactions.mdr_agregado a
+    JOIN unica_transactions.produto pr ON a.codigo_produto = pr.codigo_produto
     """
     
     if mes:
-        query += " WHERE DATE_TRUNC('month', t.data_transacao) = %s"
+        query += " WHERE a.mes = DATE_TRUNC('month', %s::date)"
         params = (mes,)
     else:
         params = None
     
     query += """
-    )
-    SELECT 
-        codigo_produto,
-        descricao,
-        COUNT(*) as total_transacoes,
-        SUM(valor_bruto_venda) as valor_total,
-        SUM(valor_liquido_venda) as valor_liquido,
-        (SUM(valor_bruto_venda) - SUM(valor_liquido_venda)) / SUM(valor_bruto_venda) * 100 as mdr_percentual,
-        SUM(valor_bruto_venda - valor_liquido_venda) as mdr_nominal
-    FROM transacoes_filtradas
-    GROUP BY codigo_produto, descricao
+    GROUP BY a.codigo_produto, pr.descricao
     ORDER BY mdr_nominal DESC
     """
     
     try:
-        conn = psycopg2.connect(**connection_params)
-        df = pd.read_sql(query, conn, params=params)
-        return df
+        with get_connection(**connection_params) as conn:
+            df = pd.read_sql(query, conn, params=params)
+            return df
     except Exception as e:
         logging.error(f"Erro ao calcular MDR por produto: {e}")
         return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
 
-def simulate_mdr_by_product(connection_params, taxas_json):
-    try:
-        # Validação do formato das taxas
-        if not isinstance(taxas_json, dict):
-            raise ValueError("taxas_json deve ser um dicionário")
-            
-        for produto, config in taxas_json.items():
-            if not isinstance(config, dict):
-                raise ValueError(f"Configuração inválida para o produto {produto}")
-            for tipo, taxa in config.items():
-                if not isinstance(taxa, dict) or 'mdr_percentual' not in taxa:
-                    raise ValueError(f"Taxa inválida para {produto} - {tipo}")
-                if not isinstance(taxa['mdr_percentual'], (int, float)):
-                    raise ValueError(f"Valor de MDR inválido para {produto} - {tipo}")
-        
-        conn = psycopg2.connect(**connection_params)
-        
-        query = """
-            WITH transacoes_filtradas AS (
-                SELECT distinct
-                	t.nsu_host_transacao,
-                    t.data_transacao,
-                    t.valor_bruto_venda,
-                    t.valor_liquido_venda,
-                    t.numero_total_parcelas,
-                    pr.codigo_produto
-                FROM unica_transactions.transacoes t
-                JOIN unica_transactions.produto pr ON t.codigo_produto = pr.codigo_produto
-                --WHERE t.data_transacao >= CURRENT_DATE - INTERVAL '30 days'
-            )
-            SELECT 
-                DATE_TRUNC('month', data_transacao) as mes,
-                codigo_produto,
-                CASE 
-                    WHEN numero_total_parcelas > '01' THEN 'parcelado'
-                    ELSE 'a_vista'
-                END as tipo_parcelamento,
-                COUNT(*) as total_transacoes,
-                SUM(valor_bruto_venda) as volume_total,
-                SUM(valor_bruto_venda - valor_liquido_venda) as mdr_atual
-            FROM transacoes_filtradas
-            GROUP BY 
-                DATE_TRUNC('month', data_transacao),
-                codigo_produto,
-                CASE 
-                    WHEN numero_total_parcelas > '01' THEN 'parcelado'
-                    ELSE 'a_vista'
-                END
-            ORDER BY mes
-        """
-        
+# Taxas em % viram inteiros com 4 casas decimais (2,39% -> 23900); casas além disso
+# são arredondadas (meio-par)
+ESCALA_TAXA = 10_000
+# volume (centavos) x taxa escalada = MDR em unidades de 1e-8 real
+ESCALA_MDR = 100 * 100 * ESCALA_TAXA
+# MDR atual (centavos) na mesma unidade do MDR proposto
+CENTAVOS_PARA_UNIDADE = ESCALA_MDR // 100
+
+def _linhas_taxas(taxas_json: Dict) -> List[Tuple[str, str, int]]:
+    """Valida taxas_json ({produto: {tipo_parcelamento: {'mdr_percentual': x}}}) e devolve
+    (codigo_produto, tipo_parcelamento, taxa_escalada) com a taxa em inteiro na ESCALA_TAXA.
+
+    Taxas com mais de 4 casas decimais são arredondadas meio-par para a escala.
+    """
+    if not isinstance(taxas_json, dict):
+        raise ValueError("taxas_json deve ser um dicionário")
+
+    linhas = []
+    for produto, config in taxas_json.items():
+        if not isinstance(config, dict):
+            raise ValueError(f"Configuração inválida para o produto {produto}")
+        for tipo, taxa in config.items():
+            if not isinstance(taxa, dict) or 'mdr_percentual' not in taxa:
+                raise ValueError(f"Taxa inválida para {produto} - {tipo}")
+            if not isinstance(taxa['mdr_percentual'], (int, float)):
+                raise ValueError(f"Valor de MDR inválido para {produto} - {tipo}")
+
+            taxa_decimal = Decimal(str(taxa['mdr_percentual'])) * ESCALA_TAXA
+            taxa_escalada = taxa_decimal.to_integral_value(rounding=ROUND_HALF_EVEN)
+            if taxa_escalada != taxa_decimal:
+                logging.warning(f"MDR de {produto} - {tipo} ({taxa['mdr_percentual']}) "
+                                f"arredondado para 4 casas decimais")
+            linhas.append((produto, tipo, int(taxa_escalada)))
+    return linhas
+
+def tabela_taxas(taxas_json: Dict) -> pd.DataFrame:
+    """Tabela de lookup (codigo_produto, tipo_parcelamento, taxa_escalada) de um taxas_json"""
+    return pd.DataFrame(_linhas_taxas(taxas_json), columns=['codigo_produto', 'tipo_parcelamento', 'taxa_escalada'])
+
+def _dtype_exato(*limites) -> type:
+    """int64 quando o produto dos limites cabe em 63 bits; senão inteiros Python (object)"""
+    produto = 1
+    for limite in limites:
+        produto *= max(int(limite), 1)
+    return np.int64 if produto < 2 ** 63 else object
+
+def _para_decimal(valores, escala=ESCALA_MDR) -> List[Decimal]:
+    """Inteiros na escala informada -> Decimal exato em reais"""
+    return [Decimal(int(valor)) / escala for valor in valores]
+
+def calcular_mdr_proposto(df_base: pd.DataFrame, taxas_json: Dict) -> np.ndarray:
+    """MDR proposto de cada linha de df_base (volume_centavos, mdr_atual_centavos), em 1e-8 real.
+
+    Junção vetorizada com a tabela de taxas; linhas sem taxa mantêm o MDR atual.
+    """
+    taxas = tabela_taxas(taxas_json)
+    taxa = (
+        df_base[['codigo_produto', 'tipo_parcelamento']]
+        .merge(taxas, on=['codigo_produto', 'tipo_parcelamento'], how='left')['taxa_escalada']
+        .fillna(-1)
+        .to_numpy(dtype=np.int64)
+    )
+    volume = df_base['volume_centavos'].to_numpy(dtype=np.int64)
+    atual = df_base['mdr_atual_centavos'].to_numpy(dtype=np.int64)
+
+    dtype = _dtype_exato(volume.max(initial=0), max(taxa.max(initial=0), CENTAVOS_PARA_UNIDADE))
+    return np.where(
+        taxa >= 0,
+        volume.astype(dtype) * taxa.astype(dtype),
+        atual.astype(dtype) * CENTAVOS_PARA_UNIDADE
+    )
+
+class BaseMdr(NamedTuple):
+    """Base da simulação reduzida a matrizes mês x (produto, parcelamento), em centavos"""
+    chaves: pd.MultiIndex
+    meses: pd.Index
+    volume: np.ndarray
+    atual: np.ndarray
+
+class ResultadoCenarios(NamedTuple):
+    """Resultado de um lote de cenários, em Decimal exato.
+
+    totais: uma linha por cenário (mdr_atual, mdr_proposto, diferenca_mdr);
+    mensal: matriz cenário x mês com o MDR proposto; atual_mensal: MDR atual por mês.
+    """
+    totais: pd.DataFrame
+    mensal: pd.DataFrame
+    atual_mensal: pd.Series
+
+def preparar_base_mdr(df_base: pd.DataFrame) -> BaseMdr:
+    """Soma df_base (mes, codigo_produto, tipo_parcelamento, volume_centavos, mdr_atual_centavos)
+    em matrizes mês x (produto, parcelamento)"""
+    chaves_linhas = pd.MultiIndex.from_frame(df_base[['codigo_produto', 'tipo_parcelamento']])
+    chaves = chaves_linhas.unique()
+    meses = pd.Index(df_base['mes']).unique().sort_values()
+    idx_chave = chaves.get_indexer(chaves_linhas)
+    idx_mes = meses.get_indexer(df_base['mes'])
+
+    volume = np.zeros((len(meses), len(chaves)), dtype=np.int64)
+    atual = np.zeros((len(meses), len(chaves)), dtype=np.int64)
+    np.add.at(volume, (idx_mes, idx_chave), df_base['volume_centavos'].to_numpy(dtype=np.int64))
+    np.add.at(atual, (idx_mes, idx_chave), df_base['mdr_atual_centavos'].to_numpy(dtype=np.int64))
+    return BaseMdr(chaves, meses, volume, atual)
+
+def simular_cenarios_mdr(base, cenarios) -> ResultadoCenarios:
+    """Avalia várias tabelas de taxas (cenários) de uma vez sobre a mesma base.
+
+    base: BaseMdr ou o DataFrame de carregar_base_mdr.
+    cenarios: {nome: taxas_json} ou lista de taxas_json (nomes 0..n-1).
+    Cada cenário vira um vetor de taxas; o MDR proposto de todos os cenários sai de
+    dois produtos de matrizes inteiras.
+    """
+    if isinstance(base, pd.DataFrame):
+        base = preparar_base_mdr(base)
+    if not isinstance(cenarios, dict):
+        cenarios = dict(enumerate(cenarios))
+    nomes = list(cenarios)
+    chaves, meses, volume, atual = base
+
+    # Taxa de cada cenário por chave; -1 = sem taxa (mantém o MDR atual)
+    taxas = np.full((len(nomes), len(chaves)), -1, dtype=np.int64)
+    lookup = [(i, produto, tipo, taxa)
+              for i, taxas_json in enumerate(cenarios.values())
+              for produto, tipo, taxa in _linhas_taxas(taxas_json)]
+    if lookup:
+        cenario, produto, tipo, taxa = (np.array(coluna) for coluna in zip(*lookup))
+        posicao = chaves.get_indexer(pd.MultiIndex.from_arrays([produto, tipo]))
+        encontradas = posicao >= 0
+        taxas[cenario[encontradas], posicao[encontradas]] = taxa[encontradas].astype(np.int64)
+
+    com_taxa = taxas >= 0
+    dtype = _dtype_exato(volume.sum(dtype=object), max(taxas.max(initial=0), CENTAVOS_PARA_UNIDADE))
+    # (meses x chaves) @ (chaves x cenários) -> MDR proposto por mês e cenário
+    proposto = (volume.astype(dtype) @ np.where(com_taxa, taxas, 0).T.astype(dtype)
+                + (atual.astype(dtype) * CENTAVOS_PARA_UNIDADE) @ (~com_taxa).T.astype(dtype))
+    atual_mes = atual.sum(axis=1).astype(dtype) * CENTAVOS_PARA_UNIDADE
+
+    indice = pd.Index(nomes, name='cenario')
+    mensal = pd.DataFrame(
+        np.array(_para_decimal(proposto.T.ravel()), dtype=object).reshape(len(nomes), len(meses)),
+        index=indice, columns=meses
+    )
+    total_atual = _para_decimal([atual_mes.sum()])[0]
+    totais = pd.DataFrame({
+        'mdr_atual': [total_atual] * len(nomes),
+        'mdr_proposto': _para_decimal(proposto.sum(axis=0)),
+    }, index=indice)
+    totais['diferenca_mdr'] = totais['mdr_proposto'] - totais['mdr_atual']
+    return ResultadoCenarios(totais, mensal, pd.Series(_para_decimal(atual_mes), index=meses, name='mdr_atual'))
+
+def carregar_base_mdr(connection_params: Dict, conn=None) -> pd.DataFrame:
+    """Base da simulação: mdr_agregado por mês, produto e parcelamento, com valores em centavos"""
+    query = """
+        SELECT 
+            mes::timestamp as mes,
+            codigo_produto,
+            tipo_parcelamento,
+            SUM(total_transacoes) as total_transacoes,
+            (SUM(valor_bruto) * 100)::bigint as volume_centavos,
+            (SUM(mdr_nominal) * 100)::bigint as mdr_atual_centavos
+        FROM unica_transactions.mdr_agregado
+        GROUP BY mes, codigo_produto, tipo_parcelamento
+        ORDER BY mes
+    """
+    with get_connection(**connection_params, conn=conn) as conn:
         with conn.cursor() as cur:
             cur.execute(query)
             columns = [
                 'mes', 'codigo_produto', 'tipo_parcelamento',
-                'total_transacoes', 'volume_total', 'mdr_atual'
+                'total_transacoes', 'volume_centavos', 'mdr_atual_centavos'
             ]
-            results = cur.fetchall()
-            
-            if not results:
-                return None, None
-            
-            df = pd.DataFrame(results, columns=columns)
-            
-            # Converter todos os valores numéricos para Decimal
-            df['volume_total'] = df['volume_total'].apply(lambda x: Decimal(str(x)))
-            df['mdr_atual'] = df['mdr_atual'].apply(lambda x: Decimal(str(x)))
-            
-            # Calcular MDR proposto
-            def calcular_mdr_proposto(row):
-                try:
-                    if (row['codigo_produto'] in taxas_json and 
-                        row['tipo_parcelamento'] in taxas_json[row['codigo_produto']]):
-                        taxa = Decimal(str(taxas_json[row['codigo_produto']][row['tipo_parcelamento']]['mdr_percentual']))
-                        return (row['volume_total'] * taxa) / Decimal('100')
-                    return row['mdr_atual']
-                except Exception as e:
-                    logging.error(f"Erro ao calcular MDR proposto para {row['codigo_produto']}: {str(e)}")
-                    return row['mdr_atual']
-            
-            df['mdr_proposto'] = df.apply(calcular_mdr_proposto, axis=1)
-            df['diferenca_mdr'] = df['mdr_proposto'] - df['mdr_atual']
-            
-            df_mensal = df.groupby('mes').agg({
-                'volume_total': 'sum',
-                'mdr_atual': 'sum',
-                'mdr_proposto': 'sum'
-            }).reset_index()
-            
-            # Converter para float apenas para plotagem
-            df_mensal['mdr_atual'] = df_mensal['mdr_atual'].apply(float)
-            df_mensal['mdr_proposto'] = df_mensal['mdr_proposto'].apply(float)
-            
-            # Criar gráfico
-            plt.figure(figsize=(15, 7))
-            plt.plot(df_mensal['mes'], df_mensal['mdr_atual'], 
-                    label='MDR Atual', marker='o', linewidth=2, color='#006400')
-            plt.plot(df_mensal['mes'], df_mensal['mdr_proposto'], 
-                    label='MDR Proposto', marker='o', linewidth=2, color='#A52A2A')
-            
-            plt.title('Comparação MDR Atual vs Proposto (Agrupado por Mês)', pad=20)
-            plt.xlabel('Mês')
-            plt.ylabel('Valor MDR (R$)')
-            plt.legend()
-            plt.grid(True, alpha=0.3)
-            
-            plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%b/%Y'))
-            plt.xticks(rotation=45)
-            
-            for i, row in df_mensal.iterrows():
-                plt.annotate(f'R$ {row["mdr_atual"]:,.2f}', 
-                           (row['mes'], row['mdr_atual']),
-                           textcoords="offset points", xytext=(0,10), ha='center')
-                plt.annotate(f'R$ {row["mdr_proposto"]:,.2f}', 
-                           (row['mes'], row['mdr_proposto']),
-                           textcoords="offset points", xytext=(0,-15), ha='center')
-            
-            plt.tight_layout()
-            plt.show()
-            
-            impacto_total = float(df['diferenca_mdr'].sum())
-            
-            return df, impacto_total
-            
+            return pd.DataFrame(cur.fetchall(), columns=columns)
+
+# Versão dos dados da simulação: muda a cada carga, reprocessamento ou remoção de arquivo
+VERSAO_BASE_MDR = """
+    SELECT COUNT(*), MAX(updated_at)
+    FROM unica_transactions.controle_arquivos
+    WHERE status_processamento = 'SUCESSO'
+"""
+
+class CacheBaseMdr:
+    """Base da simulação em memória, uma por banco, válida enquanto a versão dos dados não mudar.
+
+    A cada consulta só a versão (VERSAO_BASE_MDR) vai ao banco; o GROUP BY sobre
+    mdr_agregado roda de novo apenas quando um arquivo foi carregado ou removido.
+    invalidar() força a releitura (ex.: após rebuild_mdr_aggregate).
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _chave(connection_params):
+        return tuple(connection_params.get(campo) for campo in ('host', 'port', 'database', 'user'))
+
+    def obter(self, connection_params: Dict) -> Tuple[pd.DataFrame, BaseMdr]:
+        """(df_base, BaseMdr) da versão atual dos dados; não altere o DataFrame devolvido"""
+        chave = self._chave(connection_params)
+        # Conexão emprestada do pool compartilhado: conferir a versão não abre conexão nova
+        with get_connection(**connection_params) as conn, self._lock:
+            with conn.cursor() as cur:
+                cur.execute(VERSAO_BASE_MDR)
+                versao = tuple(cur.fetchone())
+
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] == versao:
+                self.hits += 1
+                return entrada[1], entrada[2]
+
+            # Versão lida antes da base: uma carga no meio só antecipa a próxima releitura
+            df_base = carregar_base_mdr(connection_params, conn=conn)
+            base = preparar_base_mdr(df_base)
+            self._entradas[chave] = (versao, df_base, base)
+            self.misses += 1
+            logging.info(f"Base da simulação de MDR carregada: {len(df_base)} linhas, versão {versao}")
+            return df_base, base
+
+    def invalidar(self):
+        with self._lock:
+            self._entradas.clear()
+
+# Cache compartilhado pelas simulações do processo
+cache_base_mdr = CacheBaseMdr()
+
+def plot_cenarios_mdr(resultado: ResultadoCenarios, cenarios=None) -> None:
+    """MDR mensal atual vs. proposto dos cenários escolhidos (todos por padrão)"""
+    from scripts.analysis_plots import plot_cenarios_mdr as _plot
+    _plot(resultado, cenarios)
+
+def simulate_mdr_scenarios(connection_params: Dict, cenarios, plot: bool = False,
+                           cache: CacheBaseMdr = None) -> ResultadoCenarios:
+    """Avalia N tabelas de taxas de uma vez sobre a base em cache (ver simular_cenarios_mdr)"""
+    try:
+        cenarios = cenarios if isinstance(cenarios, dict) else dict(enumerate(cenarios))
+        # Validação antes de ir ao banco
+        for taxas_json in cenarios.values():
+            _linhas_taxas(taxas_json)
+
+        _, base = (cache or cache_base_mdr).obter(connection_params)
+        resultado = simular_cenarios_mdr(base, cenarios)
+        if plot:
+            plot_cenarios_mdr(resultado)
+        return resultado
+
+    except Exception as e:
+        logging.error(f"Erro ao simular cenários de MDR: {str(e)}")
+        raise
+
+def simulate_mdr_by_product(connection_params, taxas_json, plot=True):
+    try:
+        # Validação do formato das taxas
+        tabela_taxas(taxas_json)
+
+        df_base, _ = cache_base_mdr.obter(connection_params)
+        if df_base.empty:
+            return None, None
+        df = df_base.copy()
+
+        # Aritmética inteira (centavos e taxa escalada): resultado exato, sem apply por linha
+        proposto = calcular_mdr_proposto(df, taxas_json)
+        atual = df['mdr_atual_centavos'].to_numpy(dtype=np.int64).astype(proposto.dtype) * CENTAVOS_PARA_UNIDADE
+        df['volume_total'] = _para_decimal(df['volume_centavos'], escala=100)
+        df['mdr_atual'] = _para_decimal(atual)
+        df['mdr_proposto'] = _para_decimal(proposto)
+        df['diferenca_mdr'] = _para_decimal(proposto - atual)
+
+        if plot:
+            df_mensal = pd.DataFrame({
+                'mes': df['mes'],
+                'volume_total': df['volume_centavos'] / 100,
+                'mdr_atual': atual / ESCALA_MDR,
+                'mdr_proposto': proposto / ESCALA_MDR
+            }).groupby('mes').sum().reset_index()
+            df_mensal['mdr_atual'] = df_mensal['mdr_atual'].astype(float)
+            df_mensal['mdr_proposto'] = df_mensal['mdr_proposto'].astype(float)
+
+            from scripts.analysis_plots import plot_mdr_atual_vs_proposto
+            plot_mdr_atual_vs_proposto(df_mensal)
+
+        impacto_total = float(df['diferenca_mdr'].sum())
+        
+        return df, impacto_total
+
     except Exception as e:
         logging.error(f"Erro ao simular MDR por produto: {str(e)}")
         raise
-    finally:
-        if conn:
-            conn.close() 
\ No newline at end of file
+
+# Funções de agregação que podem ser aplicadas por lote e recombinadas
+_COMBINAR_AGREGACAO = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+def ler_consulta_em_lotes(connection_params: Dict, query: str, params=None, tamanho_lote: int = 50_000,
+                          coerce_float: bool = False, conn=None) -> Iterator[pd.DataFrame]:
+    """Executa query num cursor nomeado (server-side) e devolve DataFrames de até tamanho_lote linhas.
+
+    O resultado fica no servidor e só um lote por vez trafega e fica em memória.
+    coerce_float=True converte numeric (Decimal) em float, como pd.read_sql.
+    Com conn, usa a transação do chamador; senão empresta uma conexão do pool.
+    """
+    try:
+        with get_connection(**connection_params, conn=conn) as conn:
+            with conn.cursor(name=f"analise_{uuid.uuid4().hex}") as cur:
+                cur.itersize = tamanho_lote
+                cur.execute(query, params)
+                lotes = 0
+                while True:
+                    rows = cur.fetchmany(tamanho_lote)
+                    if not rows:
+                        break
+                    lotes += 1
+                    columns = [coluna[0] for coluna in cur.description]
+                    yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=coerce_float)
+                logging.info(f"Consulta lida em {lotes} lotes de até {tamanho_lote} linhas")
+    except Exception as e:
+        logging.error(f"Erro ao ler consulta em lotes: {e}")
+        raise
+
+def agregar_em_lotes(lotes, chaves: List[str], agregacoes: Dict[str, str]) -> pd.DataFrame:
+    """Agregação incremental de lotes (ex.: de ler_consulta_em_lotes).
+
+    agregacoes: {coluna: 'sum' | 'count' | 'min' | 'max'}. Cada lote é reduzido por
+    chaves e combinado com o acumulado, então a memória é proporcional ao número de
+    grupos, não de linhas. Médias saem de sum / count.
+    """
+    invalidas = set(agregacoes.values()) - set(_COMBINAR_AGREGACAO)
+    if invalidas:
+        raise ValueError(f"Agregações não suportadas em lotes: {sorted(invalidas)}")
+
+    combinar = {coluna: _COMBINAR_AGREGACAO[funcao] for coluna, funcao in agregacoes.items()}
+    acumulado = None
+    for lote in lotes:
+        parcial = lote.groupby(chaves, sort=False).agg(agregacoes)
+        if acumulado is not None:
+            parcial = pd.concat([acumulado, parcial]).groupby(level=chaves, sort=False).agg(combinar)
+        acumulado = parcial
+
+    if acumulado is None:
+        return pd.DataFrame(columns=[*chaves, *agregacoes])
+    return acumulado.sort_index().reset_index()
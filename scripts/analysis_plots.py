@@ -0,0 +1,97 @@
+"""Gráficos das análises de MDR.
+
+Importado só quando um gráfico é pedido (scripts.analysis carrega este módulo sob
+demanda), para que jobs que só precisam dos números não carreguem matplotlib/seaborn.
+"""
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+import matplotlib.dates as mdates
+
+plt.style.use('seaborn-v0_8')
+sns.set_palette(['#8B0000', '#A52A2A', '#B22222', '#DC143C'])
+plt.rcParams['figure.figsize'] = (15, 7)
+plt.rcParams['font.size'] = 12
+plt.rcParams['axes.labelsize'] = 14
+plt.rcParams['axes.titlesize'] = 16
+plt.rcParams['xtick.labelsize'] = 12
+plt.rcParams['ytick.labelsize'] = 12
+
+def plot_mdr_by_produto(df: pd.DataFrame) -> None:
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 12))
+    
+    sns.barplot(data=df, x='descricao', y='mdr_percentual', ax=ax1, color='#8B0000')
+    ax1.set_title('MDR Percentual por Tipo de Produto')
+    ax1.set_xlabel('Produto')
+    ax1.set_ylabel('MDR (%)')
+    ax1.tick_params(axis='x', rotation=45)
+    
+    for p in ax1.patches:
+        ax1.annotate(f'{p.get_height():.2f}%', 
+                    (p.get_x() + p.get_width()/2., p.get_height()),
+                    ha='center', va='bottom', fontsize=10)
+    
+    sns.barplot(data=df, x='descricao', y='mdr_nominal', ax=ax2, color='#A52A2A')
+    ax2.set_title('Volume de MDR por Tipo de Produto')
+    ax2.set_xlabel('Produto')
+    ax2.set_ylabel('Valor MDR (R$)')
+    ax2.tick_params(axis='x', rotation=45)
+    
+    for p in ax2.patches:
+        ax2.annotate(f'R$ {p.get_height():,.2f}', 
+                    (p.get_x() + p.get_width()/2., p.get_height()),
+                    ha='center', va='bottom', fontsize=10)
+    
+    plt.tight_layout()
+    plt.show()
+
+def plot_mdr_atual_vs_proposto(df_mensal: pd.DataFrame) -> None:
+    """MDR mensal atual vs. proposto de simulate_mdr_by_product (mes, mdr_atual, mdr_proposto)"""
+    plt.figure(figsize=(15, 7))
+    plt.plot(df_mensal['mes'], df_mensal['mdr_atual'], 
+            label='MDR Atual', marker='o', linewidth=2, color='#006400')
+    plt.plot(df_mensal['mes'], df_mensal['mdr_proposto'], 
+            label='MDR Proposto', marker='o', linewidth=2, color='#A52A2A')
+    
+    plt.title('Comparação MDR Atual vs Proposto (Agrupado por Mês)', pad=20)
+    plt.xlabel('Mês')
+    plt.ylabel('Valor MDR (R$)')
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+    
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%b/%Y'))
+    plt.xticks(rotation=45)
+    
+    for i, row in df_mensal.iterrows():
+        plt.annotate(f'R$ {row["mdr_atual"]:,.2f}', 
+                   (row['mes'], row['mdr_atual']),
+                   textcoords="offset points", xytext=(0,10), ha='center')
+        plt.annotate(f'R$ {row["mdr_proposto"]:,.2f}', 
+                   (row['mes'], row['mdr_proposto']),
+                   textcoords="offset points", xytext=(0,-15), ha='center')
+    
+    plt.tight_layout()
+    plt.show()
+
+def plot_cenarios_mdr(resultado, cenarios=None) -> None:
+    """MDR mensal atual vs. proposto dos cenários escolhidos (todos por padrão)"""
+    cenarios = list(resultado.mensal.index if cenarios is None else cenarios)
+    meses = resultado.mensal.columns
+
+    plt.figure(figsize=(15, 7))
+    plt.plot(meses, resultado.atual_mensal.astype(float),
+            label='MDR Atual', marker='o', linewidth=2, color='#006400')
+    for cenario in cenarios:
+        plt.plot(meses, resultado.mensal.loc[cenario].astype(float),
+                label=f'MDR Proposto ({cenario})', marker='o', linewidth=2)
+
+    plt.title('Comparação MDR Atual vs Cenários Propostos (Agrupado por Mês)', pad=20)
+    plt.xlabel('Mês')
+    plt.ylabel('Valor MDR (R$)')
+    plt.legend()
+    plt.grid(True, alpha=0.3)
+
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%b/%Y'))
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.show()
@@ -1,159 +1,591 @@
 from psycopg2 import sql
 import psycopg2
+from psycopg2 import pool
 from psycopg2.extras import execute_values
 import pandas as pd
 import logging
+from contextlib import contextmanager
 from datetime import datetime
+import io
+import json
 import os
+import threading
+import time
 from typing import Dict, List, Optional, Union
 
-def get_existing_records(user, host, password, database, port, schema, table, key_column):
-    """Retorna lista de registros existentes em uma tabela baseado na coluna chave"""
-    try:
-        conn = psycopg2.connect(
+POOL_MIN_CONNECTIONS = int(os.getenv('DB_POOL_MIN', 1))
+POOL_MAX_CONNECTIONS = int(os.getenv('DB_POOL_MAX', 5))
+
+class ConnectionPool:
+    """Pool de conexões compartilhado (ThreadedConnectionPool) com espera limitada e métricas.
+
+    O ThreadedConnectionPool levanta PoolError quando esgotado; aqui um semáforo faz a
+    thread aguardar uma conexão livre, e o tempo de espera entra nas métricas.
+    """
+
+    def __init__(self, host, port, user, password, database,
+                 minconn=POOL_MIN_CONNECTIONS, maxconn=POOL_MAX_CONNECTIONS):
+        self.maxconn = maxconn
+        self._pool = pool.ThreadedConnectionPool(
+            minconn, maxconn,
             host=host,
             port=port,
             user=user,
             password=password,
             database=database
         )
-        
-        with conn.cursor() as cur:
+        self._semaphore = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.in_use = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        # id das conexões já entregues pelo pool e ainda não descartadas
+        self._conexoes = set()
+
+    def getconn(self, timeout=None):
+        inicio = time.perf_counter()
+        if not self._semaphore.acquire(timeout=timeout):
+            raise pool.PoolError(f"Nenhuma conexão livre no pool após {timeout} s")
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._semaphore.release()
+            raise
+        espera = time.perf_counter() - inicio
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self._conexoes.add(id(conn))
+            self.wait_time += espera
+            self.max_wait_time = max(self.max_wait_time, espera)
+        return conn
+
+    def putconn(self, conn):
+        descartar = True
+        try:
+            # Conexões com transação aberta ou quebradas não voltam sujas para o pool
+            if not conn.closed:
+                conn.rollback()
+            descartar = bool(conn.closed)
+            self._pool.putconn(conn, close=descartar)
+        except Exception as e:
+            descartar = True
+            logging.warning(f"Descartando conexão do pool: {e}")
+            self._pool.putconn(conn, close=True)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+                if descartar:
+                    self._conexoes.discard(id(conn))
+            self._semaphore.release()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'wait_time': round(self.wait_time, 6),
+                'max_wait_time': round(self.max_wait_time, 6),
+                'open_connections': len(self._conexoes),
+                'in_use': self.in_use,
+                'max_connections': self.maxconn
+            }
+
+    def closeall(self):
+        self._pool.closeall()
+        with self._lock:
+            self._conexoes.clear()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(user, host, password, database, port):
+    """Retorna o pool de conexões dos parâmetros informados, criando-o no primeiro uso"""
+    chave = (host, str(port), user, database)
+    with _pools_lock:
+        if chave not in _pools:
+            _pools[chave] = ConnectionPool(host=host, port=port, user=user, password=password, database=database)
+            logging.info(f"Pool de conexões criado para {database}@{host} (máx. {POOL_MAX_CONNECTIONS})")
+        return _pools[chave]
+
+@contextmanager
+def get_connection(user, host, password, database, port, conn=None, timeout=None):
+    """Empresta uma conexão do pool; ela é devolvida (com rollback do que não foi commitado) na saída.
+
+    Se conn for informada, ela é usada como está e continua sob controle do chamador.
+    """
+    if conn is not None:
+        yield conn
+        return
+
+    connection_pool = get_pool(user, host, password, database, port)
+    conn = connection_pool.getconn(timeout=timeout)
+    try:
+        yield conn
+    finally:
+        connection_pool.putconn(conn)
+
+def pool_metrics():
+    """Métricas dos pools abertos: checkouts, tempo de espera e conexões abertas"""
+    with _pools_lock:
+        return {f"{database}@{host}:{port}": p.metrics() for (host, port, user, database), p in _pools.items()}
+
+def close_pools():
+    """Fecha todas as conexões dos pools (fim da execução)"""
+    with _pools_lock:
+        for connection_pool in _pools.values():
+            logging.info(f"Métricas do pool de conexões: {connection_pool.metrics()}")
+            connection_pool.closeall()
+        _pools.clear()
+
+def get_existing_records(user, host, password, database, port, schema, table, key_column):
+    """Retorna lista de registros existentes em uma tabela baseado na coluna chave"""
+    try:
+        with get_connection(user, host, password, database, port) as conn:
+            with conn.cursor() as cur:
+                query = sql.SQL("""
+                    SELECT {} 
+                    FROM {}.{}
+                """).format(
+                    sql.Identifier(key_column),
+                    sql.Identifier(schema),
+                    sql.Identifier(table)
+                )
+                
+                cur.execute(query)
+                results = cur.fetchall()
+                return [row[0] for row in results]
+            
+    except Exception as e:
+        logging.error(f"Erro ao buscar registros existentes: {e}")
+        raise
+
+def insert_df_to_db(user, host, password, database, port, schema, table, df):
+    """Insere um DataFrame em uma tabela do banco de dados"""
+    try:
+        with get_connection(user, host, password, database, port) as conn:
+            # Converte o DataFrame para uma lista de tuplas
+            records = [tuple(x) for x in df.values]
+            
+            # Obtém os nomes das colunas
+            columns = df.columns.tolist()
+            
+            # Cria a query de inserção
             query = sql.SQL("""
-                SELECT {} 
-                FROM {}.{}
+                INSERT INTO {}.{} ({})
+                VALUES ({})
             """).format(
-                sql.Identifier(key_column),
                 sql.Identifier(schema),
-                sql.Identifier(table)
+                sql.Identifier(table),
+                sql.SQL(', ').join(map(sql.Identifier, columns)),
+                sql.SQL(', ').join(sql.Placeholder() * len(columns))
             )
             
-            cur.execute(query)
-            results = cur.fetchall()
-            return [row[0] for row in results]
+            with conn.cursor() as cur:
+                cur.executemany(query, records)
+                conn.commit()
+                logging.info(f"{len(records)} registros inseridos na tabela {table}")
             
     except Exception as e:
-        logging.error(f"Erro ao buscar registros existentes: {e}")
+        # O rollback do que não foi commitado é feito ao devolver a conexão ao pool
+        logging.error(f"Erro ao inserir dados na tabela {table}: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def insert_df_to_db(user, host, password, database, port, schema, table, df):
-    """Insere um DataFrame em uma tabela do banco de dados"""
+def copy_df_to_db(user, host, password, database, port, schema, table, df, conn=None, chunk_size=100000):
+    """Carrega um DataFrame em uma tabela via COPY ... FROM STDIN, em blocos de CSV em memória.
+
+    Se conn for informada, o COPY roda na transação do chamador (sem commit).
+    """
+    should_commit = conn is None
     try:
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database
-        )
-        
-        # Converte o DataFrame para uma lista de tuplas
-        records = [tuple(x) for x in df.values]
-        
-        # Obtém os nomes das colunas
-        columns = df.columns.tolist()
-        
-        # Cria a query de inserção
-        query = sql.SQL("""
-            INSERT INTO {}.{} ({})
-            VALUES ({})
-        """).format(
-            sql.Identifier(schema),
-            sql.Identifier(table),
-            sql.SQL(', ').join(map(sql.Identifier, columns)),
-            sql.SQL(', ').join(sql.Placeholder() * len(columns))
-        )
-        
-        with conn.cursor() as cur:
-            cur.executemany(query, records)
+        with get_connection(user, host, password, database, port, conn=conn) as conn:
+            # NULL explícito para diferenciar valores ausentes de strings vazias
+            query = sql.SQL("COPY {}.{} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')").format(
+                sql.Identifier(schema),
+                sql.Identifier(table),
+                sql.SQL(', ').join(map(sql.Identifier, df.columns))
+            )
+
+            with conn.cursor() as cur:
+                for inicio in range(0, len(df), chunk_size):
+                    buffer = io.StringIO()
+                    df.iloc[inicio:inicio + chunk_size].to_csv(buffer, index=False, header=False, na_rep='\\N')
+                    buffer.seek(0)
+                    cur.copy_expert(query, buffer)
+
+            if should_commit:
+                conn.commit()
+            logging.info(f"{len(df)} registros carregados via COPY na tabela {table}")
+
+    except Exception as e:
+        logging.error(f"Erro ao carregar dados via COPY na tabela {table}: {e}")
+        raise
+
+def upsert_dimension_df(user, host, password, database, port, schema, table, df, key_column, conn=None):
+    """Insere no banco apenas as chaves novas de uma dimensão, sem trazer a tabela para o Python.
+
+    O lote é carregado via COPY numa tabela temporária e inserido com
+    INSERT ... SELECT ... ON CONFLICT (key_column) DO NOTHING; o custo depende só do lote.
+    Retorna a quantidade de registros inseridos.
+    """
+    should_commit = conn is None
+    try:
+        with get_connection(user, host, password, database, port, conn=conn) as conn:
+            staging = f"stg_{table}"
+            columns = sql.SQL(', ').join(map(sql.Identifier, df.columns))
+
+            with conn.cursor() as cur:
+                # A tabela temporária é descartada no fim da transação
+                cur.execute(sql.SQL("DROP TABLE IF EXISTS pg_temp.{}").format(sql.Identifier(staging)))
+                cur.execute(sql.SQL("""
+                    CREATE TEMP TABLE {} ON COMMIT DROP AS
+                    SELECT {} FROM {}.{} WITH NO DATA
+                """).format(
+                    sql.Identifier(staging),
+                    columns,
+                    sql.Identifier(schema),
+                    sql.Identifier(table)
+                ))
+
+            copy_df_to_db(user, host, password, database, port, 'pg_temp', staging, df, conn=conn)
+
+            # ORDER BY: cargas concorrentes travam as chaves na mesma ordem (evita deadlock)
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    INSERT INTO {}.{} ({})
+                    SELECT {} FROM pg_temp.{}
+                    ORDER BY {}
+                    ON CONFLICT ({}) DO NOTHING
+                """).format(
+                    sql.Identifier(schema),
+                    sql.Identifier(table),
+                    columns,
+                    columns,
+                    sql.Identifier(staging),
+                    sql.Identifier(key_column),
+                    sql.Identifier(key_column)
+                ))
+                inserted = cur.rowcount
+
+            if should_commit:
+                conn.commit()
+            logging.info(f"{inserted} novos registros inseridos na tabela {table}")
+            return inserted
+
+    except Exception as e:
+        logging.error(f"Erro ao atualizar a dimensão {table}: {e}")
+        raise
+
+def merge_fact_rows(user, host, password, database, port, schema, table, df, file_id,
+                    hash_column='hash_registro', conn=None):
+    """Sincroniza as linhas de um arquivo na tabela de fatos pelo hash de cada linha.
+
+    Só os hashes do lote vão para uma tabela temporária; no banco são apagadas as linhas
+    do file_id cujo hash não está mais no arquivo e só as linhas com hash novo são
+    carregadas via COPY. Reprocessar um arquivo com poucas linhas corrigidas custa só
+    essas linhas. Retorna (inseridas, removidas).
+    """
+    should_commit = conn is None
+    try:
+        with get_connection(user, host, password, database, port, conn=conn) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    sql.SQL("SELECT EXISTS (SELECT 1 FROM {}.{} WHERE file_id = %s)").format(
+                        sql.Identifier(schema), sql.Identifier(table)
+                    ),
+                    (file_id,)
+                )
+                existe = cur.fetchone()[0]
+
+            if not existe:
+                # Primeira carga do arquivo: não há o que comparar
+                copy_df_to_db(user, host, password, database, port, schema, table, df, conn=conn)
+                inseridas, removidas = len(df), 0
+            else:
+                staging = f"stg_{table}_hash"
+                with conn.cursor() as cur:
+                    cur.execute(sql.SQL("DROP TABLE IF EXISTS pg_temp.{}").format(sql.Identifier(staging)))
+                    cur.execute(sql.SQL("""
+                        CREATE TEMP TABLE {} ON COMMIT DROP AS
+                        SELECT {} FROM {}.{} WITH NO DATA
+                    """).format(
+                        sql.Identifier(staging),
+                        sql.Identifier(hash_column),
+                        sql.Identifier(schema),
+                        sql.Identifier(table)
+                    ))
+
+                copy_df_to_db(user, host, password, database, port, 'pg_temp', staging, df[[hash_column]],
+                              conn=conn)
+
+                identificadores = {
+                    'schema': sql.Identifier(schema),
+                    'table': sql.Identifier(table),
+                    'staging': sql.Identifier(staging),
+                    'hash': sql.Identifier(hash_column)
+                }
+                with conn.cursor() as cur:
+                    # Linhas que saíram do arquivo (ou carregadas antes do hash existir)
+                    cur.execute(sql.SQL("""
+                        DELETE FROM {schema}.{table} t
+                        WHERE t.file_id = %s
+                          AND NOT EXISTS (SELECT 1 FROM pg_temp.{staging} s WHERE s.{hash} = t.{hash})
+                    """).format(**identificadores), (file_id,))
+                    removidas = cur.rowcount
+
+                    # Só os hashes novos voltam para o Python
+                    cur.execute(sql.SQL("""
+                        SELECT s.{hash} FROM pg_temp.{staging} s
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM {schema}.{table} t
+                            WHERE t.file_id = %s AND t.{hash} = s.{hash}
+                        )
+                    """).format(**identificadores), (file_id,))
+                    novos = {row[0] for row in cur.fetchall()}
+
+                df_novos = df[df[hash_column].isin(novos)]
+                if not df_novos.empty:
+                    copy_df_to_db(user, host, password, database, port, schema, table, df_novos, conn=conn)
+                inseridas = len(df_novos)
+
+            if should_commit:
+                conn.commit()
+            logging.info(f"Merge na tabela {table}: {inseridas} linhas inseridas, {removidas} removidas")
+            return inseridas, removidas
+
+    except Exception as e:
+        logging.error(f"Erro ao sincronizar as linhas do arquivo {file_id} na tabela {table}: {e}")
+        raise
+
+# Chave de mdr_agregado calculada a partir de uma linha de transacoes (alias t)
+MDR_AGREGADO_GRUPO = """
+    DATE_TRUNC('month', t.data_transacao)::date AS mes,
+    t.codigo_produto,
+    CASE WHEN t.numero_total_parcelas > '01' THEN 'parcelado' ELSE 'a_vista' END AS tipo_parcelamento,
+    t.codigo_bandeira,
+    t.identificacao_loja
+"""
+
+# Agregação por venda (DISTINCT, já que cada parcela é uma linha em transacoes) por grupo
+MDR_AGREGADO_INSERT = """
+    INSERT INTO {schema}.mdr_agregado
+    (mes, codigo_produto, tipo_parcelamento, codigo_bandeira, identificacao_loja,
+    total_transacoes, valor_bruto, valor_liquido, mdr_nominal)
+    SELECT
+        mes, codigo_produto, tipo_parcelamento, codigo_bandeira, identificacao_loja,
+        COUNT(*),
+        SUM(valor_bruto_venda),
+        SUM(valor_liquido_venda),
+        SUM(valor_bruto_venda - valor_liquido_venda)
+    FROM (
+        SELECT DISTINCT t.nsu_host_transacao, t.valor_bruto_venda, t.valor_liquido_venda, {grupo}
+        FROM {schema}.transacoes t
+        {filtro}
+    ) vendas
+    GROUP BY mes, codigo_produto, tipo_parcelamento, codigo_bandeira, identificacao_loja
+"""
+
+def mark_mdr_groups(user, host, password, database, port, file_id, schema='unica_transactions', conn=None):
+    """Marca, numa tabela temporária da transação, os grupos de mdr_agregado com linhas do arquivo.
+
+    Chamada antes e depois de alterar as linhas do arquivo, para cobrir grupos que
+    ganharam e que perderam linhas; refresh_mdr_groups recalcula só esses grupos.
+    """
+    try:
+        with get_connection(user, host, password, database, port, conn=conn) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS stg_mdr_grupos (
+                        mes date,
+                        codigo_produto varchar,
+                        tipo_parcelamento varchar(10),
+                        codigo_bandeira varchar,
+                        identificacao_loja varchar(15)
+                    ) ON COMMIT DROP
+                """)
+                cur.execute(
+                    sql.SQL("INSERT INTO pg_temp.stg_mdr_grupos SELECT DISTINCT {} FROM {}.transacoes t "
+                            "WHERE t.file_id = %s").format(sql.SQL(MDR_AGREGADO_GRUPO), sql.Identifier(schema)),
+                    (file_id,)
+                )
+
+    except Exception as e:
+        logging.error(f"Erro ao marcar os grupos de mdr_agregado do arquivo {file_id}: {e}")
+        raise
+
+def refresh_mdr_groups(user, host, password, database, port, schema='unica_transactions', conn=None):
+    """Recalcula em mdr_agregado os grupos marcados por mark_mdr_groups, na transação do chamador.
+
+    Cada grupo (mês, produto, tipo de parcelamento, bandeira, loja) é refeito a partir de
+    transacoes com o mesmo DISTINCT por venda das análises, lendo só as linhas do grupo.
+    Um advisory lock da transação serializa o recálculo entre cargas concorrentes.
+    Retorna a quantidade de grupos recalculados.
+    """
+    should_commit = conn is None
+    try:
+        with get_connection(user, host, password, database, port, conn=conn) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext('unica_transactions.mdr_agregado'))")
+                cur.execute("""
+                    CREATE TEMP TABLE stg_mdr_grupos_unicos ON COMMIT DROP AS
+                    SELECT DISTINCT * FROM pg_temp.stg_mdr_grupos
+                """)
+                cur.execute(sql.SQL("""
+                    DELETE FROM {}.mdr_agregado a
+                    USING pg_temp.stg_mdr_grupos_unicos g
+                    WHERE a.mes = g.mes
+                      AND a.codigo_produto = g.codigo_produto
+                      AND a.tipo_parcelamento = g.tipo_parcelamento
+                      AND a.codigo_bandeira = g.codigo_bandeira
+                      AND a.identificacao_loja = g.identificacao_loja
+                """).format(sql.Identifier(schema)))
+                cur.execute(sql.SQL(MDR_AGREGADO_INSERT).format(
+                    schema=sql.Identifier(schema),
+                    grupo=sql.SQL(MDR_AGREGADO_GRUPO),
+                    filtro=sql.SQL("""
+                        JOIN pg_temp.stg_mdr_grupos_unicos g
+                          ON t.data_transacao >= g.mes
+                         AND t.data_transacao < g.mes + INTERVAL '1 month'
+                         AND t.identificacao_loja = g.identificacao_loja
+                         AND t.codigo_produto = g.codigo_produto
+                         AND t.codigo_bandeira = g.codigo_bandeira
+                         AND (CASE WHEN t.numero_total_parcelas > '01' THEN 'parcelado' ELSE 'a_vista' END)
+                             = g.tipo_parcelamento
+                    """)
+                ))
+                cur.execute("SELECT COUNT(*) FROM pg_temp.stg_mdr_grupos_unicos")
+                grupos = cur.fetchone()[0]
+                cur.execute("DROP TABLE pg_temp.stg_mdr_grupos_unicos")
+                cur.execute("TRUNCATE pg_temp.stg_mdr_grupos")
+
+            if should_commit:
+                conn.commit()
+            logging.info(f"{grupos} grupos recalculados em mdr_agregado")
+            return grupos
+
+    except Exception as e:
+        logging.error(f"Erro ao atualizar mdr_agregado: {e}")
+        raise
+
+def rebuild_mdr_aggregate(user, host, password, database, port, schema='unica_transactions'):
+    """Recria mdr_agregado a partir de toda a tabela transacoes (carga inicial ou conferência)"""
+    try:
+        with get_connection(user, host, password, database, port) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext('unica_transactions.mdr_agregado'))")
+                cur.execute(sql.SQL("TRUNCATE {}.mdr_agregado").format(sql.Identifier(schema)))
+                cur.execute(sql.SQL(MDR_AGREGADO_INSERT).format(
+                    schema=sql.Identifier(schema),
+                    grupo=sql.SQL(MDR_AGREGADO_GRUPO),
+                    filtro=sql.SQL('')
+                ))
+                grupos = cur.rowcount
             conn.commit()
-            logging.info(f"{len(records)} registros inseridos na tabela {table}")
-            
+            logging.info(f"mdr_agregado recriado com {grupos} grupos")
+            return grupos
+
     except Exception as e:
-        logging.error(f"Erro ao inserir dados na tabela {table}: {e}")
-        if conn:
-            conn.rollback()
+        logging.error(f"Erro ao recriar mdr_agregado: {e}")
+        raise
+
+def delete_attempt_rows(user, host, password, database, port, file_id, schema='unica_transactions', conn=None):
+    """Apaga erros de validação e quarentena registrados em tentativas anteriores do arquivo"""
+    should_commit = conn is None
+    try:
+        with get_connection(user, host, password, database, port, conn=conn) as conn:
+            with conn.cursor() as cur:
+                for table in ('erros_validacao', 'transacoes_quarantine'):
+                    cur.execute(
+                        sql.SQL("DELETE FROM {}.{} WHERE file_id = %s").format(
+                            sql.Identifier(schema), sql.Identifier(table)
+                        ),
+                        (file_id,)
+                    )
+
+            if should_commit:
+                conn.commit()
+
+    except Exception as e:
+        logging.error(f"Erro ao limpar tentativas anteriores do arquivo {file_id}: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def get_processed_files(user, host, password, database, port, schema='unica_transactions'):
     """Retorna lista de arquivos já processados com sucesso"""
     try:
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database
-        )
-        
-        with conn.cursor() as cur:
-            query = sql.SQL("""
-                SELECT nome_arquivo 
-                FROM {}.controle_arquivos 
-                WHERE status_processamento = 'SUCESSO'
-            """).format(sql.Identifier(schema))
-            
-            cur.execute(query)
-            processed_files = [row[0] for row in cur.fetchall()]
-            
-            return processed_files
+        with get_connection(user, host, password, database, port) as conn:
+            with conn.cursor() as cur:
+                query = sql.SQL("""
+                    SELECT nome_arquivo 
+                    FROM {}.controle_arquivos 
+                    WHERE status_processamento = 'SUCESSO'
+                """).format(sql.Identifier(schema))
+                
+                cur.execute(query)
+                processed_files = [row[0] for row in cur.fetchall()]
+                
+                return processed_files
             
     except Exception as e:
         logging.error(f"Erro ao buscar arquivos processados: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def register_file_processing(user, host, password, database, port, file_name, data_geracao, 
                            status, error=None, google_drive_path=None, schema='unica_transactions'):
-    """Registra o processamento de um arquivo e retorna o ID do registro"""
+    """Registra (ou atualiza, se o arquivo já existe) o processamento e retorna o ID do registro"""
     try:
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database
-        )
-        
-        with conn.cursor() as cur:
-            query = sql.SQL("""
-                INSERT INTO {}.controle_arquivos 
-                (nome_arquivo, data_geracao, data_processamento, status_processamento, 
-                erro_processamento, arquivo_google_drive_path)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """).format(sql.Identifier(schema))
-            
-            cur.execute(query, (
-                file_name,
-                data_geracao,
-                datetime.now(),
-                status,
-                error,
-                google_drive_path
-            ))
-            
-            file_id = cur.fetchone()[0]
-            conn.commit()
-            logging.info(f"Registro de processamento criado para o arquivo {file_name}")
-            return file_id
+        with get_connection(user, host, password, database, port) as conn:
+            with conn.cursor() as cur:
+                query = sql.SQL("""
+                    INSERT INTO {}.controle_arquivos
+                    (nome_arquivo, data_geracao, data_processamento, status_processamento,
+                    erro_processamento, arquivo_google_drive_path)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (nome_arquivo) DO UPDATE SET
+                        data_geracao = EXCLUDED.data_geracao,
+                        data_processamento = EXCLUDED.data_processamento,
+                        status_processamento = EXCLUDED.status_processamento,
+                        erro_processamento = EXCLUDED.erro_processamento,
+                        arquivo_google_drive_path = EXCLUDED.arquivo_google_drive_path
+                    RETURNING id
+                """).format(sql.Identifier(schema))
+                
+                cur.execute(query, (
+                    file_name,
+                    data_geracao,
+                    datetime.now(),
+                    status,
+                    error,
+                    google_drive_path
+                ))
+                
+                file_id = cur.fetchone()[0]
+                conn.commit()
+                logging.info(f"Registro de processamento criado para o arquivo {file_name}")
+                return file_id
             
     except Exception as e:
         logging.error(f"Erro ao registrar processamento do arquivo {file_name}: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
+
+def update_file_metrics(user, host, password, database, port, file_id, metricas,
+                        schema='unica_transactions', conn=None):
+    """Grava as métricas (dicionário) do processamento do arquivo na coluna metricas"""
+    should_commit = conn is None
+    try:
+        with get_connection(user, host, password, database, port, conn=conn) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    sql.SQL("UPDATE {}.controle_arquivos SET metricas = %s::jsonb WHERE id = %s").format(
+                        sql.Identifier(schema)
+                    ),
+                    (json.dumps(metricas, ensure_ascii=False), file_id)
+                )
+            if should_commit:
+                conn.commit()
+
+    except Exception as e:
+        logging.error(f"Erro ao gravar as métricas do arquivo {file_id}: {e}")
+        raise
 
 def get_google_drive_files(directory):
     """Lista arquivos existentes no diretório do Google Drive"""
@@ -171,79 +603,139 @@ def get_google_drive_files(directory):
 def get_file_processing_status(user, host, password, database, port, schema='unica_transactions'):
     """Retorna o status de processamento de todos os arquivos registrados"""
     try:
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database
-        )
-        
-        with conn.cursor() as cur:
-            query = sql.SQL("""
-                SELECT nome_arquivo, status_processamento, erro_processamento
-                FROM {}.controle_arquivos
-            """).format(sql.Identifier(schema))
-            
-            cur.execute(query)
-            results = cur.fetchall()
-            
-            # Converte para um dicionário para fácil acesso
-            return {row[0]: {'status': row[1], 'erro': row[2]} for row in results}
+        with get_connection(user, host, password, database, port) as conn:
+            with conn.cursor() as cur:
+                query = sql.SQL("""
+                    SELECT nome_arquivo, status_processamento, erro_processamento
+                    FROM {}.controle_arquivos
+                """).format(sql.Identifier(schema))
+                
+                cur.execute(query)
+                results = cur.fetchall()
+                
+                # Converte para um dicionário para fácil acesso
+                return {row[0]: {'status': row[1], 'erro': row[2]} for row in results}
             
     except Exception as e:
         logging.error(f"Erro ao buscar status de processamento dos arquivos: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
+
+def get_file_processing_status_since(user, host, password, database, port, since=None,
+                                     schema='unica_transactions'):
+    """Retorna o status dos arquivos alterados desde `since` (updated_at), para atualização incremental.
+
+    Retorna (status, total, max_updated_at, max_data_geracao): status no mesmo formato de
+    get_file_processing_status, só com as linhas alteradas (todas se since for None), e os
+    totais da tabela para o chamador conferir o índice local.
+    """
+    try:
+        with get_connection(user, host, password, database, port) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    SELECT count(*), max(updated_at), max(data_geracao)
+                    FROM {}.controle_arquivos
+                """).format(sql.Identifier(schema)))
+                total, max_updated_at, max_data_geracao = cur.fetchone()
+
+                query = sql.SQL("""
+                    SELECT nome_arquivo, status_processamento, erro_processamento
+                    FROM {}.controle_arquivos
+                """).format(sql.Identifier(schema))
+                params = None
+                if since is not None:
+                    # Só o filtro simples em updated_at usa idx_controle_updated_at
+                    query += sql.SQL(" WHERE updated_at >= %s")
+                    params = (since,)
+                cur.execute(query, params)
+                status = {row[0]: {'status': row[1], 'erro': row[2]} for row in cur.fetchall()}
+
+                return status, total, max_updated_at, max_data_geracao
+
+    except Exception as e:
+        logging.error(f"Erro ao buscar alterações no status de processamento dos arquivos: {e}")
+        raise
+
+def find_duplicate_file(user, host, password, database, port, hash_conteudo, file_name=None,
+                        schema='unica_transactions', conn=None):
+    """Retorna o nome de um arquivo já carregado com SUCESSO com o mesmo conteúdo (ou None)"""
+    try:
+        with get_connection(user, host, password, database, port, conn=conn) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    SELECT nome_arquivo
+                    FROM {}.controle_arquivos
+                    WHERE hash_conteudo = %s
+                      AND status_processamento = 'SUCESSO'
+                      AND nome_arquivo IS DISTINCT FROM %s
+                    LIMIT 1
+                """).format(sql.Identifier(schema)), (hash_conteudo, file_name))
+                result = cur.fetchone()
+                return result[0] if result else None
+
+    except Exception as e:
+        logging.error(f"Erro ao buscar arquivo duplicado: {e}")
+        raise
+
+def get_content_hashes(user, host, password, database, port, schema='unica_transactions'):
+    """Retorna {hash_conteudo: nome_arquivo} dos arquivos carregados com SUCESSO"""
+    try:
+        with get_connection(user, host, password, database, port) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    SELECT hash_conteudo, nome_arquivo
+                    FROM {}.controle_arquivos
+                    WHERE status_processamento = 'SUCESSO' AND hash_conteudo IS NOT NULL
+                """).format(sql.Identifier(schema)))
+                return dict(cur.fetchall())
+
+    except Exception as e:
+        logging.error(f"Erro ao buscar hashes dos arquivos processados: {e}")
+        raise
 
 def delete_file_data(user: str, host: str, password: str, database: str, 
                     port: str, file_name: str, schema: str = 'unica_transactions') -> bool:
-    conn = None
     try:
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=database
-        )
-        
-        conn.autocommit = False
-        
-        with conn.cursor() as cur:
-            cur.execute(sql.SQL("""
-                SELECT id FROM {}.controle_arquivos 
-                WHERE nome_arquivo = %s
-            """).format(sql.Identifier(schema)), (file_name,))
-            
-            result = cur.fetchone()
-            if not result:
-                logging.warning(f"Arquivo {file_name} não encontrado no banco de dados")
-                return False
+        with get_connection(user, host, password, database, port) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    SELECT id FROM {}.controle_arquivos 
+                    WHERE nome_arquivo = %s
+                """).format(sql.Identifier(schema)), (file_name,))
                 
-            file_id = result[0]
-            
-            cur.execute(sql.SQL("""
-                DELETE FROM {}.transacoes 
-                WHERE file_id = %s
-            """).format(sql.Identifier(schema)), (file_id,))
-            
-            cur.execute(sql.SQL("""
-                DELETE FROM {}.controle_arquivos 
-                WHERE id = %s
-            """).format(sql.Identifier(schema)), (file_id,))
-            
-            conn.commit()
-            logging.info(f"Dados do arquivo {file_name} deletados com sucesso")
-            return True
+                result = cur.fetchone()
+                if not result:
+                    logging.warning(f"Arquivo {file_name} não encontrado no banco de dados")
+                    return False
+                    
+                file_id = result[0]
+                mark_mdr_groups(user, host, password, database, port, file_id, schema=schema, conn=conn)
+                
+                cur.execute(sql.SQL("""
+                    DELETE FROM {}.transacoes 
+                    WHERE file_id = %s
+                """).format(sql.Identifier(schema)), (file_id,))
+                refresh_mdr_groups(user, host, password, database, port, schema=schema, conn=conn)
+                
+                cur.execute(sql.SQL("""
+                    DELETE FROM {}.erros_validacao 
+                    WHERE file_id = %s
+                """).format(sql.Identifier(schema)), (file_id,))
+                
+                cur.execute(sql.SQL("""
+                    DELETE FROM {}.transacoes_quarantine 
+                    WHERE file_id = %s
+                """).format(sql.Identifier(schema)), (file_id,))
+                
+                cur.execute(sql.SQL("""
+                    DELETE FROM {}.controle_arquivos 
+                    WHERE id = %s
+                """).format(sql.Identifier(schema)), (file_id,))
+                
+                conn.commit()
+                logging.info(f"Dados do arquivo {file_name} deletados com sucesso")
+                return True
             
     except Exception as e:
+        # A conexão volta ao pool com rollback da transação
         logging.error(f"Erro ao deletar dados do arquivo {file_name}: {e}")
-        if conn:
-            conn.rollback()
         return False
-    finally:
-        if conn:
-            conn.close()
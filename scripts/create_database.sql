@@ -23,9 +23,13 @@ CREATE TABLE unica_transactions.controle_arquivos (
     status_processamento varchar(20) NOT NULL,
     erro_processamento text,
     arquivo_google_drive_path varchar(255),
+    hash_conteudo varchar(64),
+    id_movimento varchar(6),
+    nseq_registro varchar(6),
+    metricas jsonb,
     created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT check_status_valido CHECK (status_processamento IN ('SUCESSO', 'ERRO', 'PROCESSANDO'))
+    CONSTRAINT check_status_valido CHECK (status_processamento IN ('SUCESSO', 'ERRO', 'PROCESSANDO', 'DUPLICADO'))
 );
 
 CREATE TABLE unica_transactions.tempo (
@@ -112,6 +116,7 @@ CREATE TABLE unica_transactions.transacoes (
     sequencial_operacao_recebivel varchar(2),
     tipo_operacao_recebivel varchar(1),
     valor_operacao_recebivel decimal(15,2),
+    hash_registro bigint,
     file_id uuid NOT NULL,
     created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -123,6 +128,43 @@ CREATE TABLE unica_transactions.transacoes (
     CONSTRAINT fk_arquivo FOREIGN KEY (file_id) REFERENCES unica_transactions.controle_arquivos(id)
 );
 
+CREATE TABLE unica_transactions.erros_validacao (
+    id uuid PRIMARY KEY DEFAULT uuid_generate_v4(),
+    file_id uuid NOT NULL,
+    nseq varchar,
+    coluna varchar NOT NULL,
+    valor text,
+    mensagem text NOT NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_erros_arquivo FOREIGN KEY (file_id) REFERENCES unica_transactions.controle_arquivos(id)
+);
+
+CREATE TABLE unica_transactions.transacoes_quarantine (
+    id uuid PRIMARY KEY DEFAULT uuid_generate_v4(),
+    file_id uuid NOT NULL,
+    nseq varchar,
+    regras text NOT NULL,
+    mensagens text NOT NULL,
+    registro jsonb NOT NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_quarantine_arquivo FOREIGN KEY (file_id) REFERENCES unica_transactions.controle_arquivos(id)
+);
+
+CREATE TABLE unica_transactions.mdr_agregado (
+    mes date NOT NULL,
+    codigo_produto varchar NOT NULL,
+    tipo_parcelamento varchar(10) NOT NULL,
+    codigo_bandeira varchar NOT NULL,
+    identificacao_loja varchar(15) NOT NULL,
+    total_transacoes bigint NOT NULL,
+    valor_bruto decimal(18,2) NOT NULL,
+    valor_liquido decimal(18,2) NOT NULL,
+    mdr_nominal decimal(18,2) NOT NULL,
+    updated_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (mes, codigo_produto, tipo_parcelamento, codigo_bandeira, identificacao_loja),
+    CONSTRAINT check_tipo_parcelamento CHECK (tipo_parcelamento IN ('a_vista', 'parcelado'))
+);
+
 --------------------
 
 CREATE TRIGGER update_controle_arquivos_updated_at
@@ -160,7 +202,7 @@ CREATE TRIGGER update_transacoes_updated_at
 CREATE INDEX idx_transacoes_data_loja ON unica_transactions.transacoes(data_transacao, identificacao_loja);
 CREATE INDEX idx_transacoes_bandeira ON unica_transactions.transacoes(codigo_bandeira);
 CREATE INDEX idx_transacoes_produto ON unica_transactions.transacoes(codigo_produto);
-CREATE INDEX idx_transacoes_file ON unica_transactions.transacoes(file_id);
+CREATE INDEX idx_transacoes_file ON unica_transactions.transacoes(file_id, hash_registro);
 
 CREATE INDEX idx_tempo_ano_mes ON unica_transactions.tempo(ano, mes);
 CREATE INDEX idx_tempo_data ON unica_transactions.tempo(data);
@@ -173,6 +215,14 @@ CREATE INDEX idx_pagamento_codigo ON unica_transactions.pagamento(codigo_bandeir
 
 CREATE INDEX idx_controle_nome_arquivo ON unica_transactions.controle_arquivos(nome_arquivo);
 CREATE INDEX idx_controle_data_status ON unica_transactions.controle_arquivos(data_geracao, status_processamento);
+CREATE UNIQUE INDEX idx_controle_hash_sucesso ON unica_transactions.controle_arquivos(hash_conteudo)
+    WHERE status_processamento = 'SUCESSO';
+CREATE INDEX idx_controle_movimento ON unica_transactions.controle_arquivos(id_movimento, data_geracao, nseq_registro);
+CREATE INDEX idx_controle_updated_at ON unica_transactions.controle_arquivos(updated_at);
+
+CREATE INDEX idx_erros_validacao_file ON unica_transactions.erros_validacao(file_id);
+CREATE INDEX idx_transacoes_quarantine_file ON unica_transactions.transacoes_quarantine(file_id);
+CREATE INDEX idx_mdr_agregado_produto ON unica_transactions.mdr_agregado(codigo_produto, mes);
 
 -------------------- COMMENTS
 
@@ -182,10 +232,102 @@ COMMENT ON TABLE unica_transactions.loja IS 'Dimensão com informações da loja
 COMMENT ON TABLE unica_transactions.produto IS 'Dimensão com informações dos produtos';
 COMMENT ON TABLE unica_transactions.pagamento IS 'Dimensão com informações das formas de pagamento';
 COMMENT ON TABLE unica_transactions.controle_arquivos IS 'Controle de processamento dos arquivos de transação';
+COMMENT ON TABLE unica_transactions.erros_validacao IS 'Linhas dos arquivos que falharam na validação, por regra';
+COMMENT ON TABLE unica_transactions.transacoes_quarantine IS 'Transações inválidas separadas no carregamento parcial de arquivos';
+COMMENT ON TABLE unica_transactions.mdr_agregado IS 'Agregado mensal de vendas e MDR por produto, parcelamento, bandeira e loja';
+
+-------------------- MIGRAÇÃO
+-- Bancos criados antes destas colunas/índices; idempotente, pode ser executado mais de uma vez
+
+ALTER TABLE unica_transactions.controle_arquivos ADD COLUMN IF NOT EXISTS hash_conteudo varchar(64);
+ALTER TABLE unica_transactions.controle_arquivos ADD COLUMN IF NOT EXISTS id_movimento varchar(6);
+ALTER TABLE unica_transactions.controle_arquivos ADD COLUMN IF NOT EXISTS nseq_registro varchar(6);
+ALTER TABLE unica_transactions.controle_arquivos DROP CONSTRAINT IF EXISTS check_status_valido;
+ALTER TABLE unica_transactions.controle_arquivos ADD CONSTRAINT check_status_valido
+    CHECK (status_processamento IN ('SUCESSO', 'ERRO', 'PROCESSANDO', 'DUPLICADO'));
+CREATE UNIQUE INDEX IF NOT EXISTS idx_controle_hash_sucesso ON unica_transactions.controle_arquivos(hash_conteudo)
+    WHERE status_processamento = 'SUCESSO';
+CREATE INDEX IF NOT EXISTS idx_controle_movimento ON unica_transactions.controle_arquivos(id_movimento, data_geracao, nseq_registro);
+CREATE INDEX IF NOT EXISTS idx_controle_updated_at ON unica_transactions.controle_arquivos(updated_at);
+
+ALTER TABLE unica_transactions.transacoes ADD COLUMN IF NOT EXISTS hash_registro bigint;
+-- idx_transacoes_file era só (file_id); recria com hash_registro apenas se ainda for a versão antiga
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE schemaname = 'unica_transactions'
+          AND indexname = 'idx_transacoes_file'
+          AND indexdef NOT LIKE '%hash_registro%'
+    ) THEN
+        DROP INDEX unica_transactions.idx_transacoes_file;
+    END IF;
+END
+$$;
+CREATE INDEX IF NOT EXISTS idx_transacoes_file ON unica_transactions.transacoes(file_id, hash_registro);
+
+ALTER TABLE unica_transactions.controle_arquivos ADD COLUMN IF NOT EXISTS metricas jsonb;
+
+-- Tabelas criadas depois da primeira versão do schema
+CREATE TABLE IF NOT EXISTS unica_transactions.erros_validacao (
+    id uuid PRIMARY KEY DEFAULT uuid_generate_v4(),
+    file_id uuid NOT NULL,
+    nseq varchar,
+    coluna varchar NOT NULL,
+    valor text,
+    mensagem text NOT NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_erros_arquivo FOREIGN KEY (file_id) REFERENCES unica_transactions.controle_arquivos(id)
+);
+
+CREATE TABLE IF NOT EXISTS unica_transactions.transacoes_quarantine (
+    id uuid PRIMARY KEY DEFAULT uuid_generate_v4(),
+    file_id uuid NOT NULL,
+    nseq varchar,
+    regras text NOT NULL,
+    mensagens text NOT NULL,
+    registro jsonb NOT NULL,
+    created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_quarantine_arquivo FOREIGN KEY (file_id) REFERENCES unica_transactions.controle_arquivos(id)
+);
+
+CREATE TABLE IF NOT EXISTS unica_transactions.mdr_agregado (
+    mes date NOT NULL,
+    codigo_produto varchar NOT NULL,
+    tipo_parcelamento varchar(10) NOT NULL,
+    codigo_bandeira varchar NOT NULL,
+    identificacao_loja varchar(15) NOT NULL,
+    total_transacoes bigint NOT NULL,
+    valor_bruto decimal(18,2) NOT NULL,
+    valor_liquido decimal(18,2) NOT NULL,
+    mdr_nominal decimal(18,2) NOT NULL,
+    updated_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (mes, codigo_produto, tipo_parcelamento, codigo_bandeira, identificacao_loja),
+    CONSTRAINT check_tipo_parcelamento CHECK (tipo_parcelamento IN ('a_vista', 'parcelado'))
+);
+
+-- mdr_agregado criado com codigo_produto/codigo_bandeira varchar(3) (insuficiente para as descrições)
+ALTER TABLE unica_transactions.mdr_agregado ALTER COLUMN codigo_produto TYPE varchar;
+ALTER TABLE unica_transactions.mdr_agregado ALTER COLUMN codigo_bandeira TYPE varchar;
+-- nseq do CV vem de 7 posições (390:397) e é gravado mesmo quando falha a regra de tamanho 6
+ALTER TABLE unica_transactions.erros_validacao ALTER COLUMN nseq TYPE varchar;
+ALTER TABLE unica_transactions.transacoes_quarantine ALTER COLUMN nseq TYPE varchar;
+CREATE INDEX IF NOT EXISTS idx_erros_validacao_file ON unica_transactions.erros_validacao(file_id);
+CREATE INDEX IF NOT EXISTS idx_transacoes_quarantine_file ON unica_transactions.transacoes_quarantine(file_id);
+CREATE INDEX IF NOT EXISTS idx_mdr_agregado_produto ON unica_transactions.mdr_agregado(codigo_produto, mes);
+COMMENT ON TABLE unica_transactions.erros_validacao IS 'Linhas dos arquivos que falharam na validação, por regra';
+COMMENT ON TABLE unica_transactions.transacoes_quarantine IS 'Transações inválidas separadas no carregamento parcial de arquivos';
+COMMENT ON TABLE unica_transactions.mdr_agregado IS 'Agregado mensal de vendas e MDR por produto, parcelamento, bandeira e loja';
+-- Num banco existente mdr_agregado começa vazio: depois desta migração, executar uma vez
+--   python main.py --rebuild-mdr
+-- (rebuild_mdr_aggregate) para calcular o agregado a partir de todas as transações já carregadas
 
 -------------------- DELETE
 
 DELETE FROM unica_transactions.transacoes;
+DELETE FROM unica_transactions.erros_validacao;
+DELETE FROM unica_transactions.transacoes_quarantine;
+DELETE FROM unica_transactions.mdr_agregado;
 DELETE FROM unica_transactions.tempo;
 DELETE FROM unica_transactions.pagamento;
 DELETE FROM unica_transactions.produto;
@@ -196,6 +338,9 @@ DELETE FROM unica_transactions.controle_arquivos;
 --------------------- DROP
 
 drop table unica_transactions.transacoes;
+drop table unica_transactions.erros_validacao;
+drop table unica_transactions.transacoes_quarantine;
+drop table unica_transactions.mdr_agregado;
 drop table unica_transactions.tempo;
 drop table unica_transactions.pagamento;
 drop table unica_transactions.produto;
@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from scripts.connection_db import get_file_processing_status_since
+
+
+class DiscoveryIndex:
+    """Índice local (JSON) das listagens de arquivos, para não refazer tudo a cada execução.
+
+    Guarda entre execuções:
+    - Google Drive: mtime do diretório e nome/tamanho/mtime de cada arquivo. Se o mtime
+      do diretório não mudou (nenhum arquivo criado, removido ou renomeado), a listagem
+      anterior é reaproveitada sem os.listdir.
+    - FTPS: a última listagem, para registrar só o que apareceu ou sumiu.
+    - Banco: o status de controle_arquivos e uma marca d'água em updated_at. Só as linhas
+      alteradas desde a marca são lidas; se a contagem da tabela não bater com o índice
+      (ex.: delete_file_data), o status é recarregado por completo.
+    """
+
+    VERSAO = 1
+    # Transações longas gravam updated_at com o horário de início; a margem relê esse intervalo
+    MARGEM_DB = timedelta(days=1)
+
+    def __init__(self, path):
+        self.path = path
+        self.state = self._load()
+
+    def _load(self):
+        vazio = {'versao': self.VERSAO, 'google_drive': {}, 'sftp': {}, 'db': {}}
+        if not os.path.exists(self.path):
+            return vazio
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('versao') != self.VERSAO:
+                logging.info("Índice de arquivos com versão diferente; será reconstruído")
+                return vazio
+            return state
+        except Exception as e:
+            logging.warning(f"Índice de arquivos ilegível ({e}); será reconstruído")
+            return vazio
+
+    def save(self):
+        """Grava o índice de forma atômica (arquivo temporário + os.replace)"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def google_drive_files(self, directory, force=False):
+        """Lista o diretório do Google Drive, reaproveitando a listagem se o diretório não mudou"""
+        if not os.path.exists(directory):
+            logging.warning(f"Diretório do Google Drive não encontrado: {directory}")
+            return []
+
+        anterior = self.state['google_drive']
+        mtime_ns = os.stat(directory).st_mtime_ns
+        if not force and anterior.get('directory') == directory and anterior.get('mtime_ns') == mtime_ns:
+            logging.info("Diretório do Google Drive sem alterações desde a última execução")
+            return list(anterior['files'])
+
+        files = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = [stat.st_size, stat.st_mtime_ns]
+
+        arquivos_anteriores = anterior.get('files', {}) if anterior.get('directory') == directory else {}
+        novos = files.keys() - arquivos_anteriores.keys()
+        removidos = arquivos_anteriores.keys() - files.keys()
+        alterados = [nome for nome in files.keys() & arquivos_anteriores.keys()
+                     if files[nome] != arquivos_anteriores[nome]]
+        logging.info(f"Google Drive: {len(novos)} novos, {len(removidos)} removidos, "
+                     f"{len(alterados)} alterados desde a última execução")
+
+        self.state['google_drive'] = {'directory': directory, 'mtime_ns': mtime_ns, 'files': files}
+        return list(files)
+
+    def sftp_files(self, listing):
+        """Registra a listagem do FTPS e informa o que mudou desde a última execução"""
+        anteriores = set(self.state['sftp'].get('files', []))
+        atuais = set(listing)
+        logging.info(f"FTPS: {len(atuais - anteriores)} novos, {len(anteriores - atuais)} removidos "
+                     f"desde a última execução")
+        self.state['sftp'] = {'files': sorted(atuais), 'atualizado_em': datetime.now().isoformat()}
+        return list(listing)
+
+    def file_processing_status(self, connection_params, force=False):
+        """Status de controle_arquivos (formato de get_file_processing_status), lendo só o delta"""
+        db = self.state['db']
+        marca = None if force or 'high_water_mark' not in db else datetime.fromisoformat(db['high_water_mark'])
+        since = marca - self.MARGEM_DB if marca else None
+
+        alterados, total, max_updated_at, max_data_geracao = get_file_processing_status_since(
+            **connection_params, since=since
+        )
+        status = dict(db.get('status', {})) if since else {}
+        status.update(alterados)
+
+        if since and len(status) != total:
+            logging.info(f"Índice com {len(status)} arquivos e banco com {total}; recarregando o status completo")
+            return self.file_processing_status(connection_params, force=True)
+
+        logging.info(f"Banco: {len(alterados)} registros de controle lidos (de {total})")
+        self.state['db'] = {
+            'max_data_geracao': max_data_geracao.isoformat() if max_data_geracao else None,
+            'status': status
+        }
+        if max_updated_at:
+            self.state['db']['high_water_mark'] = max_updated_at.isoformat()
+        return status
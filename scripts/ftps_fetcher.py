@@ -0,0 +1,144 @@
+from ftplib import FTP_TLS, error_perm, error_reply
+import logging
+import os
+import queue
+import threading
+
+
+class FtpsFetcher:
+    """Baixa arquivos do diretório de saída do FTPS para a área de staging local.
+
+    Usa uma única sessão FTP_TLS autenticada (login + PROT P) para listar e baixar.
+    Os downloads rodam numa thread em segundo plano, um RETR atrás do outro na mesma
+    sessão, e cada arquivo é entregue assim que termina: o processamento do arquivo N
+    acontece enquanto o arquivo N+1 é baixado.
+    """
+
+    def __init__(self, host, user, password, directory='Saida', staging_dir='.', timeout=60, port=21):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.directory = directory
+        self.staging_dir = staging_dir
+        self.timeout = timeout
+        self.ftps = None
+
+    def connect(self):
+        self.ftps = FTP_TLS(timeout=self.timeout)
+        self.ftps.connect(self.host, self.port)
+        self.ftps.login(user=self.user, passwd=self.password)
+        self.ftps.prot_p()
+        self.ftps.cwd(self.directory)
+        # Modo binário: para o SIZE (quando suportado) e para não converter quebras de linha
+        self.ftps.voidcmd('TYPE I')
+        logging.info("Conexão FTPS estabelecida com sucesso.")
+        return self
+
+    def close(self):
+        if self.ftps is None:
+            return
+        try:
+            self.ftps.quit()
+        except Exception as e:
+            logging.warning(f"Erro ao encerrar a sessão FTPS: {e}")
+            self.ftps.close()
+        self.ftps = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _ensure_session(self):
+        """Reconecta se o servidor encerrou a sessão ociosa (ex.: durante o processamento)"""
+        try:
+            if self.ftps is not None:
+                self.ftps.voidcmd('NOOP')
+                return
+        except Exception as e:
+            logging.warning(f"Sessão FTPS perdida, reconectando: {e}")
+            self.ftps.close()
+        self.connect()
+
+    def list_files(self):
+        return self.ftps.nlst()
+
+    def _remote_size(self, file_name):
+        """Tamanho do arquivo no servidor, ou None quando o servidor não suporta SIZE"""
+        try:
+            return self.ftps.size(file_name)
+        except (error_perm, error_reply) as e:
+            logging.info(f"SIZE indisponível para {file_name}, tamanho desconhecido: {e}")
+            return None
+
+    def download(self, file_name):
+        """Baixa um arquivo para o staging.
+
+        O arquivo é gravado como .part e só é renomeado quando o RETR termina, para que
+        um download interrompido nunca seja confundido com um arquivo completo. O SIZE do
+        servidor, quando disponível, serve só para log; a integridade do conteúdo é
+        conferida pela validação de estrutura (trailer) no processamento.
+        """
+        local_path = os.path.join(self.staging_dir, file_name)
+        partial_path = local_path + '.part'
+        try:
+            self._ensure_session()
+            expected_size = self._remote_size(file_name)
+            with open(partial_path, 'wb') as f:
+                self.ftps.retrbinary(f"RETR {file_name}", f.write, blocksize=1024 * 1024)
+
+            local_size = os.path.getsize(partial_path)
+            if expected_size is not None and local_size != expected_size:
+                logging.warning(f"Tamanho divergente em {file_name}: {local_size} bytes baixados, "
+                                f"{expected_size} informados pelo servidor")
+
+            os.replace(partial_path, local_path)
+            logging.info(f"Arquivo baixado do FTPS: {file_name} ({local_size} bytes)")
+            return local_path
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    def iter_downloads(self, file_names, prefetch=1):
+        """Gera (file_name, local_path, erro) na ordem dos downloads concluídos.
+
+        Uma thread baixa os arquivos em sequência na sessão única; prefetch limita quantos
+        arquivos baixados podem aguardar o consumidor (back-pressure no disco de staging).
+        """
+        concluidos = queue.Queue(maxsize=max(1, prefetch))
+        fim = object()
+        parar = threading.Event()
+
+        def baixar_todos():
+            try:
+                for file_name in file_names:
+                    if parar.is_set():
+                        break
+                    try:
+                        concluidos.put((file_name, self.download(file_name), None))
+                    except Exception as e:
+                        logging.error(f"Erro ao baixar o arquivo {file_name} do FTPS: {e}")
+                        concluidos.put((file_name, None, e))
+            finally:
+                concluidos.put(fim)
+
+        thread = threading.Thread(target=baixar_todos, name="ftps-download", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = concluidos.get()
+                if item is fim:
+                    break
+                yield item
+        finally:
+            # Consumidor interrompido: a thread termina após o download em andamento
+            parar.set()
+            while thread.is_alive():
+                try:
+                    concluidos.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
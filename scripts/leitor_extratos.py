@@ -1,16 +1,30 @@
 import pandas as pd
 import logging
 from datetime import datetime
+import os
 import shutil
-import sys
-from scripts.reading_files import ExtratoTransacao
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional
+from scripts.reading_files import ExtratoTransacao, ImpressaoArquivo, impressao_arquivo
 from scripts.transform_files import TransformerTrasacoes
 from scripts.connection_db import (
     insert_df_to_db, 
-    get_existing_records,
-    register_file_processing
+    register_file_processing,
+    upsert_dimension_df,
+    get_connection,
+    get_pool,
+    find_duplicate_file,
+    merge_fact_rows,
+    delete_attempt_rows,
+    update_file_metrics,
+    mark_mdr_groups,
+    refresh_mdr_groups,
+    POOL_MAX_CONNECTIONS
 )
-import psycopg2
+from scripts.metrics import Metricas, registro_metricas
 from psycopg2 import sql
 
 def prepare_dimension_tables(df_transacoes):
@@ -60,77 +74,140 @@ def prepare_fact_table(df_transacoes):
     
     return df_fact
 
-def insert_dimension_if_not_exists(df_dimension, table_name, key_column, connection_params, conn=None):
-    """Insere registros na tabela dimensional se não existirem"""
-    try:
-        if conn is None:
-            conn = psycopg2.connect(
-                host=connection_params['host'],
-                port=connection_params['port'],
-                user=connection_params['user'],
-                password=connection_params['password'],
-                database=connection_params['database']
+def add_row_hash(df_fact, column='hash_registro'):
+    """Acrescenta o hash (int64) de cada linha do fato, usado no merge do reprocessamento.
+
+    Linhas idênticas dentro do arquivo recebem hashes distintos pela ordem de ocorrência.
+    """
+    hashes = pd.util.hash_pandas_object(df_fact, index=False)
+    ocorrencia = hashes.groupby(hashes).cumcount()
+    hashes = pd.util.hash_pandas_object(
+        pd.DataFrame({'hash': hashes.to_numpy(), 'ocorrencia': ocorrencia.to_numpy()}), index=False
+    )
+    df_fact[column] = hashes.to_numpy().view('int64')
+    return df_fact
+
+class DimensionKeyCache:
+    """Cache LRU das chaves das dimensões, compartilhado entre os arquivos de uma execução.
+
+    Cada tabela é carregada uma única vez (até max_keys chaves mais recentes). Chaves
+    inseridas numa transação ficam pendentes por conexão até commit(conn); rollback(conn)
+    as descarta, para o cache nunca conter chaves que não existem no banco.
+    """
+
+    def __init__(self, max_keys=100000, schema='unica_transactions'):
+        self.max_keys = max_keys
+        self.schema = schema
+        self.hits = 0
+        self.misses = 0
+        self._keys = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _carregar(self, table, key_column, conn):
+        with conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("SELECT {} FROM {}.{} ORDER BY updated_at DESC LIMIT %s").format(
+                    sql.Identifier(key_column),
+                    sql.Identifier(self.schema),
+                    sql.Identifier(table)
+                ),
+                (self.max_keys,)
             )
-            conn.autocommit = False
-            should_close = True
-        else:
-            should_close = False
-
-        existing_records = get_existing_records(
-            user=connection_params['user'],
-            host=connection_params['host'],
-            password=connection_params['password'],
-            database=connection_params['database'],
-            port=connection_params['port'],
-            schema='unica_transactions',
-            table=table_name,
-            key_column=key_column,
-            conn=conn
-        )
-        
-        # Filtra apenas registros novos
-        new_records = df_dimension[~df_dimension[key_column].isin(existing_records)]
-        
-        if not new_records.empty:
-            insert_df_to_db(
-                user=connection_params['user'],
-                host=connection_params['host'],
-                password=connection_params['password'],
-                database=connection_params['database'],
-                port=connection_params['port'],
+            rows = cur.fetchall()
+        # Mais recentes no fim, como as mais recentemente usadas do LRU
+        self._keys[table] = OrderedDict.fromkeys(row[0] for row in reversed(rows))
+        logging.info(f"Cache de chaves da dimensão {table} carregado com {len(rows)} chaves.")
+
+    def filtrar_novas(self, df_dimension, table, key_column, conn):
+        """Retorna as linhas de df_dimension cujas chaves não estão no cache"""
+        with self._lock:
+            if table not in self._keys:
+                self._carregar(table, key_column, conn)
+            keys = self._keys[table]
+            novas = []
+            for key in df_dimension[key_column].unique():
+                if key in keys:
+                    keys.move_to_end(key)
+                    self.hits += 1
+                else:
+                    novas.append(key)
+                    self.misses += 1
+        return df_dimension[df_dimension[key_column].isin(novas)]
+
+    def adicionar(self, table, keys, conn):
+        """Marca as chaves como pendentes até o commit da transação de conn"""
+        with self._lock:
+            self._pending.setdefault(id(conn), []).append((table, list(keys)))
+
+    def commit(self, conn):
+        with self._lock:
+            for table, keys in self._pending.pop(id(conn), []):
+                cache = self._keys.setdefault(table, OrderedDict())
+                for key in keys:
+                    cache[key] = None
+                    cache.move_to_end(key)
+                while len(cache) > self.max_keys:
+                    cache.popitem(last=False)
+
+    def rollback(self, conn):
+        with self._lock:
+            self._pending.pop(id(conn), None)
+
+    def invalidar(self, table=None):
+        """Descarta o cache de uma tabela (ou de todas); a próxima consulta recarrega do banco"""
+        with self._lock:
+            if table is None:
+                self._keys.clear()
+            else:
+                self._keys.pop(table, None)
+
+# Compartilhado por todos os process_file da execução
+dimension_cache = DimensionKeyCache()
+
+def insert_dimension_if_not_exists(df_dimension, table_name, key_column, connection_params, conn=None,
+                                   cache=None):
+    """Insere registros na tabela dimensional se não existirem.
+
+    Com cache, só as chaves ausentes do cache vão ao banco; se todas forem conhecidas,
+    nenhuma consulta é feita. O chamador confirma as chaves com cache.commit(conn).
+    """
+    should_commit = conn is None
+    try:
+        with get_connection(**connection_params, conn=conn) as conn:
+            if cache is not None:
+                df_dimension = cache.filtrar_novas(df_dimension, table_name, key_column, conn)
+                if df_dimension.empty:
+                    logging.info(f"Nenhuma chave nova para a tabela {table_name} (cache).")
+                    return
+
+            # Upsert no servidor: só o lote trafega, sem baixar as chaves já existentes
+            upsert_dimension_df(
+                **connection_params,
                 schema='unica_transactions',
                 table=table_name,
-                df=new_records,
+                df=df_dimension,
+                key_column=key_column,
                 conn=conn
             )
-            logging.info(f"{len(new_records)} novos registros inseridos na tabela {table_name}.")
-        else:
-            logging.info(f"Nenhum novo registro para inserir na tabela {table_name}.")
 
-        if should_close:
-            conn.close()
+            if cache is not None:
+                cache.adicionar(table_name, df_dimension[key_column].unique(), conn)
+
+            if should_commit:
+                conn.commit()
+                if cache is not None:
+                    cache.commit(conn)
 
     except Exception as e:
-        if should_close and conn:
-            conn.close()
+        if cache is not None and conn:
+            cache.rollback(conn)
         raise e
 
 def insert_df_to_db(user, host, password, database, port, schema, table, df, conn=None):
     """Insere DataFrame no banco de dados"""
-    try:
-        if conn is None:
-            conn = psycopg2.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database
-            )
-            conn.autocommit = False
-            should_close = True
-        else:
-            should_close = False
-
+    should_commit = conn is None
+    with get_connection(user, host, password, database, port, conn=conn) as conn:
         # Converte DataFrame para lista de tuplas
         records = [tuple(x) for x in df.to_numpy()]
         
@@ -146,101 +223,150 @@ def insert_df_to_db(user, host, password, database, port, schema, table, df, con
         # Executa inserção
         with conn.cursor() as cur:
             cur.executemany(query, records)
-        
-        if should_close:
-            conn.close()
-
-    except Exception as e:
-        if should_close and conn:
-            conn.close()
-        raise e
 
-def get_existing_records(user, host, password, database, port, schema, table, key_column, conn=None):
-    """Obtém registros existentes da tabela"""
-    try:
-        if conn is None:
-            conn = psycopg2.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database
-            )
-            conn.autocommit = False
-            should_close = True
-        else:
-            should_close = False
-
-        with conn.cursor() as cur:
-            cur.execute(f"SELECT {key_column} FROM {schema}.{table}")
-            existing_records = [row[0] for row in cur.fetchall()]
-        
-        if should_close:
-            conn.close()
-
-        return existing_records
-
-    except Exception as e:
-        if should_close and conn:
-            conn.close()
-        raise e
+        if should_commit:
+            conn.commit()
 
 def register_file_processing(user, host, password, database, port, file_name, data_geracao, 
-                            status, error=None, google_drive_path=None, schema='unica_transactions', conn=None):
-    """Registra o processamento de um arquivo"""
-    try:
-        if conn is None:
-            conn = psycopg2.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database
-            )
-            conn.autocommit = False
-            should_close = True
-        else:
-            should_close = False
-
+                            status, error=None, google_drive_path=None, schema='unica_transactions', conn=None,
+                            impressao=None):
+    """Registra o processamento de um arquivo (com hash e header, se impressao for informada).
+
+    Se o arquivo já tem registro (reprocessamento), a linha é atualizada e o id mantido.
+    """
+    should_commit = conn is None
+    impressao = impressao or ImpressaoArquivo(None, None, None, None)
+    with get_connection(user, host, password, database, port, conn=conn) as conn:
         with conn.cursor() as cur:
             cur.execute(
                 f"""
                 INSERT INTO {schema}.controle_arquivos 
                 (nome_arquivo, data_geracao, data_processamento, status_processamento, 
-                erro_processamento, arquivo_google_drive_path)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                erro_processamento, arquivo_google_drive_path, hash_conteudo, id_movimento, nseq_registro)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (nome_arquivo) DO UPDATE SET
+                    data_geracao = EXCLUDED.data_geracao,
+                    data_processamento = EXCLUDED.data_processamento,
+                    status_processamento = EXCLUDED.status_processamento,
+                    erro_processamento = EXCLUDED.erro_processamento,
+                    arquivo_google_drive_path = EXCLUDED.arquivo_google_drive_path,
+                    hash_conteudo = EXCLUDED.hash_conteudo,
+                    id_movimento = EXCLUDED.id_movimento,
+                    nseq_registro = EXCLUDED.nseq_registro
                 RETURNING id
                 """,
-                (file_name, data_geracao, datetime.now(), status, error, google_drive_path)
+                (file_name, data_geracao, datetime.now(), status, error, google_drive_path,
+                 impressao.sha256, impressao.id_movimento, impressao.nseq_registro)
             )
             file_id = cur.fetchone()[0]
-        
-        if should_close:
-            conn.close()
 
-        return file_id
-
-    except Exception as e:
-        if should_close and conn:
-            conn.close()
-        raise e
-
-def process_file(file_name, local_file_path, google_drive_path, connection_params, is_tryout=False):
-    """Processa um arquivo individual"""
-    conn = None
+        if should_commit:
+            conn.commit()
+
+    return file_id
+
+def register_validation_errors(file_id, df_erros, connection_params, conn=None):
+    """Registra as linhas que falharam na validação na tabela erros_validacao"""
+    if df_erros.empty:
+        return
+
+    df_registro = pd.DataFrame({
+        'file_id': file_id,
+        'nseq': df_erros['nseq'],
+        'coluna': df_erros['coluna'],
+        'valor': df_erros['valor'],
+        'mensagem': df_erros['mensagem']
+    })
+
+    insert_df_to_db(
+        **connection_params,
+        schema='unica_transactions',
+        table='erros_validacao',
+        df=df_registro,
+        conn=conn
+    )
+    logging.info(f"{len(df_registro)} linhas com erro de validação registradas para o arquivo {file_id}.")
+
+def split_quarantine(df_transacoes, df_erros):
+    """Separa as linhas inválidas (quarentena) e valida novamente as linhas restantes.
+
+    Retorna (df_validado, df_quarentena) ou (None, None) quando o arquivo não pode ser
+    aceito parcialmente (erro de estrutura, nenhuma linha válida ou falha nas restantes).
+    """
+    if df_erros.empty:
+        return None, None
+
+    invalidas = df_transacoes.index.isin(df_erros['indice'])
+    if invalidas.all():
+        return None, None
+
+    transformer = TransformerTrasacoes(dataframe=df_transacoes.loc[~invalidas].copy(), bulk=True)
+    df_validado = transformer.validate_all()
+    if isinstance(df_validado, list):
+        return None, None
+
+    df_invalidas = df_transacoes.loc[invalidas]
+    regras = df_erros.groupby('indice').agg(
+        regras=('coluna', ', '.join),
+        mensagens=('mensagem', '\n'.join)
+    ).reindex(df_invalidas.index)
+
+    df_quarentena = pd.DataFrame({
+        'nseq': df_invalidas['nseq'].to_numpy(),
+        'regras': regras['regras'].to_numpy(),
+        'mensagens': regras['mensagens'].to_numpy(),
+        'registro': df_invalidas.to_json(orient='records', lines=True, force_ascii=False).splitlines()
+    })
+    return df_validado, df_quarentena
+
+class ArquivoPreparado(NamedTuple):
+    """Resultado da leitura e validação de um arquivo, sem acesso ao banco.
+
+    Serializável, para ser produzido em outro processo (ver process_files_parallel).
+    Com df_validado None o arquivo falhou e erro traz a mensagem para controle_arquivos.
+    """
+    file_name: str
+    local_file_path: str
+    google_drive_path: str
+    data_geracao: Optional[date] = None  # None: erro inesperado antes de ler o header
+    df_validado: Optional[pd.DataFrame] = None
+    df_quarentena: Optional[pd.DataFrame] = None
+    df_erros: Optional[pd.DataFrame] = None
+    erro: Optional[str] = None
+    df_transacoes: Optional[pd.DataFrame] = None  # lido por parse_file, ainda não validado
+    impressao: Optional[ImpressaoArquivo] = None
+    duplicado_de: Optional[str] = None  # arquivo já carregado com o mesmo conteúdo
+    metricas: Optional[Metricas] = None  # tempos, linhas e bytes por etapa
+
+def parse_file(file_name, local_file_path, google_drive_path, engine='columnar', buscar_duplicado=None,
+               metricas=None):
+    """Lê um arquivo e valida o header; df_transacoes fica pronto para validate_file.
+
+    Antes do parse calcula a impressão do arquivo (SHA-256 + header); se buscar_duplicado
+    (hash -> nome do arquivo já carregado ou None) encontrar o conteúdo, o parse é pulado.
+    """
+    metricas = metricas or Metricas(file_name)
+    preparado = ArquivoPreparado(file_name, local_file_path, google_drive_path, metricas=metricas)
     try:
-        # Estabelece conexão com o banco
-        conn = psycopg2.connect(
-            host=connection_params['host'],
-            port=connection_params['port'],
-            user=connection_params['user'],
-            password=connection_params['password'],
-            database=connection_params['database']
-        )
-        
-        conn.autocommit = False
-        extrato = ExtratoTransacao(file_path=local_file_path)
-        df_header, df_transacoes, df_trailer = extrato.process_file()
+        with metricas.medir('impressao') as etapa:
+            impressao = impressao_arquivo(local_file_path)
+            etapa['bytes'] += os.path.getsize(local_file_path)
+        preparado = preparado._replace(impressao=impressao)
+
+        duplicado_de = buscar_duplicado(impressao.sha256) if buscar_duplicado else None
+        if duplicado_de and duplicado_de != file_name:
+            logging.info(f"Arquivo {file_name} tem o mesmo conteúdo de {duplicado_de}; parse ignorado")
+            data_geracao = pd.to_datetime(impressao.data_geracao, format='%Y%m%d', errors='coerce')
+            return preparado._replace(
+                duplicado_de=duplicado_de,
+                data_geracao=datetime.now().date() if pd.isna(data_geracao) else data_geracao.date()
+            )
+
+        with metricas.medir('leitura') as etapa:
+            extrato = ExtratoTransacao(file_path=local_file_path, engine=engine)
+            df_header, df_transacoes, df_trailer = extrato.process_file()
+            etapa['linhas'] += len(df_transacoes)
+            etapa['bytes'] += os.path.getsize(local_file_path)
 
         df_header = df_header[['codigo_registro', 'versao_layout', 'data_geracao',
                             'hora_geracao', 'tipo_processamento', 'destinatario']]
@@ -248,6 +374,7 @@ def process_file(file_name, local_file_path, google_drive_path, connection_param
         df_summary_processing['file_path'] = google_drive_path
         df_summary_processing['file_name'] = file_name
         df_transacoes['file_name'] = file_name
+        preparado = preparado._replace(data_geracao=pd.to_datetime(df_header['data_geracao'].iloc[0]).date())
 
         if not (
             (df_summary_processing['codigo_registro'] == 'A0').all() and
@@ -255,82 +382,232 @@ def process_file(file_name, local_file_path, google_drive_path, connection_param
             (df_summary_processing['destinatario'] == '000051309').all()
         ):
             error_msg = "Validação falhou: Verifique 'codigo_registro', 'versao_layout' e 'destinatario'."
-            register_file_processing(
+            return preparado._replace(erro=error_msg)
+
+        if df_transacoes.empty:
+            # Header e trailer sem registros CV: ERRO de estrutura, com a data do header
+            return preparado._replace(erro="Validação falhou: arquivo sem registros CV.")
+
+        return preparado._replace(df_transacoes=df_transacoes)
+
+    except Exception as e:
+        logging.error(f"Erro ao ler o arquivo {file_name}: {e}")
+        return preparado._replace(data_geracao=None, erro=str(e))
+
+def validate_file(preparado, quarantine=False):
+    """Valida as transações lidas por parse_file (arquivos que já falharam passam direto)"""
+    if preparado.df_transacoes is None:
+        return preparado
+
+    file_name = preparado.file_name
+    df_transacoes = preparado.df_transacoes
+    preparado = preparado._replace(df_transacoes=None)
+    try:
+        # A validação altera o DataFrame; a quarentena guarda as linhas como vieram no arquivo
+        df_transacoes_original = df_transacoes.copy() if quarantine else None
+
+        # Modo bulk: todas as regras são avaliadas e as linhas inválidas ficam registradas
+        with (preparado.metricas or Metricas(file_name)).medir('validacao') as etapa:
+            transacoes_transformer = TransformerTrasacoes(dataframe=df_transacoes, bulk=True)
+            df_transacoes_validated = transacoes_transformer.validate_all()
+            etapa['linhas'] += len(df_transacoes)
+
+        df_quarentena = None
+        quarantine_msg = None
+        if isinstance(df_transacoes_validated, list) and quarantine:
+            df_validado, df_quarentena = split_quarantine(
+                df_transacoes_original, transacoes_transformer.erros_por_linha()
+            )
+            if df_validado is not None:
+                quarantine_msg = (
+                    f"{len(df_quarentena)} linhas em quarentena:\n" + "\n".join(df_transacoes_validated)
+                )
+                logging.warning(f"Arquivo {file_name}: {len(df_quarentena)} linhas enviadas para quarentena.")
+                df_transacoes_validated = df_validado
+
+        if isinstance(df_transacoes_validated, list):
+            return preparado._replace(
+                erro="\n".join(df_transacoes_validated),
+                df_erros=transacoes_transformer.erros_por_linha()
+            )
+
+        return preparado._replace(df_validado=df_transacoes_validated, df_quarentena=df_quarentena,
+                                  erro=quarantine_msg)
+
+    except Exception as e:
+        logging.error(f"Erro ao validar o arquivo {file_name}: {e}")
+        return preparado._replace(data_geracao=None, erro=str(e))
+
+def prepare_file(file_name, local_file_path, google_drive_path, quarantine=False, engine='columnar',
+                 buscar_duplicado=None, metricas=None):
+    """Lê e valida um arquivo (etapa sem banco do process_file)"""
+    preparado = parse_file(file_name, local_file_path, google_drive_path, engine=engine,
+                           buscar_duplicado=buscar_duplicado, metricas=metricas)
+    return validate_file(preparado, quarantine=quarantine)
+
+def load_file(preparado, connection_params, is_tryout=False):
+    """Grava no banco um arquivo preparado, numa única transação (etapa com banco do process_file)"""
+    file_name = preparado.file_name
+    google_drive_path = preparado.google_drive_path
+    metricas = preparado.metricas or Metricas(file_name)
+    conn = None
+    connection_pool = get_pool(**connection_params)
+    try:
+        # Empresta uma conexão do pool compartilhado
+        conn = connection_pool.getconn()
+        conn.autocommit = False
+
+        if preparado.duplicado_de is None and preparado.df_validado is not None and preparado.impressao:
+            # Confere de novo na transação: cobre arquivos iguais no mesmo lote
+            duplicado_de = find_duplicate_file(
                 **connection_params,
+                hash_conteudo=preparado.impressao.sha256,
                 file_name=file_name,
-                data_geracao=pd.to_datetime(df_header['data_geracao'].iloc[0]).date(),
-                status='ERRO',
-                error=error_msg,
-                google_drive_path=google_drive_path,
                 conn=conn
             )
+            preparado = preparado._replace(duplicado_de=duplicado_de)
+
+        if preparado.duplicado_de:
+            with metricas.medir('controle'):
+                file_id = register_file_processing(
+                    **connection_params,
+                    file_name=file_name,
+                    data_geracao=preparado.data_geracao,
+                    status='DUPLICADO',
+                    error=f"Conteúdo idêntico ao arquivo {preparado.duplicado_de}",
+                    google_drive_path=google_drive_path,
+                    conn=conn,
+                    impressao=preparado.impressao
+                )
+            update_file_metrics(**connection_params, file_id=file_id, metricas=metricas.to_dict(), conn=conn)
+            conn.commit()
+            logging.warning(f"Arquivo {file_name} ignorado: conteúdo idêntico ao arquivo {preparado.duplicado_de}")
+
+            if not is_tryout and preparado.local_file_path != google_drive_path:
+                shutil.move(preparado.local_file_path, google_drive_path)
+            return True
+
+        if preparado.df_validado is None:
+            if preparado.data_geracao is None:
+                raise Exception(preparado.erro)
+
+            with metricas.medir('controle'):
+                file_id = register_file_processing(
+                    **connection_params,
+                    file_name=file_name,
+                    data_geracao=preparado.data_geracao,
+                    status='ERRO',
+                    error=preparado.erro,
+                    google_drive_path=google_drive_path,
+                    conn=conn,
+                    impressao=preparado.impressao
+                )
+                delete_attempt_rows(**connection_params, file_id=file_id, conn=conn)
+                if preparado.df_erros is not None:
+                    register_validation_errors(file_id, preparado.df_erros, connection_params, conn)
+            update_file_metrics(**connection_params, file_id=file_id, metricas=metricas.to_dict(), conn=conn)
+            conn.commit()
             return False
 
-        transacoes_transformer = TransformerTrasacoes(dataframe=df_transacoes)
-        df_transacoes_validated = transacoes_transformer.validate_all()
-        
-        if isinstance(df_transacoes_validated, list):
-            error_msg = "\n".join(df_transacoes_validated)
-            register_file_processing(
+        df_transacoes_validated = preparado.df_validado
+        df_quarentena = preparado.df_quarentena
+
+        with metricas.medir('dimensoes') as etapa:
+            df_tempo, df_loja, df_produto, df_pagamento = prepare_dimension_tables(df_transacoes_validated)
+
+            # Inserir dimensões e obter IDs
+            insert_dimension_if_not_exists(df_tempo, 'tempo', 'data', connection_params, conn, dimension_cache)
+            insert_dimension_if_not_exists(df_loja, 'loja', 'identificacao_loja', connection_params, conn,
+                                           dimension_cache)
+            insert_dimension_if_not_exists(df_produto, 'produto', 'codigo_produto', connection_params, conn,
+                                           dimension_cache)
+            insert_dimension_if_not_exists(df_pagamento, 'pagamento', 'codigo_bandeira', connection_params, conn,
+                                           dimension_cache)
+            etapa['linhas'] += len(df_tempo) + len(df_loja) + len(df_produto) + len(df_pagamento)
+
+        df_fact = prepare_fact_table(df_transacoes_validated)
+
+        with metricas.medir('controle'):
+            # Registrar processamento do arquivo e obter file_id
+            file_id = register_file_processing(
                 **connection_params,
                 file_name=file_name,
-                data_geracao=pd.to_datetime(df_header['data_geracao'].iloc[0]).date(),
-                status='ERRO',
-                error=error_msg,
+                data_geracao=preparado.data_geracao,
+                status='SUCESSO',
+                error=preparado.erro,
                 google_drive_path=google_drive_path,
+                conn=conn,
+                impressao=preparado.impressao
+            )
+
+            if not file_id:
+                raise Exception("Falha ao registrar processamento do arquivo")
+
+            # Reprocessamento: erros e quarentena da tentativa anterior são substituídos
+            delete_attempt_rows(**connection_params, file_id=file_id, conn=conn)
+
+            if df_quarentena is not None:
+                df_quarentena = df_quarentena.copy()
+                df_quarentena.insert(0, 'file_id', file_id)
+                insert_df_to_db(
+                    **connection_params,
+                    schema='unica_transactions',
+                    table='transacoes_quarantine',
+                    df=df_quarentena,
+                    conn=conn
+                )
+
+        with metricas.medir('agregados'):
+            # Grupos de mdr_agregado com linhas antigas do arquivo (reprocessamento)
+            mark_mdr_groups(**connection_params, file_id=file_id, conn=conn)
+
+        with metricas.medir('fatos') as etapa:
+            add_row_hash(df_fact)
+            df_fact['file_id'] = file_id
+
+            # Inserir dados na tabela de fatos via COPY; num reprocessamento só as linhas
+            # alteradas são apagadas e inseridas (merge pelo hash da linha)
+            merge_fact_rows(
+                **connection_params,
+                schema='unica_transactions',
+                table='transacoes',
+                df=df_fact,
+                file_id=file_id,
                 conn=conn
             )
-            return False
+            etapa['linhas'] += len(df_fact)
 
-        df_tempo, df_loja, df_produto, df_pagamento = prepare_dimension_tables(df_transacoes_validated)
-        
-        # Inserir dimensões e obter IDs
-        insert_dimension_if_not_exists(df_tempo, 'tempo', 'data', connection_params, conn)
-        insert_dimension_if_not_exists(df_loja, 'loja', 'identificacao_loja', connection_params, conn)
-        insert_dimension_if_not_exists(df_produto, 'produto', 'codigo_produto', connection_params, conn)
-        insert_dimension_if_not_exists(df_pagamento, 'pagamento', 'codigo_bandeira', connection_params, conn)
-        
-        df_fact = prepare_fact_table(df_transacoes_validated)
+        with metricas.medir('agregados') as etapa:
+            # Recalcula só os grupos tocados pelo arquivo, na mesma transação da carga
+            mark_mdr_groups(**connection_params, file_id=file_id, conn=conn)
+            etapa['linhas'] += refresh_mdr_groups(**connection_params, conn=conn)
 
-        # Registrar processamento do arquivo e obter file_id
-        file_id = register_file_processing(
-            **connection_params,
-            file_name=file_name,
-            data_geracao=pd.to_datetime(df_header['data_geracao'].iloc[0]).date(),
-            status='SUCESSO',
-            google_drive_path=google_drive_path,
-            conn=conn
-        )
-
-        if not file_id:
-            raise Exception("Falha ao registrar processamento do arquivo")
-
-        df_fact['file_id'] = file_id
-
-        # Inserir dados na tabela de fatos
-        insert_df_to_db(
-            **connection_params,
-            schema='unica_transactions',
-            table='transacoes',
-            df=df_fact,
-            conn=conn
-        )
+        # As métricas gravadas no banco não incluem o próprio commit
+        update_file_metrics(**connection_params, file_id=file_id, metricas=metricas.to_dict(), conn=conn)
 
         # Se chegou até aqui sem erros, commit a transação
-        conn.commit()
+        with metricas.medir('commit'):
+            conn.commit()
+        dimension_cache.commit(conn)
 
-        if not is_tryout:
-            shutil.move(local_file_path, google_drive_path)
+        # Processamento in-place (local_file_path == google_drive_path): nada a mover
+        if not is_tryout and preparado.local_file_path != google_drive_path:
+            with metricas.medir('move'):
+                shutil.move(preparado.local_file_path, google_drive_path)
 
         return True
 
     except Exception as e:
-        # Em caso de erro, rollback na transação
+        # Em caso de erro, rollback na transação (e das chaves pendentes no cache)
         if conn:
             conn.rollback()
+            dimension_cache.rollback(conn)
+            # Devolve a conexão antes de registrar o erro, para não segurar duas do pool
+            connection_pool.putconn(conn)
+            conn = None
             
         error_msg = str(e)
-        # Registrar erro usando uma nova conexão
+        # Registrar erro usando outra conexão do pool
         try:
             register_file_processing(
                 **connection_params,
@@ -338,7 +615,8 @@ def process_file(file_name, local_file_path, google_drive_path, connection_param
                 data_geracao=datetime.now().date(),  # Data atual como fallback
                 status='ERRO',
                 error=error_msg,
-                google_drive_path=google_drive_path
+                google_drive_path=google_drive_path,
+                impressao=preparado.impressao
             )
         except Exception as register_error:
             logging.error(f"Erro ao registrar erro de processamento: {register_error}")
@@ -346,59 +624,175 @@ def process_file(file_name, local_file_path, google_drive_path, connection_param
         return False
     finally:
         if conn:
-            conn.close()
+            connection_pool.putconn(conn)
+        registro_metricas.registrar(metricas)
+
+def process_file(file_name, local_file_path, google_drive_path, connection_params, is_tryout=False,
+                 quarantine=False, engine='columnar', buscar_duplicado=None, metricas=None):
+    """Processa um arquivo individual.
+
+    Com quarantine=True, linhas inválidas não rejeitam o arquivo inteiro: as válidas são
+    carregadas normalmente e as inválidas vão para transacoes_quarantine com a regra violada.
+    Com local_file_path igual a google_drive_path o arquivo é lido no próprio Drive, sem
+    cópia nem move (use engine='numpy' para ler via memory-map).
+    Arquivos com conteúdo idêntico a um já carregado são registrados como DUPLICADO sem
+    parse; por padrão o hash é procurado no banco (buscar_duplicado: hash -> nome ou None).
+    metricas (Metricas) permite somar etapas anteriores, como a cópia, às do arquivo.
+    """
+    if buscar_duplicado is None:
+        buscar_duplicado = lambda sha256: find_duplicate_file(**connection_params, hash_conteudo=sha256,
+                                                              file_name=file_name)
+    preparado = prepare_file(file_name, local_file_path, google_drive_path, quarantine=quarantine,
+                             engine=engine, buscar_duplicado=buscar_duplicado, metricas=metricas)
+    return load_file(preparado, connection_params, is_tryout=is_tryout)
+
+def process_files_parallel(arquivos, connection_params, workers, quarantine=False, is_tryout=False,
+                           engine='columnar', buscar_duplicado=None, metricas=None):
+    """Processa vários arquivos em paralelo, mantendo uma transação por arquivo.
+
+    arquivos: lista de (file_name, local_file_path, google_drive_path). A leitura e a
+    validação rodam em um ProcessPoolExecutor com `workers` processos; a gravação no banco
+    roda em até POOL_MAX_CONNECTIONS threads, cada uma com uma conexão do pool. No máximo
+    workers + threads de gravação arquivos ficam em preparação ou aguardando a carga.
+    metricas: {file_name: Metricas} opcional com as etapas já medidas de cada arquivo.
+    Retorna {file_name: sucesso}.
+    """
+    resultados = {}
+    metricas = metricas or {}
+    db_workers = max(1, min(workers, POOL_MAX_CONNECTIONS))
+    # Arquivos em preparação ou preparados aguardando a carga; limita os DataFrames em memória
+    limite = workers + db_workers
+    pendentes = iter(arquivos)
+    with ProcessPoolExecutor(max_workers=workers) as processos, \
+            ThreadPoolExecutor(max_workers=db_workers) as gravacao:
+        preparacoes = {}
+        cargas = {}
+
+        def submeter_proximo():
+            arquivo = next(pendentes, None)
+            if arquivo is None:
+                return False
+            file_name, local_file_path, google_drive_path = arquivo
+            futuro = processos.submit(prepare_file, file_name, local_file_path, google_drive_path, quarantine,
+                                      engine, buscar_duplicado, metricas.get(file_name))
+            preparacoes[futuro] = arquivo
+            return True
+
+        while len(preparacoes) < limite and submeter_proximo():
+            pass
+
+        while preparacoes or cargas:
+            concluidos, _ = wait([*preparacoes, *cargas], return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                if futuro in cargas:
+                    resultados[cargas.pop(futuro)] = futuro.result()
+                    submeter_proximo()
+                    continue
+
+                file_name, local_file_path, google_drive_path = preparacoes.pop(futuro)
+                try:
+                    preparado = futuro.result()
+                except Exception as e:
+                    # Falha do processo trabalhador (ex.: sem memória): registra o erro do arquivo
+                    logging.error(f"Erro no processo de leitura do arquivo {file_name}: {e}")
+                    preparado = ArquivoPreparado(file_name, local_file_path, google_drive_path, erro=str(e))
+                cargas[gravacao.submit(load_file, preparado, connection_params, is_tryout)] = file_name
+
+    return resultados
+
+class PlanoProcessamento(NamedTuple):
+    """Classificação dos arquivos nos cenários de analyze_files_to_process.
+
+    cenarios: {1..5: nomes ordenados}; 1, 2, 3 e 5 são reprocessados e 4 é reportado.
+    sem_acao: arquivos conhecidos que não se encaixam em nenhum cenário (ex.: SUCESSO no Drive).
+    """
+    cenarios: Dict[int, List[str]]
+    sem_acao: List[str]
+    ignorados: int  # nomes fora do padrão EXTRATO
+
+    @property
+    def files_to_process(self):
+        return sorted(self.cenarios[1] + self.cenarios[2] + self.cenarios[3] + self.cenarios[5])
+
+    @property
+    def files_to_report(self):
+        return [{
+            'file': file,
+            'status': 'DESINCRONIZADO',
+            'message': 'Arquivo registrado como sucesso mas não existe no Google Drive'
+        } for file in self.cenarios[4]]
+
+    @property
+    def total(self):
+        return sum(map(len, self.cenarios.values())) + len(self.sem_acao)
+
+    def contagens(self):
+        contagens = {f'cenario_{cenario}': len(files) for cenario, files in self.cenarios.items()}
+        contagens.update(sem_acao=len(self.sem_acao), ignorados=self.ignorados, total=self.total)
+        return contagens
+
+def plan_files_to_process(sftp_files, google_drive_files, db_status):
+    """Classifica os arquivos nos cinco cenários com operações de conjunto (tempo linear).
+
+    Mesma regra de analyze_files_to_process, avaliada na ordem dos cenários (o primeiro
+    que se aplica vale):
+    1. no SFTP, fora do Google Drive e sem registro no banco;
+    2. no Google Drive e sem registro no banco;
+    3. registrado com ERRO;
+    4. registrado com SUCESSO e fora do Google Drive (reportado, não reprocessado);
+    5. no SFTP e registrado com outro status que não SUCESSO nem DUPLICADO.
+    DUPLICADO (conteúdo idêntico a um arquivo já carregado) é final, como SUCESSO.
+    """
+    sftp = set(sftp_files)
+    google_drive = set(google_drive_files)
+
+    todos = sftp | google_drive
+    extratos = {file for file in todos if "EXTRATO" in file}
+
+    registrados = extratos & db_status.keys()
+    nao_registrados = extratos - registrados
+    com_erro = {file for file in registrados if db_status[file]['status'] == 'ERRO'}
+    com_sucesso = {file for file in registrados if db_status[file]['status'] == 'SUCESSO'}
+    duplicados = {file for file in registrados if db_status[file]['status'] == 'DUPLICADO'}
+
+    cenarios = {
+        1: nao_registrados - google_drive,
+        2: nao_registrados & google_drive,
+        3: com_erro,
+        4: com_sucesso - google_drive,
+        5: (registrados - com_erro - com_sucesso - duplicados) & sftp,
+    }
+    sem_acao = registrados - set().union(*cenarios.values())
+
+    return PlanoProcessamento(
+        cenarios={cenario: sorted(files) for cenario, files in cenarios.items()},
+        sem_acao=sorted(sem_acao),
+        ignorados=len(todos) - len(extratos)
+    )
 
 def analyze_files_to_process(sftp_files, google_drive_files, db_status):
     """Analisa quais arquivos precisam ser processados baseado em diferentes cenários"""
-    files_to_process = []
-    files_to_report = []
-    
-    # Conjunto de todos os arquivos únicos (SFTP + Google Drive)
-    all_files = set(sftp_files + google_drive_files)
-    
-    for file in all_files:
-        if "EXTRATO" not in file:
-            continue
-            
-        # Cenário 1: Arquivo novo no SFTP
-        if file in sftp_files and file not in google_drive_files and file not in db_status:
-            files_to_process.append(file)
-            logging.info(f"Arquivo novo encontrado no SFTP: {file}")
-            continue
-            
-        # Cenário 2: Arquivo existe no Google Drive mas não está registrado no banco
-        if file in google_drive_files and file not in db_status:
-            files_to_process.append(file)
-            logging.info(f"Arquivo encontrado no Google Drive sem registro no banco: {file}")
-            continue
-            
-        # Cenário 3: Arquivo está registrado com erro no banco
-        if file in db_status and db_status[file]['status'] == 'ERRO':
-            files_to_process.append(file)
-            logging.info(f"Arquivo com erro encontrado para reprocessamento: {file}")
-            continue
-            
-        # Cenário 4: Arquivo está registrado como sucesso mas não existe no Google Drive
-        if file in db_status and db_status[file]['status'] == 'SUCESSO' and file not in google_drive_files:
-            files_to_report.append({
-                'file': file,
-                'status': 'DESINCRONIZADO',
-                'message': 'Arquivo registrado como sucesso mas não existe no Google Drive'
-            })
-            logging.warning(f"Arquivo desincronizado encontrado: {file}")
-            continue
-            
-        # Cenário 5: Arquivo existe no SFTP mas está com status diferente de SUCESSO no banco
-        if file in sftp_files and file in db_status and db_status[file]['status'] != 'SUCESSO':
-            files_to_process.append(file)
-            logging.info(f"Arquivo encontrado no SFTP com status não sucesso no banco: {file}")
-            continue
-    
+    plano = plan_files_to_process(sftp_files, google_drive_files, db_status)
+
+    mensagens = {
+        1: "Arquivo novo encontrado no SFTP",
+        2: "Arquivo encontrado no Google Drive sem registro no banco",
+        3: "Arquivo com erro encontrado para reprocessamento",
+        5: "Arquivo encontrado no SFTP com status não sucesso no banco",
+    }
+    for cenario, mensagem in mensagens.items():
+        for file in plano.cenarios[cenario]:
+            logging.info(f"{mensagem}: {file}")
+    for file in plano.cenarios[4]:
+        logging.warning(f"Arquivo desincronizado encontrado: {file}")
+
+    files_to_process = plano.files_to_process
+    files_to_report = plano.files_to_report
+
     # Log resumo da análise
-    logging.info(f"Total de arquivos analisados: {len(all_files)}")
+    logging.info(f"Total de arquivos analisados: {plano.total + plano.ignorados}")
     logging.info(f"Arquivos a serem processados: {len(files_to_process)}")
     logging.info(f"Arquivos com inconsistências: {len(files_to_report)}")
+    logging.info(f"Arquivos por cenário: {plano.contagens()}")
     
     return files_to_process, files_to_report
-
-
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Metricas:
+    """Tempo, linhas e bytes por etapa do processamento de um arquivo (ou de uma execução).
+
+    Sem locks, para poder ser devolvida por outro processo junto com o ArquivoPreparado;
+    cada arquivo é medido por uma thread de cada vez.
+    """
+
+    def __init__(self, nome, tipo='arquivo'):
+        self.nome = nome
+        self.tipo = tipo
+        self.inicio = datetime.now()
+        self.etapas = {}
+
+    def _etapa(self, etapa):
+        return self.etapas.setdefault(etapa, {'segundos': 0.0, 'chamadas': 0, 'linhas': 0, 'bytes': 0})
+
+    @contextmanager
+    def medir(self, etapa):
+        """Cronometra o bloco; o registro devolvido aceita linhas e bytes (registro['linhas'] += n)"""
+        registro = self._etapa(etapa)
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['segundos'] += time.perf_counter() - inicio
+            registro['chamadas'] += 1
+
+    def contar(self, etapa, linhas=0, bytes_lidos=0):
+        registro = self._etapa(etapa)
+        registro['linhas'] += linhas
+        registro['bytes'] += bytes_lidos
+
+    def mesclar(self, outra):
+        """Soma as etapas de outra medição (ex.: de um arquivo na medição da execução)"""
+        for etapa, valores in outra.etapas.items():
+            registro = self._etapa(etapa)
+            for chave, valor in valores.items():
+                registro[chave] += valor
+
+    def to_dict(self):
+        etapas = {}
+        for etapa, valores in self.etapas.items():
+            segundos = valores['segundos']
+            etapas[etapa] = {
+                **valores,
+                'segundos': round(segundos, 4),
+                'linhas_por_s': round(valores['linhas'] / segundos, 1) if segundos and valores['linhas'] else None,
+                'mb_por_s': round(valores['bytes'] / segundos / 1e6, 2) if segundos and valores['bytes'] else None
+            }
+        return {
+            'tipo': self.tipo,
+            'nome': self.nome,
+            'inicio': self.inicio.isoformat(),
+            'duracao': round((datetime.now() - self.inicio).total_seconds(), 3),
+            'etapas': etapas
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+class RegistroMetricas:
+    """Recebe as métricas de cada arquivo e acumula as da execução.
+
+    Cada arquivo e, no fim, a execução viram uma linha JSON no arquivo aberto com
+    abrir(path) (JSON Lines) e no log. Seguro para as threads do pipeline e do
+    process_files_parallel.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.execucao = Metricas('execucao', tipo='execucao')
+        self.arquivos = 0
+        self._lock = threading.Lock()
+
+    def abrir(self, path):
+        """Começa uma nova execução gravando em path"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            self.path = path
+            self.execucao = Metricas('execucao', tipo='execucao')
+            self.arquivos = 0
+
+    def _gravar(self, dados):
+        linha = json.dumps(dados, ensure_ascii=False)
+        logging.info(f"Métricas: {linha}")
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(linha + '\n')
+
+    @contextmanager
+    def medir(self, etapa):
+        """Cronometra uma etapa da execução (descoberta, downloads, ...)"""
+        parcial = Metricas(etapa)
+        try:
+            with parcial.medir(etapa) as registro:
+                yield registro
+        finally:
+            with self._lock:
+                self.execucao.mesclar(parcial)
+
+    def registrar(self, metricas):
+        """Grava as métricas de um arquivo e soma na execução"""
+        if metricas is None:
+            return
+        with self._lock:
+            self.arquivos += 1
+            self.execucao.mesclar(metricas)
+            self._gravar(metricas.to_dict())
+
+    def finalizar(self):
+        """Grava as métricas da execução e devolve o dicionário"""
+        with self._lock:
+            dados = {**self.execucao.to_dict(), 'arquivos': self.arquivos}
+            self._gravar(dados)
+            return dados
+
+
+# Registro compartilhado pela execução (configurado em main.py)
+registro_metricas = RegistroMetricas()
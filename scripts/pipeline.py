@@ -0,0 +1,165 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+from scripts.leitor_extratos import ArquivoPreparado, load_file, parse_file, validate_file
+from scripts.metrics import Metricas
+
+# Marca o fim da fila para a etapa seguinte
+_FIM = object()
+
+
+class EstatisticaEtapa:
+    """Contadores de uma etapa do pipeline: itens, linhas, tempo ocupado e tempo bloqueado"""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.itens = 0
+        self.linhas = 0
+        self.tempo_ocupado = 0.0
+        self.tempo_bloqueado = 0.0  # espera por espaço na fila seguinte (back-pressure)
+        self.inicio = None
+        self.fim = None
+
+    def relatorio(self):
+        duracao = (self.fim or time.perf_counter()) - (self.inicio or time.perf_counter())
+        return {
+            'etapa': self.nome,
+            'itens': self.itens,
+            'linhas': self.linhas,
+            'tempo_ocupado': round(self.tempo_ocupado, 3),
+            'tempo_bloqueado': round(self.tempo_bloqueado, 3),
+            'arquivos_por_s': round(self.itens / self.tempo_ocupado, 3) if self.tempo_ocupado else None,
+            'linhas_por_s': round(self.linhas / self.tempo_ocupado, 1) if self.tempo_ocupado else None,
+            'duracao': round(duracao, 3)
+        }
+
+
+def _linhas(preparado):
+    for df in (preparado.df_validado, preparado.df_transacoes):
+        if df is not None:
+            return len(df)
+    return 0
+
+
+class PipelineIngestao:
+    """Pipeline em etapas: cópia -> leitura -> validação -> carga no banco.
+
+    Cada etapa roda em sua thread e se comunica com a seguinte por uma fila limitada
+    (tamanho_fila). Assim a leitura/validação do arquivo N+1 acontece enquanto o arquivo N
+    é gravado no banco, e no máximo tamanho_fila arquivos ficam em memória entre as etapas.
+    A carga continua sendo uma transação por arquivo (load_file).
+    buscar_duplicado (hash -> nome ou None) permite pular a leitura de arquivos repetidos.
+    """
+
+    def __init__(self, connection_params, quarantine=False, is_tryout=False, tamanho_fila=2, engine='columnar',
+                 buscar_duplicado=None):
+        self.connection_params = connection_params
+        self.engine = engine
+        self.buscar_duplicado = buscar_duplicado
+        self.quarantine = quarantine
+        self.is_tryout = is_tryout
+        self.tamanho_fila = tamanho_fila
+        self.resultados = {}
+        self.estatisticas = {}
+
+    def _copiar(self, arquivo):
+        file_name, local_file_path, google_drive_path = arquivo
+        metricas = Metricas(file_name)
+        try:
+            if local_file_path != google_drive_path:
+                with metricas.medir('copia') as etapa:
+                    shutil.copy2(google_drive_path, local_file_path)
+                    etapa['bytes'] += os.path.getsize(local_file_path)
+                logging.info(f"Arquivo copiado do Google Drive para processamento: {file_name}")
+            return ArquivoPreparado(file_name, local_file_path, google_drive_path, metricas=metricas)
+        except Exception as e:
+            logging.error(f"Erro ao copiar o arquivo {file_name}: {e}")
+            return ArquivoPreparado(file_name, local_file_path, google_drive_path, erro=str(e), metricas=metricas)
+
+    def _ler(self, preparado):
+        if preparado.erro is not None:
+            return preparado
+        return parse_file(preparado.file_name, preparado.local_file_path, preparado.google_drive_path,
+                          engine=self.engine, buscar_duplicado=self.buscar_duplicado,
+                          metricas=preparado.metricas)
+
+    def _validar(self, preparado):
+        return validate_file(preparado, quarantine=self.quarantine)
+
+    def _carregar(self, preparado):
+        sucesso = load_file(preparado, self.connection_params, is_tryout=self.is_tryout)
+        self.resultados[preparado.file_name] = sucesso
+        if not sucesso:
+            if preparado.local_file_path != preparado.google_drive_path and os.path.exists(preparado.local_file_path):
+                os.remove(preparado.local_file_path)
+            logging.error(f"Erro ao processar arquivo {preparado.file_name}")
+        return preparado
+
+    def _executar_etapa(self, nome, funcao, entrada, saida):
+        estatistica = self.estatisticas[nome]
+        estatistica.inicio = time.perf_counter()
+        while True:
+            item = entrada.get()
+            if item is _FIM:
+                break
+
+            inicio = time.perf_counter()
+            try:
+                resultado = funcao(item)
+            except Exception as e:
+                # As funções das etapas já tratam seus erros; aqui só evitamos travar o pipeline
+                logging.error(f"Erro inesperado na etapa {nome}: {e}")
+                resultado = None
+            estatistica.tempo_ocupado += time.perf_counter() - inicio
+            estatistica.itens += 1
+
+            if resultado is None:
+                continue
+            estatistica.linhas += _linhas(resultado)
+
+            if saida is not None:
+                inicio = time.perf_counter()
+                saida.put(resultado)
+                estatistica.tempo_bloqueado += time.perf_counter() - inicio
+
+        estatistica.fim = time.perf_counter()
+        if saida is not None:
+            saida.put(_FIM)
+
+    def run(self, arquivos):
+        """Processa a lista de (file_name, local_file_path, google_drive_path); retorna {file_name: sucesso}"""
+        etapas = [
+            ('copia', self._copiar),
+            ('leitura', self._ler),
+            ('validacao', self._validar),
+            ('carga', self._carregar),
+        ]
+        filas = [queue.Queue(maxsize=self.tamanho_fila) for _ in etapas]
+        self.estatisticas = {nome: EstatisticaEtapa(nome) for nome, _ in etapas}
+
+        threads = []
+        for i, (nome, funcao) in enumerate(etapas):
+            saida = filas[i + 1] if i + 1 < len(filas) else None
+            thread = threading.Thread(target=self._executar_etapa, args=(nome, funcao, filas[i], saida),
+                                      name=f"pipeline-{nome}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        for arquivo in arquivos:
+            filas[0].put(arquivo)
+        filas[0].put(_FIM)
+
+        for thread in threads:
+            thread.join()
+
+        for relatorio in self.relatorio():
+            logging.info(f"Pipeline - {relatorio}")
+        return self.resultados
+
+    def relatorio(self):
+        """Vazão de cada etapa (arquivos/s e linhas/s sobre o tempo ocupado)"""
+        return [estatistica.relatorio() for estatistica in self.estatisticas.values()]
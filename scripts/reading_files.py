@@ -1,17 +1,291 @@
+import hashlib
+import numpy as np
 import pandas as pd
+from operator import itemgetter
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Campo(NamedTuple):
+    """Definição de um campo de largura fixa do layout Unica"""
+    nome: str
+    inicio: int
+    fim: int
+    tipo: str = 'texto'  # 'texto' ou 'numerico' (duas casas decimais implícitas)
+    pad: Optional[int] = None  # largura para zfill após o strip
+
+
+# Layout do registro CV (detalhe de transação) - versão 002.0a
+LAYOUT_CV = (
+    Campo("codigo_registro", 0, 2),
+    Campo("identificacao_loja", 2, 17, pad=15),
+    Campo("nsu_host_transacao", 17, 29),
+    Campo("data_transacao", 29, 37),
+    Campo("horario_transacao", 37, 43),
+    Campo("tipo_lancamento", 43, 44),
+    Campo("data_lancamento", 44, 52),
+    Campo("tipo_produto", 52, 53),
+    Campo("meio_captura", 53, 54),
+    Campo("valor_bruto_venda", 54, 65, 'numerico'),
+    Campo("valor_desconto", 65, 76, 'numerico'),
+    Campo("valor_liquido_venda", 76, 87, 'numerico'),
+    Campo("numero_cartao", 87, 106, pad=19),
+    Campo("numero_parcela", 106, 108, pad=2),
+    Campo("numero_total_parcelas", 108, 110, pad=2),
+    Campo("nsu_host_parcela", 110, 122, pad=12),
+    Campo("valor_bruto_parcela", 122, 133, 'numerico'),
+    Campo("valor_desconto_parcela", 133, 144, 'numerico'),
+    Campo("valor_liquido_parcela", 144, 155, 'numerico'),
+    Campo("banco", 155, 158),
+    Campo("agencia", 158, 164),
+    Campo("conta", 164, 175),
+    Campo("codigo_autorizacao", 175, 187, pad=12),
+    Campo("codigo_bandeira", 187, 190, pad=3),
+    Campo("codigo_produto", 190, 193, pad=3),
+    Campo("valor_tx_interchange_tarifa", 193, 204, 'numerico'),
+    Campo("valor_tx_administracao", 204, 215, 'numerico'),
+    Campo("valor_tx_interchange_parcela", 215, 226, 'numerico'),
+    Campo("valor_tx_administracao_parcela", 226, 237, 'numerico'),
+    Campo("valor_redutor_multi_fronteira", 237, 248, 'numerico'),
+    Campo("valor_tx_antecipacao", 248, 259, 'numerico'),
+    Campo("valor_liquido_antecipado", 259, 270, 'numerico'),
+    Campo("tipo_transacao", 270, 272),
+    Campo("codigo_pedido", 272, 302),
+    Campo("sigla_pais", 302, 305),
+    Campo("reservado", 305, 356),
+    Campo("codigo_ec_venda", 305, 314),
+    Campo("codigo_ec_pagamento", 314, 323),
+    Campo("cnpj_ec_pagamento", 323, 337),
+    Campo("data_vencimento_original", 337, 345),
+    Campo("indicador_deb_balance", 345, 346),
+    Campo("indicador_reenvio", 346, 347),
+    Campo("nsu_origem", 347, 353),
+    Campo("reservado_final", 353, 356),
+    Campo("numero_operacao_recebivel", 356, 376),
+    Campo("sequencial_operacao_recebivel", 376, 378),
+    Campo("tipo_operacao_recebivel", 378, 379),
+    Campo("valor_operacao_recebivel", 379, 390, 'numerico'),
+    Campo("nseq", 390, 397),
+)
+
+
+def parse_numeric_field(value, decimal_places=2):
+    """Converte um valor com casas decimais implícitas para o formato 'inteiro.decimais'"""
+    if value.strip().isdigit():
+        integer_part = value[:-decimal_places]
+        decimal_part = value[-decimal_places:]
+        return f"{int(integer_part)}.{decimal_part}"
+    return value.strip()
+
+
+class DecodificadorLayout:
+    """Decodificador de registros de largura fixa compilado a partir de um layout"""
+
+    def __init__(self, layout):
+        self.layout = tuple(layout)
+        self.colunas = [campo.nome for campo in self.layout]
+        # Um único itemgetter extrai todos os campos de uma linha em uma passada
+        self._fatiador = itemgetter(*[slice(campo.inicio, campo.fim) for campo in self.layout])
+        self._conversores = [self._compilar_conversor(campo) for campo in self.layout]
+        # Posições que decode_registro converte depois do strip
+        self._numericos = [i for i, campo in enumerate(self.layout) if campo.tipo == 'numerico']
+        self._preenchidos = [(i, campo.pad) for i, campo in enumerate(self.layout)
+                             if campo.tipo != 'numerico' and campo.pad]
+
+    @staticmethod
+    def _compilar_conversor(campo):
+        if campo.tipo == 'numerico':
+            largura = campo.fim - campo.inicio
+            return lambda valores: _numerico_colunar(valores, largura)
+        if campo.pad:
+            largura = campo.pad
+            return lambda valores: [v.zfill(largura) for v in map(str.strip, valores)]
+        return lambda valores: list(map(str.strip, valores))
+
+    def decode(self, linhas) -> Dict[str, List[str]]:
+        """Decodifica as linhas em colunas (nome do campo -> lista de valores)"""
+        fatias = [self._fatiador(linha) for linha in linhas]
+        if not fatias:
+            # Sem registros não há colunas, como na leitura registro a registro (DataFrame vazio)
+            return {}
+        return {
+            coluna: converter(valores)
+            for coluna, converter, valores in zip(self.colunas, self._conversores, zip(*fatias))
+        }
+
+    def decode_registro(self, linha) -> Dict[str, str]:
+        """Decodifica uma única linha como dicionário (modo de compatibilidade)"""
+        valores = list(map(str.strip, self._fatiador(linha)))
+        for i, largura in self._preenchidos:
+            valores[i] = valores[i].zfill(largura)
+        for i in self._numericos:
+            valor = valores[i]
+            if valor.isdigit():
+                valores[i] = f"{int(valor[:-2])}.{valor[-2:]}"
+        return dict(zip(self.colunas, valores))
+
+    def decode_matriz(self, matriz) -> Dict[str, np.ndarray]:
+        """Decodifica uma matriz uint8 (uma linha por registro) fatiando cada campo por coluna"""
+        if matriz.shape[0] == 0:
+            # Arquivo sem registros CV: sem colunas, como decode (np.char.zfill falha em array vazio)
+            return {}
+        colunas = {}
+        for campo in self.layout:
+            bytes_campo = matriz[:, campo.inicio:campo.fim]
+            if campo.tipo == 'numerico':
+                colunas[campo.nome] = _decode_numerico(bytes_campo)
+                continue
+            valores = np.char.strip(_decode_texto(bytes_campo))
+            if campo.pad:
+                valores = np.char.zfill(valores, campo.pad)
+            colunas[campo.nome] = valores
+        return colunas
+
+
+def _decode_texto(bytes_campo):
+    # Em latin-1 cada byte é o próprio code point, então basta reinterpretar como UCS-4
+    quantidade, largura = bytes_campo.shape
+    if largura == 0:
+        return np.full(quantidade, '', dtype='U1')
+    return np.ascontiguousarray(bytes_campo, dtype=np.uint32).view(f'U{largura}').ravel()
+
+
+def _decode_numerico(bytes_campo, decimal_places=2):
+    """Versão vetorizada de parse_numeric_field para uma coluna inteira"""
+    quantidade, largura = bytes_campo.shape
+    somente_digitos = (
+        ((bytes_campo >= ord('0')) & (bytes_campo <= ord('9'))).all(axis=1)
+        & (largura > decimal_places)
+    )
+    # Monta 'inteiro.decimais' removendo os zeros à esquerda da parte inteira:
+    # a posição j recebe o byte j + zeros (parte inteira) ou j + zeros - 1 (após o ponto)
+    parte_inteira = bytes_campo[:, :max(largura - decimal_places, 0)] != ord('0')
+    zeros = np.where(parte_inteira.any(axis=1), parte_inteira.argmax(axis=1),
+                     max(largura - decimal_places - 1, 0))
+    tamanho_inteiro = (largura - decimal_places - zeros)[:, None]
+    posicoes = np.arange(largura + 1)
+    origem = posicoes + zeros[:, None] - (posicoes > tamanho_inteiro)
+    saida = np.take_along_axis(bytes_campo, np.minimum(origem, max(largura - 1, 0)), axis=1).astype(np.uint32)
+    saida[posicoes == tamanho_inteiro] = ord('.')
+    saida[posicoes > tamanho_inteiro + decimal_places] = 0
+    valores = saida.view(f'U{largura + 1}').ravel()
+
+    # Campos com espaços ou caracteres não numéricos seguem a regra original, valor a valor
+    outros = np.flatnonzero(~somente_digitos)
+    if outros.size:
+        originais = _decode_texto(bytes_campo[outros])
+        valores[outros] = [parse_numeric_field(valor.strip(), decimal_places) for valor in originais]
+    return valores
+
+
+def _numerico_colunar(valores, largura):
+    """parse_numeric_field de uma coluna de fatias: com todas na largura do campo, a coluna
+    vira uma matriz uint8 convertida de uma vez por _decode_numerico"""
+    texto = ''.join(valores)
+    if len(texto) != largura * len(valores):
+        # Linhas mais curtas que o layout geram fatias menores: conversão valor a valor
+        return [parse_numeric_field(valor.strip()) for valor in valores]
+    matriz = np.frombuffer(texto.encode('latin-1'), dtype=np.uint8).reshape(len(valores), largura)
+    return _decode_numerico(matriz).tolist()
+
+
+def mapear_linhas(buffer, largura):
+    """Separa um buffer de bytes em linhas e monta a matriz (registros CV x largura).
+
+    Retorna a primeira linha, a última linha e a matriz dos registros CV entre elas.
+    Quando os registros CV são contíguos e de mesmo tamanho, a matriz é apenas uma
+    visão sobre o buffer (sem cópia).
+    """
+    quebras = np.flatnonzero(buffer == ord('\n'))
+    inicios = np.concatenate(([0], quebras + 1))
+    fins = np.concatenate((quebras, [buffer.size]))
+    if inicios[-1] == buffer.size:  # arquivo terminado em quebra de linha
+        inicios, fins = inicios[:-1], fins[:-1]
+    # Remove o '\r' de arquivos com quebra de linha no padrão Windows
+    fins = fins - ((fins > inicios) & (buffer[np.maximum(fins - 1, 0)] == ord('\r')))
+
+    def linha(i):
+        return buffer[inicios[i]:fins[i]].tobytes().decode('latin-1')
+
+    primeira, ultima = linha(0), linha(-1)
+
+    # Equivalente a data[1:-1] filtrando as linhas que começam com "CV"
+    inicios, fins = inicios[1:-1], fins[1:-1]
+    tamanhos = fins - inicios
+    candidatas = tamanhos >= 2
+    cv = np.zeros(inicios.size, dtype=bool)
+    cv[candidatas] = (buffer[inicios[candidatas]] == ord('C')) & (buffer[inicios[candidatas] + 1] == ord('V'))
+    inicios, tamanhos = inicios[cv], tamanhos[cv]
+
+    if inicios.size == 0:
+        return primeira, ultima, np.empty((0, largura), dtype=np.uint8)
+
+    passos = np.diff(inicios)
+    if (tamanhos == tamanhos[0]).all() and (passos.size == 0 or (passos == passos[0]).all()):
+        passo = passos[0] if passos.size else tamanhos[0]
+        matriz = np.lib.stride_tricks.as_strided(
+            buffer[inicios[0]:], shape=(inicios.size, min(tamanhos[0], largura)),
+            strides=(passo, 1), writeable=False
+        )
+        return primeira, ultima, matriz
+
+    # Registros de tamanhos diferentes: copia para uma matriz preenchida com espaços, em blocos
+    matriz = np.full((inicios.size, largura), ord(' '), dtype=np.uint8)
+    posicoes = np.arange(largura)
+    for bloco in range(0, inicios.size, 65536):
+        fatia = slice(bloco, bloco + 65536)
+        validos = posicoes < tamanhos[fatia, None]
+        indices = inicios[fatia, None] + posicoes
+        matriz[fatia][validos] = buffer[indices[validos]]
+    return primeira, ultima, matriz
+
+
+DECODIFICADOR_CV = DecodificadorLayout(LAYOUT_CV)
+
+
+class ImpressaoArquivo(NamedTuple):
+    """Identificação de um arquivo de extrato: hash do conteúdo e campos do header (A0)"""
+    sha256: str
+    id_movimento: Optional[str]
+    data_geracao: Optional[str]
+    nseq_registro: Optional[str]
+
+
+def impressao_arquivo(file_path, chunk_size=1024 * 1024):
+    """Calcula o SHA-256 do arquivo em blocos (memória constante) e lê o header da primeira linha"""
+    sha256 = hashlib.sha256()
+    primeira_linha = b''
+    with open(file_path, 'rb') as f:
+        for bloco in iter(lambda: f.read(chunk_size), b''):
+            if not primeira_linha:
+                primeira_linha = bloco.split(b'\n', 1)[0]
+            sha256.update(bloco)
+
+    header = primeira_linha.rstrip(b'\r').decode('latin-1')
+    if not header.startswith("A0"):
+        return ImpressaoArquivo(sha256.hexdigest(), None, None, None)
+    return ImpressaoArquivo(sha256.hexdigest(), header[22:28], header[8:16], header[72:78])
+
 
 class ExtratoTransacao:
-    def __init__(self, file_path):
+    ENGINES = ('columnar', 'dict', 'numpy')
+
+    def __init__(self, file_path, engine='columnar'):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Engine inválida: {engine}. Use uma de {self.ENGINES}")
         self.file_path = file_path
+        self.engine = engine
         self.data = None
         self.transacoes = []
+        self.header_info = None
+        self.trailer_info = None
     
     def load_file(self):
         with open(self.file_path, 'r', encoding='latin-1') as f:
             self.data = f.readlines()
     
-    def parse_header(self):
-        header = self.data[0]
+    def parse_header(self, header=None):
+        if header is None:
+            header = self.data[0]
         if header.startswith("A0"):
             return {
                 'codigo_registro': header[0:2],
@@ -29,8 +303,9 @@ class ExtratoTransacao:
             print("Cabeçalho não encontrado ou inválido.")
             return None
 
-    def parse_trailer(self):
-        trailer = self.data[-1]
+    def parse_trailer(self, trailer=None):
+        if trailer is None:
+            trailer = self.data[-1]
         if trailer.startswith("A9"):
             return {
                 'codigo_registro': trailer[0:2],
@@ -41,72 +316,57 @@ class ExtratoTransacao:
             print("Trailer não encontrado ou inválido.")
             return None
 
+    def parse_mmap(self):
+        """Lê o arquivo via memory-map e decodifica todos os registros CV de forma vetorizada"""
+        largura = max(campo.fim for campo in LAYOUT_CV)
+        buffer = np.memmap(self.file_path, dtype=np.uint8, mode='r')
+        try:
+            primeira, ultima, matriz = mapear_linhas(buffer, largura)
+            self.transacoes = DECODIFICADOR_CV.decode_matriz(matriz)
+        finally:
+            del buffer
+        self.header_info = self.parse_header(primeira)
+        self.trailer_info = self.parse_trailer(ultima)
+
     def parse_transacao(self, transacao):
-        def parse_numeric_field(value, decimal_places=2):
-            if value.strip().isdigit():
-                integer_part = value[:-decimal_places]
-                decimal_part = value[-decimal_places:]
-                return f"{int(integer_part)}.{decimal_part}"
-            return value.strip()
-        
-        return {
-            "codigo_registro": transacao[0:2].strip(),
-            "identificacao_loja": transacao[2:17].strip().zfill(15),
-            "nsu_host_transacao": transacao[17:29].strip(),
-            "data_transacao": transacao[29:37].strip(),
-            "horario_transacao": transacao[37:43].strip(),
-            "tipo_lancamento": transacao[43:44].strip(),
-            "data_lancamento": transacao[44:52].strip(),
-            "tipo_produto": transacao[52:53].strip(),
-            "meio_captura": transacao[53:54].strip(),
-            "valor_bruto_venda": parse_numeric_field(transacao[54:65].strip()),
-            "valor_desconto": parse_numeric_field(transacao[65:76].strip()),
-            "valor_liquido_venda": parse_numeric_field(transacao[76:87].strip()),
-            "numero_cartao": transacao[87:106].strip().zfill(19),
-            "numero_parcela": transacao[106:108].strip().zfill(2),
-            "numero_total_parcelas": transacao[108:110].strip().zfill(2),
-            "nsu_host_parcela": transacao[110:122].strip().zfill(12),
-            "valor_bruto_parcela": parse_numeric_field(transacao[122:133].strip()),
-            "valor_desconto_parcela": parse_numeric_field(transacao[133:144].strip()),
-            "valor_liquido_parcela": parse_numeric_field(transacao[144:155].strip()),
-            "banco": transacao[155:158].strip(),
-            "agencia": transacao[158:164].strip(),
-            "conta": transacao[164:175].strip(),
-            "codigo_autorizacao": transacao[175:187].strip().zfill(12),
-            "codigo_bandeira": transacao[187:190].strip().zfill(3),
-            "codigo_produto": transacao[190:193].strip().zfill(3),
-            "valor_tx_interchange_tarifa": parse_numeric_field(transacao[193:204].strip()),
-            "valor_tx_administracao": parse_numeric_field(transacao[204:215].strip()),
-            "valor_tx_interchange_parcela": parse_numeric_field(transacao[215:226].strip()),
-            "valor_tx_administracao_parcela": parse_numeric_field(transacao[226:237].strip()),
-            "valor_redutor_multi_fronteira": parse_numeric_field(transacao[237:248].strip()),
-            "valor_tx_antecipacao": parse_numeric_field(transacao[248:259].strip()),
-            "valor_liquido_antecipado": parse_numeric_field(transacao[259:270].strip()),
-            "tipo_transacao": transacao[270:272].strip(),
-            "codigo_pedido": transacao[272:302].strip(),
-            "sigla_pais": transacao[302:305].strip(),
-            "reservado": transacao[305:356].strip(),
-            "codigo_ec_venda": transacao[305:314].strip(),
-            "codigo_ec_pagamento": transacao[314:323].strip(),
-            "cnpj_ec_pagamento": transacao[323:337].strip(),
-            "data_vencimento_original": transacao[337:345].strip(),
-            "indicador_deb_balance": transacao[345:346].strip(),
-            "indicador_reenvio": transacao[346:347].strip(),
-            "nsu_origem": transacao[347:353].strip(),
-            "reservado_final": transacao[353:356].strip(),
-            "numero_operacao_recebivel": transacao[356:376].strip(),
-            "sequencial_operacao_recebivel": transacao[376:378].strip(),
-            "tipo_operacao_recebivel": transacao[378:379].strip(),
-            "valor_operacao_recebivel": parse_numeric_field(transacao[379:390].strip()),
-            "nseq": transacao[390:396+1].strip()
-        }
+        return DECODIFICADOR_CV.decode_registro(transacao)
+
+    def _parse_linhas(self, linhas):
+        if self.engine == 'dict':
+            return [self.parse_transacao(linha) for linha in linhas]
+        return DECODIFICADOR_CV.decode(linhas)
 
     def parse_transacoes(self):
-        self.transacoes = []
-        for linha in self.data[1:-1]:  # Ignorar header e trailer
-            if linha.startswith("CV"):
-                transacao_info = self.parse_transacao(linha)
-                self.transacoes.append(transacao_info)
+        linhas = [linha for linha in self.data[1:-1] if linha.startswith("CV")]  # Ignorar header e trailer
+        self.transacoes = self._parse_linhas(linhas)
+
+    def iter_transacoes(self, chunk_size=50000):
+        """Lê o arquivo em streaming, gerando um DataFrame a cada chunk_size registros CV.
+
+        O header é lido na primeira linha e o trailer ao final da leitura, ficando
+        disponíveis em self.header_info e self.trailer_info. A memória usada depende
+        apenas do tamanho do bloco, não do tamanho do arquivo.
+        """
+        self.header_info = None
+        self.trailer_info = None
+        bloco = []
+        with open(self.file_path, 'r', encoding='latin-1') as f:
+            anterior = f.readline()
+            if not anterior:
+                return
+            self.header_info = self.parse_header(anterior)
+            # A linha anterior só é tratada após ler a seguinte, para que a última linha
+            # (trailer) seja ignorada como em parse_transacoes
+            for indice, linha in enumerate(f):
+                if indice > 0 and anterior.startswith("CV"):
+                    bloco.append(anterior)
+                    if len(bloco) >= chunk_size:
+                        yield pd.DataFrame(self._parse_linhas(bloco))
+                        bloco = []
+                anterior = linha
+        if bloco:
+            yield pd.DataFrame(self._parse_linhas(bloco))
+        self.trailer_info = self.parse_trailer(anterior)
 
     def to_dataframe(self):
         return pd.DataFrame(self.transacoes)
@@ -118,6 +378,13 @@ class ExtratoTransacao:
         return pd.DataFrame([trailer_info]) if trailer_info else pd.DataFrame()
 
     def process_file(self):
+        if self.engine == 'numpy':
+            self.parse_mmap()
+            df_header = self.to_dataframe_header(self.header_info)
+            df_transacoes = self.to_dataframe()
+            df_trailer = self.to_dataframe_trailer(self.trailer_info)
+            return df_header, df_transacoes, df_trailer
+
         self.load_file()
         
         # Process header if it starts with "A0"
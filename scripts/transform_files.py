@@ -1,9 +1,217 @@
+import time
+from typing import Callable, NamedTuple, Optional, Union
+
+import numpy as np
 import pandas as pd
 
+
+def _texto(serie):
+    """Retorna a série como texto; valores que não são str viram NaN, como no isinstance(x, str)"""
+    if pd.api.types.is_object_dtype(serie):
+        if pd.api.types.infer_dtype(serie, skipna=False) == 'string':
+            return serie
+        return serie.where(serie.map(type, na_action='ignore').eq(str))
+    if pd.api.types.is_string_dtype(serie):
+        return serie
+    return pd.Series(np.nan, index=serie.index, dtype=object)
+
+
+def _tamanho(serie):
+    """Equivalente vetorizado de len(x) para valores texto (NaN nos demais)"""
+    return _texto(serie).str.len()
+
+
+def _somente_digitos(serie):
+    """Equivalente vetorizado de isinstance(x, str) and x.isdigit()"""
+    return _texto(serie).str.isdigit().eq(True)
+
+
+def _tamanho_digitos(serie, tamanho):
+    return _tamanho(serie).eq(tamanho) & _somente_digitos(serie)
+
+
+def _decimal(serie):
+    """Equivalente vetorizado de isinstance(x, str) and x.replace('.', '', 1).isdigit()"""
+    return _somente_digitos(_texto(serie).str.replace('.', '', n=1, regex=False))
+
+
+def _inteiro_ou_digitos(serie):
+    """Equivalente vetorizado de isinstance(x, int) or (isinstance(x, str) and x.isdigit())"""
+    if pd.api.types.is_integer_dtype(serie):
+        return pd.Series(True, index=serie.index)
+    digitos = _somente_digitos(serie)
+    # Colunas object podem misturar int e texto; só confere o tipo quando nem tudo é texto
+    if pd.api.types.is_object_dtype(serie) and pd.api.types.infer_dtype(serie, skipna=False) != 'string':
+        digitos |= serie.map(lambda x: isinstance(x, int), na_action='ignore').eq(True)
+    return digitos
+
+
+def _para_data(serie):
+    return pd.to_datetime(serie, format='%Y%m%d', errors='coerce')
+
+
+def _para_texto_inteiro(serie):
+    """Normaliza códigos numéricos com zeros à esquerda ('001' -> '1')"""
+    return serie.astype(int).astype(str)
+
+
+class Regra(NamedTuple):
+    """Regra de validação (e conversão) de uma coluna do DataFrame de transações"""
+    coluna: str
+    valida: Callable[[pd.Series], pd.Series]  # máscara com True nas linhas válidas
+    mensagem: Union[str, Callable[[pd.Series, pd.Series], str]]
+    converte: Optional[Callable[[pd.Series], pd.Series]] = None  # aplicada se todas as linhas forem válidas
+    mensagem_conversao: Optional[str] = None  # erro se a conversão gerar valores nulos
+    prepara: Optional[Callable[[pd.Series], pd.Series]] = None  # aplicada antes da validação
+    mensagem_preparo: Optional[str] = None  # erro se o preparo falhar (None propaga a exceção)
+    interrompe: bool = False  # levanta ValueError ao falhar
+
+
+def regra_tamanho(coluna, tamanho, mensagem):
+    return Regra(coluna, lambda s: _tamanho(s).eq(tamanho), mensagem)
+
+
+def regra_dominio(coluna, valores, mensagem, mapa=None):
+    return Regra(coluna, lambda s: s.isin(list(valores)), mensagem,
+                 converte=(lambda s: s.map(mapa)) if mapa else None)
+
+
+def regra_decimal(coluna):
+    return Regra(coluna, _decimal,
+                 f"Erro no campo '{coluna}': Deve estar no formato numérico com ponto decimal.",
+                 converte=lambda s: s.astype(float))
+
+
+def regra_data(coluna):
+    return Regra(coluna, lambda s: _tamanho_digitos(s, 8),
+                 f"Erro no campo '{coluna}': Deve estar no formato YYYYMMDD.",
+                 converte=_para_data,
+                 mensagem_conversao=f"Erro na conversão de '{coluna}': Formato inválido para datas.")
+
+
+TIPO_LANCAMENTO = {0: "Previsão", 1: "Liquidação Normal", 2: "Liquidação Antecipada"}
+
+MEIO_CAPTURA = {
+    '1': "Manual",
+    '2': "Pos",
+    '3': "Pdv",
+    '4': "Trn Off",
+    '5': "Internet",
+    '6': "URA",
+    '8': "Indefinido",
+    '9': "Outros"
+}
+
+CODIGO_BANDEIRA = {'1': "Master", '2': "Visa", '7': "Elo"}
+
+CODIGO_PRODUTO = {
+    '1': "Visa Crédito", '2': "Master Crédito", '3': "Visa Débito",
+    '4': "Master Débito", '5': "Elo Crédito", '6': "Elo Débito", '10': 'Outros',
+    '12': 'Outros', '8': 'Outros', '9': 'Outros', '7': 'Outros', '11': 'Outros'
+}
+
+TIPO_TRANSACAO = {'00': "Normal"}
+TIPO_TRANSACAO_NAO_UTILIZADOS = ['01', '02', '03', '04']
+
+TIPO_OPERACAO_RECEBIVEL = ['C', 'G', 'P', 'R', 'A', 'F', 'E', 'U']
+
+
+def _mensagem_codigo_produto(serie, validos):
+    invalidos = serie[~validos]
+    return (
+        f"Erro no campo 'codigo_produto': Valores inválidos encontrados: {invalidos.unique()} "
+        f"nas linhas: {invalidos.index.tolist()}. "
+        f"Deve ser um dos valores permitidos: {list(CODIGO_PRODUTO.keys())}."
+    )
+
+
+# Regras aplicadas por validate_all, na ordem de execução
+REGRAS = (
+    regra_tamanho('codigo_registro', 2, "Erro no campo 'codigo_registro': Deve ter 2 caracteres."),
+    Regra('identificacao_loja',
+          lambda s: _tamanho(s).eq(15) & _somente_digitos(_texto(s).str[1:]),
+          "Erro no campo 'identificacao_loja': Deve ter 15 dígitos no total, e os 14 últimos devem ser numéricos."),
+    Regra('nsu_host_transacao', lambda s: _tamanho_digitos(s, 12),
+          "Erro no campo 'nsu_host_transacao': Deve ter 12 dígitos numéricos.",
+          converte=lambda s: s.astype(int)),
+    regra_data('data_transacao'),
+    Regra('horario_transacao', lambda s: _tamanho_digitos(s, 6),
+          "Erro no campo 'horario_transacao': Deve estar no formato HHMMSS."),
+    regra_dominio('tipo_lancamento', TIPO_LANCAMENTO, "Erro no campo 'tipo_lancamento': Deve ser 0, 1 ou 2.",
+                  mapa=TIPO_LANCAMENTO)._replace(
+        prepara=lambda s: s.astype(int),
+        mensagem_preparo="Erro no campo 'tipo_lancamento': Valores devem ser inteiros 0, 1 ou 2."),
+    regra_data('data_lancamento'),
+    regra_dominio('tipo_produto', ['C', 'D', 'V'], "Erro no campo 'tipo_produto': Deve ser 'C', 'D' ou 'V'."),
+    regra_dominio('meio_captura', MEIO_CAPTURA, "Erro no campo 'meio_captura': Deve ser um dos valores permitidos.",
+                  mapa=MEIO_CAPTURA),
+    regra_decimal('valor_bruto_venda'),
+    regra_decimal('valor_desconto'),
+    regra_decimal('valor_liquido_venda'),
+    regra_tamanho('numero_cartao', 19, "Erro no campo 'numero_cartao': Deve ter exatamente 19 caracteres."),
+    Regra('numero_parcela', _inteiro_ou_digitos,
+          "Erro no campo 'numero_parcela': Deve ser zero ou um número.",
+          converte=lambda s: s.astype(int)),
+    Regra('numero_total_parcelas', _inteiro_ou_digitos,
+          "Erro no campo 'numero_total_parcelas': Deve ser zero ou um número.",
+          converte=lambda s: s.astype(int)),
+    Regra('nsu_host_parcela', lambda s: _somente_digitos(s) & _tamanho(s).isin([0, 12]),
+          "Erro no campo 'nsu_host_parcela': Deve ter 12 dígitos ou estar vazio.",
+          converte=lambda s: s.replace('', '0').astype(int)),
+    regra_decimal('valor_bruto_parcela'),
+    regra_decimal('valor_desconto_parcela'),
+    regra_decimal('valor_liquido_parcela'),
+    regra_tamanho('banco', 3, "Erro no campo 'banco': Deve ter exatamente 3 dígitos."),
+    regra_tamanho('agencia', 6, "Erro no campo 'agencia': Deve ter exatamente 6 dígitos."),
+    regra_tamanho('conta', 6, "Erro no campo 'conta': Deve ter exatamente 6 dígitos."),
+    regra_tamanho('codigo_autorizacao', 12, "Erro no campo 'codigo_autorizacao': Deve ter exatamente 12 dígitos."),
+    regra_dominio('codigo_bandeira', CODIGO_BANDEIRA, "Erro no campo 'codigo_bandeira': Deve ser 1, 2 ou 7.",
+                  mapa=CODIGO_BANDEIRA)._replace(prepara=_para_texto_inteiro),
+    regra_dominio('codigo_produto', CODIGO_PRODUTO, _mensagem_codigo_produto,
+                  mapa=CODIGO_PRODUTO)._replace(prepara=_para_texto_inteiro, interrompe=True),
+    regra_decimal('valor_tx_interchange_tarifa'),
+    regra_decimal('valor_tx_administracao'),
+    regra_decimal('valor_tx_interchange_parcela'),
+    Regra('tipo_transacao', lambda s: s.isin(list(TIPO_TRANSACAO) + TIPO_TRANSACAO_NAO_UTILIZADOS),
+          "Erro no campo 'tipo_transacao': Deve ser '00' para transações válidas.",
+          converte=lambda s: s.map(TIPO_TRANSACAO),
+          mensagem_conversao="Erro no campo 'tipo_transacao': Contém valores não utilizados."),
+    Regra('sigla_pais', lambda s: s.eq("BRA"), "Erro no campo 'sigla_pais': Deve ser 'BRA'."),
+    # regra_tamanho('reservado', 51, "Erro no campo 'reservado': Deve ter 51 caracteres."),
+    regra_tamanho('codigo_ec_venda', 9, "Erro no campo 'codigo_ec_venda': Deve ter 9 caracteres."),
+    regra_tamanho('codigo_ec_pagamento', 9, "Erro no campo 'codigo_ec_pagamento': Deve ter 9 caracteres."),
+    regra_tamanho('cnpj_ec_pagamento', 14, "Erro no campo 'cnpj_ec_pagamento': Deve ter 14 caracteres."),
+    regra_data('data_vencimento_original'),
+    regra_dominio('indicador_deb_balance', ['D', ''], "Erro no campo 'indicador_deb_balance': Deve ser 'D' ou estar vazio."),
+    regra_dominio('indicador_reenvio', ['R', ''], "Erro no campo 'indicador_reenvio': Deve ser 'R' ou estar vazio."),
+    Regra('nsu_origem', lambda s: _tamanho(s).le(6) & _somente_digitos(s),
+          "Erro no campo 'nsu_origem': Deve ter até 6 dígitos numéricos.",
+          converte=lambda s: s.str.zfill(6)),
+    Regra('numero_operacao_recebivel', lambda s: _tamanho(s).isin([0, 20]),
+          "Erro no campo 'numero_operacao_recebivel': Deve ter 20 caracteres ou estar vazio."),
+    regra_tamanho('sequencial_operacao_recebivel', 2, "Erro no campo 'sequencial_operacao_recebivel': Deve ter 2 caracteres."),
+    regra_dominio('tipo_operacao_recebivel', TIPO_OPERACAO_RECEBIVEL + [""],
+                  "Erro no campo 'tipo_operacao_recebivel': Deve ser um dos valores permitidos ou estar vazio."),
+    regra_decimal('valor_operacao_recebivel'),
+    regra_tamanho('nseq', 6, "Erro no campo 'nseq': Deve ter 6 caracteres."),
+)
+
+REGRAS_POR_COLUNA = {regra.coluna: regra for regra in REGRAS}
+
+
+COLUNAS_ERROS_LINHAS = ['indice', 'nseq', 'coluna', 'valor', 'mensagem']
+
+
 class TransformerTrasacoes:
-    def __init__(self, dataframe):
+    def __init__(self, dataframe, regras=REGRAS, bulk=False):
+        """Com bulk=True todas as regras são aplicadas mesmo após falhas (nenhuma interrompe a
+        validação) e cada linha inválida é registrada em erros_por_linha()."""
         self.df = dataframe
         self.errors = []
+        self.regras = regras
+        self.bulk = bulk
+        self.tempos_regras = {}
+        self.erros_linhas = []
 
     def validate_structure(self):
         expected_columns = [
@@ -24,323 +232,83 @@ class TransformerTrasacoes:
             return False
         return True
 
-    def validate_codigo_registro(self):
-        if not self.df['codigo_registro'].apply(lambda x: isinstance(x, str) and len(x) == 2).all():
-            self.errors.append("Erro no campo 'codigo_registro': Deve ter 2 caracteres.")
-
-    def validate_identificacao_loja(self):
-        if not self.df['identificacao_loja'].apply(lambda x: isinstance(x, str) and len(x) == 15 and x[1:].isdigit()).all():
-            self.errors.append("Erro no campo 'identificacao_loja': Deve ter 15 dígitos no total, e os 14 últimos devem ser numéricos.")
-
-    def validate_nsu_host_transacao(self):
-        if not self.df['nsu_host_transacao'].apply(lambda x: isinstance(x, str) and len(x) == 12 and x.isdigit()).all():
-            self.errors.append("Erro no campo 'nsu_host_transacao': Deve ter 12 dígitos numéricos.")
-        else:
-            self.df['nsu_host_transacao'] = self.df['nsu_host_transacao'].astype(int)
-
-    def validate_data_transacao(self):
-        if not self.df['data_transacao'].apply(lambda x: isinstance(x, str) and len(x) == 8 and x.isdigit()).all():
-            self.errors.append("Erro no campo 'data_transacao': Deve estar no formato YYYYMMDD.")
-        else:
-            self.df['data_transacao'] = pd.to_datetime(self.df['data_transacao'], format='%Y%m%d', errors='coerce')
-            if self.df['data_transacao'].isnull().any():
-                self.errors.append("Erro na conversão de 'data_transacao': Formato inválido para datas.")
-
-    def validate_horario_transacao(self): ## precisa mudar
-        """Valida o campo 'horario_transacao'."""
-        if not self.df['horario_transacao'].apply(lambda x: isinstance(x, str) and len(x) == 6 and x.isdigit()).all():
-            self.errors.append("Erro no campo 'horario_transacao': Deve estar no formato HHMMSS.")
-
-    def validate_tipo_lancamento(self):
-        valid_values = {0: "Previsão", 1: "Liquidação Normal", 2: "Liquidação Antecipada"}
-        
+    def aplicar_regra(self, regra):
+        """Valida e converte a coluna da regra em uma única passada; retorna a máscara de linhas válidas"""
+        inicio = time.perf_counter()
         try:
-            self.df['tipo_lancamento'] = self.df['tipo_lancamento'].astype(int)
-        except ValueError:
-            self.errors.append("Erro no campo 'tipo_lancamento': Valores devem ser inteiros 0, 1 ou 2.")
+            return self._aplicar_regra(regra)
+        finally:
+            self.tempos_regras[regra.coluna] = time.perf_counter() - inicio
+
+    def _aplicar_regra(self, regra):
+        serie = self.df[regra.coluna]
+        if regra.prepara:
+            try:
+                serie = regra.prepara(serie)
+            except ValueError:
+                if regra.mensagem_preparo is None and not self.bulk:
+                    raise
+                mensagem = regra.mensagem_preparo or f"Erro no campo '{regra.coluna}': Valores devem ser numéricos."
+                self.errors.append(mensagem)
+                validos = pd.to_numeric(serie, errors='coerce').notna()
+                self._registrar_linhas(regra.coluna, serie, ~validos, mensagem)
+                return validos
+            self.df[regra.coluna] = serie
+
+        validos = regra.valida(serie)
+        if not validos.all():
+            if callable(regra.mensagem):
+                self.errors.append(regra.mensagem(serie, validos))
+                mensagem = f"Erro no campo '{regra.coluna}': Valor inválido."
+            else:
+                mensagem = regra.mensagem
+                self.errors.append(mensagem)
+            self._registrar_linhas(regra.coluna, serie, ~validos, mensagem)
+            if regra.interrompe and not self.bulk:
+                raise ValueError(self.errors)
+            return validos
+
+        if regra.converte:
+            original = serie
+            serie = regra.converte(serie)
+            self.df[regra.coluna] = serie
+            if regra.mensagem_conversao:
+                nulos = serie.isnull()
+                if nulos.any():
+                    self.errors.append(regra.mensagem_conversao)
+                    self._registrar_linhas(regra.coluna, original, nulos, regra.mensagem_conversao)
+                    return ~nulos
+        return validos
+
+    def _registrar_linhas(self, coluna, serie, falhas, mensagem):
+        if not self.bulk:
             return
-
-        if not self.df['tipo_lancamento'].apply(lambda x: x in valid_values).all():
-            self.errors.append("Erro no campo 'tipo_lancamento': Deve ser 0, 1 ou 2.")
-        else:
-            self.df['tipo_lancamento'] = self.df['tipo_lancamento'].map(valid_values)
-    
-    def validate_data_lancamento(self):
-        if not self.df['data_lancamento'].apply(lambda x: isinstance(x, str) and len(x) == 8 and x.isdigit()).all():
-            self.errors.append("Erro no campo 'data_lancamento': Deve estar no formato YYYYMMDD.")
-        else:
-            self.df['data_lancamento'] = pd.to_datetime(self.df['data_lancamento'], format='%Y%m%d', errors='coerce')
-            if self.df['data_lancamento'].isnull().any():
-                self.errors.append("Erro na conversão de 'data_lancamento': Formato inválido para datas.")
-
-    def validate_tipo_produto(self):
-        if not self.df['tipo_produto'].apply(lambda x: x in ['C', 'D', 'V']).all():
-            self.errors.append("Erro no campo 'tipo_produto': Deve ser 'C', 'D' ou 'V'.")
-
-    def validate_meio_captura(self):
-        valid_values = {
-            '1': "Manual",
-            '2': "Pos",
-            '3': "Pdv",
-            '4': "Trn Off",
-            '5': "Internet",
-            '6': "URA",
-            '8': "Indefinido",
-            '9': "Outros"
-        }
-        if not self.df['meio_captura'].apply(lambda x: x in valid_values).all():
-            self.errors.append("Erro no campo 'meio_captura': Deve ser um dos valores permitidos.")
-        else:
-            self.df['meio_captura'] = self.df['meio_captura'].map(valid_values)
-    
-    def validate_valor_bruto_venda(self):
-        if not self.df['valor_bruto_venda'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_bruto_venda': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_bruto_venda'] = self.df['valor_bruto_venda'].astype(float)
-    
-    def validate_valor_desconto(self):
-        if not self.df['valor_desconto'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_desconto': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_desconto'] = self.df['valor_desconto'].astype(float)
-
-    def validate_valor_liquido_venda(self):
-        if not self.df['valor_liquido_venda'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_liquido_venda': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_liquido_venda'] = self.df['valor_liquido_venda'].astype(float)
-
-    def validate_numero_cartao(self):
-        if not self.df['numero_cartao'].apply(lambda x: isinstance(x, str) and len(x) == 19).all():
-            self.errors.append("Erro no campo 'numero_cartao': Deve ter exatamente 19 caracteres.")
-
-    def validate_numero_parcela(self):
-        if not self.df['numero_parcela'].apply(lambda x: isinstance(x, int) or (isinstance(x, str) and x.isdigit())).all():
-            self.errors.append("Erro no campo 'numero_parcela': Deve ser zero ou um número.")
-        else:
-            self.df['numero_parcela'] = self.df['numero_parcela'].astype(int)
-
-    def validate_numero_total_parcelas(self):
-        if not self.df['numero_total_parcelas'].apply(lambda x: isinstance(x, int) or (isinstance(x, str) and x.isdigit())).all():
-            self.errors.append("Erro no campo 'numero_total_parcelas': Deve ser zero ou um número.")
-        else:
-            self.df['numero_total_parcelas'] = self.df['numero_total_parcelas'].astype(int)
-    
-    def validate_nsu_host_parcela(self):
-        if not self.df['nsu_host_parcela'].apply(lambda x: isinstance(x, str) and (x.isdigit() and (len(x) == 0 or len(x) == 12))).all():
-            self.errors.append("Erro no campo 'nsu_host_parcela': Deve ter 12 dígitos ou estar vazio.")
-        else:
-            self.df['nsu_host_parcela'] = self.df['nsu_host_parcela'].apply(lambda x: int(x) if x else 0)
-    
-    def validate_valor_bruto_parcela(self):
-        if not self.df['valor_bruto_parcela'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_bruto_parcela': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_bruto_parcela'] = self.df['valor_bruto_parcela'].astype(float)
-
-    def validate_valor_desconto_parcela(self):
-        if not self.df['valor_desconto_parcela'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_desconto_parcela': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_desconto_parcela'] = self.df['valor_desconto_parcela'].astype(float)
-
-    def validate_valor_liquido_parcela(self):
-        if not self.df['valor_liquido_parcela'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_liquido_parcela': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_liquido_parcela'] = self.df['valor_liquido_parcela'].astype(float)
-
-    def validate_banco(self):
-        if not self.df['banco'].apply(lambda x: isinstance(x, str) and len(x) == 3).all():
-            self.errors.append("Erro no campo 'banco': Deve ter exatamente 3 dígitos.")
-
-    def validate_agencia(self):
-        if not self.df['agencia'].apply(lambda x: isinstance(x, str) and len(x) == 6).all():
-            self.errors.append("Erro no campo 'agencia': Deve ter exatamente 6 dígitos.")
-
-    def validate_conta(self):
-        if not self.df['conta'].apply(lambda x: isinstance(x, str) and len(x) == 6).all():
-            self.errors.append("Erro no campo 'conta': Deve ter exatamente 6 dígitos.")
-
-    def validate_codigo_autorizacao(self):
-        if not self.df['codigo_autorizacao'].apply(lambda x: isinstance(x, str) and len(x) == 12).all():
-            self.errors.append("Erro no campo 'codigo_autorizacao': Deve ter exatamente 12 dígitos.")
-    
-    def validate_codigo_bandeira(self):
-        valid_values = {'1': "Master", '2': "Visa", '7': "Elo"}
-
-        self.df['codigo_bandeira'] = self.df['codigo_bandeira'].apply(lambda x: str(int(x)))
-
-        if not self.df['codigo_bandeira'].apply(lambda x: x in valid_values).all():
-            self.errors.append("Erro no campo 'codigo_bandeira': Deve ser 1, 2 ou 7.")
-        else:
-            self.df['codigo_bandeira'] = self.df['codigo_bandeira'].map(valid_values)
-    
-    def validate_codigo_produto(self):
-        valid_values = {
-            '1': "Visa Crédito", '2': "Master Crédito", '3': "Visa Débito", 
-            '4': "Master Débito", '5': "Elo Crédito", '6': "Elo Débito", '10': 'Outros',
-            '12': 'Outros', '8': 'Outros', '9': 'Outros', '7': 'Outros', '11': 'Outros'
-        }
-        self.df['codigo_produto'] = self.df['codigo_produto'].apply(lambda x: str(int(x)))
-
-        # Filtra linhas com valores inválidos
-        invalid_rows = self.df.loc[~self.df['codigo_produto'].apply(lambda x: x in valid_values)]
-
-        if not invalid_rows.empty:
-            # Extrai valores inválidos e seus índices
-            invalid_values = invalid_rows['codigo_produto'].unique()
-            invalid_indexes = invalid_rows.index.tolist()
-
-            self.errors.append(
-                f"Erro no campo 'codigo_produto': Valores inválidos encontrados: {invalid_values} "
-                f"nas linhas: {invalid_indexes}. "
-                f"Deve ser um dos valores permitidos: {list(valid_values.keys())}."
-            )
-            raise ValueError(self.errors)
-        else:
-            self.df['codigo_produto'] = self.df['codigo_produto'].map(valid_values)
-
-    def validate_valor_tx_interchange_tarifa(self):
-        if not self.df['valor_tx_interchange_tarifa'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_tx_interchange_tarifa': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_tx_interchange_tarifa'] = self.df['valor_tx_interchange_tarifa'].astype(float)
-
-    def validate_valor_tx_administracao(self):
-        if not self.df['valor_tx_administracao'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_tx_administracao': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_tx_administracao'] = self.df['valor_tx_administracao'].astype(float)
-
-    def validate_valor_tx_interchange_parcela(self):
-        if not self.df['valor_tx_interchange_parcela'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_tx_interchange_parcela': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_tx_interchange_parcela'] = self.df['valor_tx_interchange_parcela'].astype(float)
-
-    def validate_tipo_transacao(self):
-        valid_values = {'00': "Normal"}
-        invalid_values = ['01', '02', '03', '04']
-        
-        if not self.df['tipo_transacao'].apply(lambda x: x in valid_values or x in invalid_values).all():
-            self.errors.append("Erro no campo 'tipo_transacao': Deve ser '00' para transações válidas.")
-        else:
-            self.df['tipo_transacao'] = self.df['tipo_transacao'].apply(lambda x: valid_values.get(x, None))
-            if self.df['tipo_transacao'].isnull().any():
-                self.errors.append("Erro no campo 'tipo_transacao': Contém valores não utilizados.")
-
-    def validate_sigla_pais(self):
-        if not self.df['sigla_pais'].apply(lambda x: x == "BRA").all():
-            self.errors.append("Erro no campo 'sigla_pais': Deve ser 'BRA'.")
-
-    # def validate_reservado(self):
-    #     if not self.df['reservado'].apply(lambda x: isinstance(x, str) and len(x) == 51).all():
-    #         self.errors.append("Erro no campo 'reservado': Deve ter 51 caracteres.")
-
-    def validate_codigo_ec_venda(self):
-        if not self.df['codigo_ec_venda'].apply(lambda x: isinstance(x, str) and len(x) == 9).all():
-            self.errors.append("Erro no campo 'codigo_ec_venda': Deve ter 9 caracteres.")
-
-    def validate_codigo_ec_pagamento(self):
-        if not self.df['codigo_ec_pagamento'].apply(lambda x: isinstance(x, str) and len(x) == 9).all():
-            self.errors.append("Erro no campo 'codigo_ec_pagamento': Deve ter 9 caracteres.")
-
-    def validate_cnpj_ec_pagamento(self):
-        if not self.df['cnpj_ec_pagamento'].apply(lambda x: isinstance(x, str) and len(x) == 14).all():
-            self.errors.append("Erro no campo 'cnpj_ec_pagamento': Deve ter 14 caracteres.")
-
-    def validate_data_vencimento_original(self):
-        if not self.df['data_vencimento_original'].apply(lambda x: isinstance(x, str) and len(x) == 8 and x.isdigit()).all():
-            self.errors.append("Erro no campo 'data_vencimento_original': Deve estar no formato YYYYMMDD.")
-        else:
-            self.df['data_vencimento_original'] = pd.to_datetime(self.df['data_vencimento_original'], format='%Y%m%d', errors='coerce')
-            if self.df['data_vencimento_original'].isnull().any():
-                self.errors.append("Erro na conversão de 'data_vencimento_original': Formato inválido para datas.")
-
-    def validate_indicador_deb_balance(self):
-        if not self.df['indicador_deb_balance'].apply(lambda x: x in ['D', '']).all():
-            self.errors.append("Erro no campo 'indicador_deb_balance': Deve ser 'D' ou estar vazio.")
-
-    def validate_indicador_reenvio(self):
-        if not self.df['indicador_reenvio'].apply(lambda x: x in ['R', '']).all():
-            self.errors.append("Erro no campo 'indicador_reenvio': Deve ser 'R' ou estar vazio.")
-
-    def validate_nsu_origem(self):
-        if not self.df['nsu_origem'].apply(lambda x: isinstance(x, str) and len(x) <= 6 and x.isdigit()).all():
-            self.errors.append("Erro no campo 'nsu_origem': Deve ter até 6 dígitos numéricos.")
-        else:
-            self.df['nsu_origem'] = self.df['nsu_origem'].apply(lambda x: x.zfill(6))
-
-    def validate_numero_operacao_recebivel(self):
-        if not self.df['numero_operacao_recebivel'].apply(lambda x: (isinstance(x, str) and (len(x) == 20 or x == ""))).all():
-            self.errors.append("Erro no campo 'numero_operacao_recebivel': Deve ter 20 caracteres ou estar vazio.")
-
-    def validate_sequencial_operacao_recebivel(self):
-       if not self.df['sequencial_operacao_recebivel'].apply(lambda x: isinstance(x, str) and len(x) == 2).all():
-            self.errors.append("Erro no campo 'sequencial_operacao_recebivel': Deve ter 2 caracteres.")
-
-    def validate_tipo_operacao_recebivel(self):
-        valid_values = ['C', 'G', 'P', 'R', 'A', 'F', 'E', 'U']
-        if not self.df['tipo_operacao_recebivel'].apply(lambda x: x in valid_values or x == "").all():
-            self.errors.append("Erro no campo 'tipo_operacao_recebivel': Deve ser um dos valores permitidos ou estar vazio.")
-
-    def validate_nseq(self):
-        if not self.df['nseq'].apply(lambda x: isinstance(x, str) and len(x) == 6).all():
-            self.errors.append("Erro no campo 'nseq': Deve ter 6 caracteres.")
-
-    def validate_valor_operacao_recebivel(self):
-        if not self.df['valor_operacao_recebivel'].apply(lambda x: isinstance(x, str) and x.replace('.', '', 1).isdigit()).all():
-            self.errors.append("Erro no campo 'valor_operacao_recebivel': Deve estar no formato numérico com ponto decimal.")
-        else:
-            self.df['valor_operacao_recebivel'] = self.df['valor_operacao_recebivel'].astype(float)
+        linhas = serie[falhas]
+        self.erros_linhas.append(pd.DataFrame({
+            'indice': linhas.index,
+            'nseq': self.df.loc[linhas.index, 'nseq'].to_numpy() if 'nseq' in self.df else None,
+            'coluna': coluna,
+            'valor': linhas.astype(str).to_numpy(),
+            'mensagem': mensagem
+        }, columns=COLUNAS_ERROS_LINHAS))
+
+    def erros_por_linha(self):
+        """Linhas que falharam na validação em modo bulk: índice, nseq, coluna, valor e mensagem"""
+        if not self.erros_linhas:
+            return pd.DataFrame(columns=COLUNAS_ERROS_LINHAS)
+        return pd.concat(self.erros_linhas, ignore_index=True)
+
+    def relatorio_tempos(self):
+        """Tempo (s) gasto por regra na última validação, da mais custosa para a menos custosa"""
+        return pd.Series(self.tempos_regras, name='segundos', dtype=float).sort_values(ascending=False)
 
     def validate_all(self):
+        self.tempos_regras = {}
+        self.erros_linhas = []
         self.validate_structure()
 
-        self.validate_codigo_registro()
-        self.validate_identificacao_loja()
-        self.validate_nsu_host_transacao()
-        self.validate_data_transacao()
-        self.validate_horario_transacao()
-        self.validate_tipo_lancamento()
-        self.validate_data_lancamento()
-        self.validate_tipo_produto()
-        self.validate_meio_captura()
-        self.validate_valor_bruto_venda()
-        self.validate_valor_desconto()
-        self.validate_valor_liquido_venda()
-        self.validate_numero_cartao()
-        self.validate_numero_parcela()
-        self.validate_numero_total_parcelas()
-        self.validate_nsu_host_parcela()
-        self.validate_valor_bruto_parcela()
-        self.validate_valor_desconto_parcela()
-        self.validate_valor_liquido_parcela()
-        self.validate_banco()
-        self.validate_agencia()
-        self.validate_conta()
-        self.validate_codigo_autorizacao()
-        self.validate_codigo_bandeira()
-        self.validate_codigo_produto()
-        self.validate_valor_tx_interchange_tarifa()
-        self.validate_valor_tx_administracao()
-        self.validate_valor_tx_interchange_parcela()
-        self.validate_tipo_transacao()
-        self.validate_sigla_pais()
-        self.validate_codigo_ec_venda()
-        self.validate_codigo_ec_pagamento()
-        self.validate_cnpj_ec_pagamento()
-        self.validate_data_vencimento_original()
-        self.validate_indicador_deb_balance()
-        self.validate_indicador_reenvio()
-        self.validate_nsu_origem()
-        self.validate_numero_operacao_recebivel()
-        self.validate_sequencial_operacao_recebivel()
-        self.validate_tipo_operacao_recebivel()
-        self.validate_valor_operacao_recebivel()
-        self.validate_nseq()
+        for regra in self.regras:
+            self.aplicar_regra(regra)
         
         # Exibe os erros, se houver
         if self.errors:
@@ -351,4 +319,14 @@ class TransformerTrasacoes:
             return self.df
 
 
+def _metodo_validacao(coluna):
+    def validate(self):
+        self.aplicar_regra(REGRAS_POR_COLUNA[coluna])
+    validate.__name__ = f'validate_{coluna}'
+    validate.__doc__ = f"Valida o campo '{coluna}'."
+    return validate
+
 
+# Mantém os métodos validate_<coluna> da API anterior
+for _coluna in REGRAS_POR_COLUNA:
+    setattr(TransformerTrasacoes, f'validate_{_coluna}', _metodo_validacao(_coluna))
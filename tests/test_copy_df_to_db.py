@@ -0,0 +1,125 @@
+"""Ida e volta do COPY de copy_df_to_db: NULL, aspas/separadores e decimais.
+
+Usa o banco de TEST_DB_DSN (parâmetros libpq, ex.: 'host=localhost dbname=postgres user=postgres')
+ou um PostgreSQL temporário (initdb/pg_ctl em PG_BIN ou no PATH). Sem psycopg2 ou sem
+nenhum dos dois bancos, os testes são pulados.
+"""
+import contextlib
+import os
+import shutil
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from benchmarks.bench_db_loaders import postgres_local
+from scripts.connection_db import close_pools, copy_df_to_db
+
+
+def _params_dsn(dsn):
+    params = dict.fromkeys(['host', 'port', 'user', 'password', 'database'])
+    params.update(parte.split('=', 1) for parte in dsn.split())
+    params['database'] = params.pop('dbname', params['database'])
+    return params
+
+
+def _conectar(params):
+    return psycopg2.connect(**{k: v for k, v in params.items() if v is not None})
+
+
+@pytest.fixture(scope="module")
+def params():
+    dsn = os.getenv('TEST_DB_DSN')
+    if dsn:
+        banco = contextlib.nullcontext(_params_dsn(dsn))
+    elif all(shutil.which(binario, path=os.getenv('PG_BIN')) for binario in ('initdb', 'pg_ctl')):
+        banco = postgres_local()
+    else:
+        pytest.skip("Sem banco de teste: defina TEST_DB_DSN ou PG_BIN (initdb/pg_ctl)")
+
+    with banco as params:
+        try:
+            _conectar(params).close()
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"Banco de teste indisponível: {e}")
+        try:
+            yield params
+        finally:
+            close_pools()
+
+
+@pytest.fixture
+def tabela(params):
+    nome = f"teste_copy_{uuid.uuid4().hex[:8]}"
+    conn = _conectar(params)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""CREATE TABLE public.{nome} (
+                ordem bigint, texto varchar, valor decimal(15,2), valor_texto decimal(15,2),
+                quantidade bigint, data timestamp)""")
+        conn.commit()
+        yield conn, nome
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS public.{nome}")
+        conn.commit()
+        conn.close()
+
+
+TEXTOS = ['simples', 'com, vírgula', 'com "aspas"', 'linha\nquebrada', '', None, '000031', ' espaços ']
+VALORES = [34.0, 0.63, -0.01, 1234567.89, 0.1 + 0.2, np.nan, 0.0, 99999999999.99]
+VALORES_TEXTO = ['0.00', '33.37', None, '-1.50', '10', '0.63', None, '1234567.89']
+QUANTIDADES = [0, 1, None, 2 ** 40, -5, None, 7, 190825603]
+DATAS = ['2024-09-16', '2024-10-17 13:45:00', None, '2024-01-01', None, '2024-12-31 23:59:59',
+         '2024-02-29', '2024-09-17']
+
+
+def montar_df():
+    return pd.DataFrame({
+        'ordem': range(len(TEXTOS)),
+        'texto': TEXTOS,
+        'valor': VALORES,
+        'valor_texto': VALORES_TEXTO,
+        'quantidade': pd.array(QUANTIDADES, dtype='Int64'),
+        'data': pd.to_datetime(DATAS, format='ISO8601'),
+    })
+
+
+def _decimal(valor):
+    return None if valor is None or pd.isna(valor) else Decimal(str(valor)).quantize(Decimal('0.01'))
+
+
+@pytest.mark.parametrize('chunk_size', [100000, 3])
+def test_copy_ida_e_volta(params, tabela, chunk_size):
+    conn, nome = tabela
+    copy_df_to_db(**params, schema='public', table=nome, df=montar_df(), chunk_size=chunk_size)
+
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT texto, valor, valor_texto, quantidade, data FROM public.{nome} ORDER BY ordem")
+        linhas = cur.fetchall()
+
+    assert [linha[0] for linha in linhas] == TEXTOS
+    assert [linha[1] for linha in linhas] == [_decimal(v) for v in VALORES]
+    assert [linha[2] for linha in linhas] == [_decimal(v) for v in VALORES_TEXTO]
+    assert [linha[3] for linha in linhas] == QUANTIDADES
+    assert [linha[4] for linha in linhas] == [None if d is None else datetime.fromisoformat(d) for d in DATAS]
+
+
+def test_copy_na_transacao_do_chamador(params, tabela):
+    conn, nome = tabela
+    copy_df_to_db(**params, schema='public', table=nome, df=montar_df(), conn=conn)
+
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM public.{nome}")
+        assert cur.fetchone()[0] == len(TEXTOS)
+    conn.rollback()
+
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM public.{nome}")
+        assert cur.fetchone()[0] == 0
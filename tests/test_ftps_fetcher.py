@@ -0,0 +1,116 @@
+"""Download do FtpsFetcher contra um servidor FTPS local (pyftpdlib), com e sem SIZE.
+
+O certificado autoassinado é gerado com o openssl. Sem pyftpdlib, pyOpenSSL ou openssl,
+os testes são pulados.
+"""
+import os
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+pytest.importorskip("pyftpdlib")
+pytest.importorskip("OpenSSL")
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import TLS_FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+
+from scripts.ftps_fetcher import FtpsFetcher
+
+ARQUIVO_EXEMPLO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data', 'EXTRATO_UNICA_51309_20240917_00003'
+)
+USUARIO = 'unica'
+SENHA = 'senha'
+
+with open(ARQUIVO_EXEMPLO, 'rb') as f:
+    ARQUIVOS = {
+        os.path.basename(ARQUIVO_EXEMPLO): f.read(),
+        # Maior que o blocksize do RETR e com bytes que o modo texto alteraria
+        'EXTRATO_BINARIO': bytes(range(256)) * 12_000 + b'\r\n\n\r',
+        'EXTRATO_CURTO': b'0',
+    }
+
+
+def _sem_size(handler, path):
+    handler.respond("502 Command not implemented.")
+
+
+@pytest.fixture(params=[True, False], ids=['com_size', 'sem_size'])
+def porta(request, tmp_path):
+    if not shutil.which('openssl'):
+        pytest.skip("openssl não encontrado para gerar o certificado de teste")
+    certificado, chave = tmp_path / 'cert.pem', tmp_path / 'key.pem'
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', str(chave), '-out', str(certificado)],
+                   check=True, capture_output=True)
+
+    saida = tmp_path / 'ftp' / 'Saida'
+    saida.mkdir(parents=True)
+    for nome, conteudo in ARQUIVOS.items():
+        (saida / nome).write_bytes(conteudo)
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user(USUARIO, SENHA, str(tmp_path / 'ftp'), perm='elr')
+    atributos = {
+        'authorizer': authorizer,
+        'certfile': str(certificado),
+        'keyfile': str(chave),
+        'tls_control_required': True,
+        'tls_data_required': True,
+    }
+    if not request.param:
+        atributos['ftp_SIZE'] = _sem_size
+    handler = type('Handler', (TLS_FTPHandler,), atributos)
+
+    server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+    parar = threading.Event()
+
+    def servir():
+        while not parar.is_set():
+            server.serve_forever(timeout=0.05, blocking=False, handle_exit=False)
+        server.close_all()
+
+    thread = threading.Thread(target=servir, name="ftps-teste", daemon=True)
+    thread.start()
+    try:
+        yield server.address[1]
+    finally:
+        parar.set()
+        thread.join()
+
+
+def _fetcher(porta, staging):
+    return FtpsFetcher('127.0.0.1', USUARIO, SENHA, directory='Saida', staging_dir=str(staging),
+                       timeout=10, port=porta)
+
+
+def test_iter_downloads_baixa_conteudo_identico(porta, tmp_path):
+    staging = tmp_path / 'staging'
+    staging.mkdir()
+    with _fetcher(porta, staging) as fetcher:
+        assert sorted(fetcher.list_files()) == sorted(ARQUIVOS)
+        resultados = list(fetcher.iter_downloads(list(ARQUIVOS)))
+
+    assert [nome for nome, _, _ in resultados] == list(ARQUIVOS)
+    for nome, caminho, erro in resultados:
+        assert erro is None
+        with open(caminho, 'rb') as f:
+            assert f.read() == ARQUIVOS[nome]
+    assert not list(staging.glob('*.part'))
+
+
+def test_iter_downloads_segue_apos_arquivo_inexistente(porta, tmp_path):
+    staging = tmp_path / 'staging'
+    staging.mkdir()
+    nomes = ['EXTRATO_BINARIO', 'EXTRATO_INEXISTENTE', 'EXTRATO_CURTO']
+    with _fetcher(porta, staging) as fetcher:
+        resultados = list(fetcher.iter_downloads(nomes))
+
+    assert [nome for nome, _, _ in resultados] == nomes
+    assert resultados[1][1] is None and resultados[1][2] is not None
+    assert resultados[0][2] is None and resultados[2][2] is None
+    assert sorted(os.listdir(staging)) == ['EXTRATO_BINARIO', 'EXTRATO_CURTO']